@@ -0,0 +1,55 @@
+"""Weekly DAG that moves old article bodies into the compressed archive.
+
+The retention logic lives in the FastAPI backend (`/api/archive-news`);
+the DAG only calls the endpoint. The age threshold is NEWS_RETENTION_DAYS
+of the backend unless NEWS_RETENTION_DAYS is set for the DAG as well.
+The endpoint requires the INTERNAL_API_TOKEN shared with the backend.
+"""
+
+import os
+import logging
+import requests
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+from airflow.utils.dates import days_ago
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
+BACKEND_URL = os.getenv('BACKEND_URL', 'http://host.docker.internal:8000')
+NEWS_RETENTION_DAYS = os.getenv('NEWS_RETENTION_DAYS')
+INTERNAL_API_TOKEN = os.getenv('INTERNAL_API_TOKEN', '')
+
+default_args = {
+    'owner': 'airflow',
+    'start_date': days_ago(1),
+    'retries': 1,
+    'retry_delay': timedelta(hours=1),
+}
+
+# Run weekly on Sunday at 03:00 UTC, outside the daily update window
+SCHEDULE = '0 3 * * 0'
+
+
+def call_archive_api(timeout: int = 1800, **_):
+    url = f"{BACKEND_URL}/api/archive-news"
+    params = {'older_than_days': NEWS_RETENTION_DAYS} if NEWS_RETENTION_DAYS else None
+    logger.info('Calling backend: %s', url)
+    headers = {'X-Internal-Token': INTERNAL_API_TOKEN}
+    resp = requests.post(url, params=params, headers=headers, timeout=timeout)
+    resp.raise_for_status()
+    return resp.json()
+
+
+with DAG(
+    dag_id='news_retention_dag',
+    default_args=default_args,
+    schedule_interval=SCHEDULE,
+    catchup=False,
+    tags=['news', 'retention'],
+) as dag:
+
+    task_archive = PythonOperator(
+        task_id='call_backend_archive_news',
+        python_callable=call_archive_api,
+    )
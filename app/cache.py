@@ -0,0 +1,150 @@
+"""In-process caches for dashboard data.
+
+Snapshots are kept in memory with a TTL and a size bound and are keyed by
+the data version of their instrument, which is stored in the database, so a
+write from any process (the update endpoints, the DAG, the minute stream)
+moves every worker on to fresh entries. User rows are cached the same way for
+a short time and dropped by the handlers that change the demo account.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 128, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > self._clock():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    async def aget_or_set(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = await loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class DataVersions:
+    """Version tokens of the data behind each instrument, used in ETags and cache keys.
+
+    Writers bump a per-instrument row in the database in the same transaction
+    (db/versions.py), so every worker sees the same tokens, including after
+    writes made by other processes. `loader` returns all tokens at once; they
+    are re-read at most every `ttl` seconds, and requests arriving while a
+    re-read is in flight wait for it instead of each querying the database.
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable[dict]], ttl: float = 2.0,
+                 default: str = "0", clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.default = default
+        self._loader = loader
+        self._clock = clock
+        self._versions: dict[Hashable, str] = {}
+        self._expires = float("-inf")
+        self._pending: asyncio.Future | None = None
+        self._generation = 0
+
+    async def get(self, key: Hashable) -> str:
+        if self._clock() >= self._expires:
+            if self._pending is None:
+                self._pending = asyncio.ensure_future(self._load(self._generation))
+            # shield: a cancelled request must not cancel the read other requests wait for
+            await asyncio.shield(self._pending)
+        return self._versions.get(key, self.default)
+
+    async def _load(self, generation: int) -> None:
+        try:
+            versions = await self._loader()
+        finally:
+            if generation == self._generation:
+                self._pending = None
+        if generation == self._generation:
+            self._versions = versions
+            self._expires = self._clock() + self.ttl
+
+    def invalidate(self) -> None:
+        """Re-read the tokens on the next `get` (e.g. right after this worker wrote data)."""
+        # a read started before the write may return old tokens: it is not stored
+        self._generation += 1
+        self._pending = None
+        self._expires = float("-inf")
+
+
+snapshot_cache = TTLCache(
+    maxsize=int(os.getenv("DASHBOARD_CACHE_SIZE", "64")),
+    ttl=float(os.getenv("DASHBOARD_CACHE_TTL", "300")),
+)
+
+# Candle and forecast windows of the JSON API are keyed by client parameters;
+# they get their own bound, so scrolling through history never evicts the
+# per-metal page snapshots.
+window_cache = TTLCache(
+    maxsize=int(os.getenv("API_WINDOW_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("DASHBOARD_CACHE_TTL", "300")),
+)
+
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "60")),
+)
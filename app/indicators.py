@@ -0,0 +1,228 @@
+"""Technical indicators for the dashboard charts.
+
+RSI is computed with NumPy in a single vectorized pass. `RSIEngine` keeps the
+computed series per price table, so when new candles are appended only the
+new bars are calculated instead of the whole history. A state is tagged with
+the data version it was built from; a different version (an existing bar was
+rewritten or backfilled) makes the engine recompute the series.
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+
+RSI_MODES = ("simple", "wilder")
+
+# Wilder smoothing is evaluated in blocks: inside a block the recursion is
+# expanded into a closed form, the scale factor stays far from float overflow.
+_WILDER_BLOCK = 256
+
+
+def _rsi_from_averages(avg_gain: np.ndarray, avg_loss: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    flat = avg_loss == 0
+    rsi[flat] = np.where(avg_gain[flat] > 0, 100.0, 0.0)
+    return rsi
+
+
+def _wilder_smooth(values: np.ndarray, start: float, period: int) -> np.ndarray:
+    """Recursion y[i] = y[i-1] * (period - 1) / period + values[i] / period."""
+    decay = (period - 1) / period
+    if decay == 0:
+        return values.astype(np.float64)
+    out = np.empty(len(values), dtype=np.float64)
+    carry = float(start)
+    for offset in range(0, len(values), _WILDER_BLOCK):
+        block = values[offset:offset + _WILDER_BLOCK]
+        powers = decay ** np.arange(1, len(block) + 1)
+        # y[i] = decay^(i+1) * carry + (1 - decay) * sum_j decay^(i-j) * x[j]
+        weighted = np.cumsum(block / powers)
+        out[offset:offset + len(block)] = powers * (carry + (1 - decay) * weighted)
+        carry = out[offset + len(block) - 1]
+    return out
+
+
+def compute_rsi(closes, period: int = 14, mode: str = "simple") -> np.ndarray:
+    """RSI aligned with `closes`: the first `period` values are NaN.
+
+    mode="simple" averages gains/losses over a sliding window of `period`
+    changes, mode="wilder" uses Wilder's recursive smoothing seeded with the
+    simple average of the first window.
+    """
+    if mode not in RSI_MODES:
+        raise ValueError(f"Unknown RSI mode: {mode}")
+
+    closes = np.asarray(closes, dtype=np.float64)
+    result = np.full(len(closes), np.nan)
+    if len(closes) < period + 1:
+        return result
+
+    avg_gain, avg_loss = _average_moves(closes, period, mode)
+    result[period:] = _rsi_from_averages(avg_gain, avg_loss)
+    return result
+
+
+def _average_moves(closes: np.ndarray, period: int, mode: str) -> tuple[np.ndarray, np.ndarray]:
+    changes = np.diff(closes)
+    gains = np.clip(changes, 0, None)
+    losses = np.clip(-changes, 0, None)
+
+    if mode == "simple":
+        gain_sums = np.cumsum(np.concatenate(([0.0], gains)))
+        loss_sums = np.cumsum(np.concatenate(([0.0], losses)))
+        avg_gain = (gain_sums[period:] - gain_sums[:-period]) / period
+        avg_loss = (loss_sums[period:] - loss_sums[:-period]) / period
+        return avg_gain, avg_loss
+
+    seed_gain = gains[:period].mean()
+    seed_loss = losses[:period].mean()
+    avg_gain = np.concatenate(([seed_gain], _wilder_smooth(gains[period:], seed_gain, period)))
+    avg_loss = np.concatenate(([seed_loss], _wilder_smooth(losses[period:], seed_loss, period)))
+    return avg_gain, avg_loss
+
+
+@dataclass
+class _RSIState:
+    dates: np.ndarray
+    closes: np.ndarray
+    values: np.ndarray
+    avg_gain: float = float("nan")
+    avg_loss: float = float("nan")
+    version: str | None = None
+
+
+class RSIEngine:
+    """RSI series cached per key (usually a price table name).
+
+    `update` takes the full series and only computes bars that were appended
+    since the previous call; `append` takes only the new bars. `append` cannot
+    see changes to bars it already has, so callers pass the data `version`:
+    a state built from another version is treated as unknown and rebuilt.
+    """
+
+    def __init__(self, period: int = 14, mode: str = "simple"):
+        if mode not in RSI_MODES:
+            raise ValueError(f"Unknown RSI mode: {mode}")
+        self.period = period
+        self.mode = mode
+        self._states: dict[str, _RSIState] = {}
+        self._lock = threading.Lock()
+
+    def reset(self, key: str | None = None) -> None:
+        with self._lock:
+            if key is None:
+                self._states.clear()
+            else:
+                self._states.pop(key, None)
+
+    def last_date(self, key: str, version: str | None = None):
+        """Date of the last cached bar, None if the state is missing or of another version."""
+        state = self._states.get(key)
+        if state is None or len(state.dates) == 0 or not self._is_current(state, version):
+            return None
+        return state.dates[-1]
+
+    def update(self, key: str, dates, closes) -> np.ndarray:
+        """Return RSI for the full series, reusing the cached prefix if it matches."""
+        dates = np.asarray(dates, dtype="datetime64[us]")
+        closes = np.asarray(closes, dtype=np.float64)
+
+        with self._lock:
+            state = self._states.get(key)
+            known = 0 if state is None else len(state.dates)
+            if (
+                state is not None
+                and 0 < known <= len(dates)
+                and np.array_equal(state.dates, dates[:known])
+                and np.array_equal(state.closes, closes[:known])
+            ):
+                if known < len(dates):
+                    self._extend(state, dates[known:], closes[known:])
+            else:
+                state = self._full_state(dates, closes)
+                self._states[key] = state
+            return state.values.copy()
+
+    def append(self, key: str, dates, closes, version: str | None = None) -> np.ndarray:
+        """Append bars newer than the cached ones and return RSI for them.
+
+        If the cached state was built from another `version`, `dates`/`closes`
+        must be the full series: the state is rebuilt from them.
+        """
+        dates = np.asarray(dates, dtype="datetime64[us]")
+        closes = np.asarray(closes, dtype=np.float64)
+
+        with self._lock:
+            state = self._states.get(key)
+            if state is None or not self._is_current(state, version):
+                state = self._full_state(dates, closes)
+                state.version = version
+                self._states[key] = state
+                return state.values.copy()
+
+            if len(state.dates):
+                fresh = dates > state.dates[-1]
+                dates, closes = dates[fresh], closes[fresh]
+            known = len(state.dates)
+            self._extend(state, dates, closes)
+            return state.values[known:].copy()
+
+    def lookup(self, key: str, dates) -> np.ndarray:
+        """RSI values for `dates` from the cached series (NaN where unknown)."""
+        dates = np.asarray(dates, dtype="datetime64[us]")
+        result = np.full(len(dates), np.nan)
+        state = self._states.get(key)
+        if state is None or len(state.dates) == 0 or len(dates) == 0:
+            return result
+
+        positions = np.searchsorted(state.dates, dates)
+        positions = np.clip(positions, 0, len(state.dates) - 1)
+        found = state.dates[positions] == dates
+        result[found] = state.values[positions[found]]
+        return result
+
+    @staticmethod
+    def _is_current(state: _RSIState, version: str | None) -> bool:
+        return version is None or state.version == version
+
+    def _full_state(self, dates: np.ndarray, closes: np.ndarray) -> _RSIState:
+        state = _RSIState(dates=dates.copy(), closes=closes.copy(), values=np.full(len(closes), np.nan))
+        if len(closes) > self.period:
+            avg_gain, avg_loss = _average_moves(closes, self.period, self.mode)
+            state.values[self.period:] = _rsi_from_averages(avg_gain, avg_loss)
+            state.avg_gain, state.avg_loss = float(avg_gain[-1]), float(avg_loss[-1])
+        return state
+
+    def _extend(self, state: _RSIState, dates: np.ndarray, closes: np.ndarray) -> None:
+        if len(dates) == 0:
+            return
+
+        known = len(state.closes)
+        all_closes = np.concatenate((state.closes, closes))
+        if known <= self.period:
+            fresh = self._full_state(np.concatenate((state.dates, dates)), all_closes)
+            state.dates, state.closes, state.values = fresh.dates, fresh.closes, fresh.values
+            state.avg_gain, state.avg_loss = fresh.avg_gain, fresh.avg_loss
+            return
+
+        if self.mode == "simple":
+            # New bars only need the last `period` changes before them.
+            tail = compute_rsi(all_closes[known - self.period:], self.period, self.mode)
+            new_values = tail[self.period:]
+        else:
+            changes = np.diff(all_closes[known - 1:])
+            avg_gain = _wilder_smooth(np.clip(changes, 0, None), state.avg_gain, self.period)
+            avg_loss = _wilder_smooth(np.clip(-changes, 0, None), state.avg_loss, self.period)
+            state.avg_gain, state.avg_loss = float(avg_gain[-1]), float(avg_loss[-1])
+            new_values = _rsi_from_averages(avg_gain, avg_loss)
+
+        state.dates = np.concatenate((state.dates, dates))
+        state.closes = all_closes
+        state.values = np.concatenate((state.values, new_values))
+
+
+rsi_engine = RSIEngine(mode=os.getenv("RSI_MODE", "simple"))
@@ -1,12 +1,22 @@
 import os
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from app.routes.general import router as general_router
+from db.engine import dispose_engines
 
 
-app = FastAPI(title="Restaurant Website")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	yield
+	# Пулы соединений создаются лениво при первом запросе и закрываются при остановке
+	await dispose_engines()
+
+
+app = FastAPI(title="Restaurant Website", lifespan=lifespan)
 
 app.add_middleware(
 	SessionMiddleware,
@@ -14,6 +24,14 @@ app.add_middleware(
 	same_site="lax",
 )
 
+# HTML страниц и JSON со свечами сжимаются; мелкие ответы отдаются как есть.
+# Уровень 6 вместо 9 по умолчанию: ответ больше на 1-3%, а процессора уходит в 2-3 раза меньше
+app.add_middleware(
+	GZipMiddleware,
+	minimum_size=int(os.getenv("GZIP_MIN_SIZE", "1024")),
+	compresslevel=int(os.getenv("GZIP_LEVEL", "6")),
+)
+
 app.include_router(general_router)
 
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
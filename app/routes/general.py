@@ -1,64 +1,50 @@
+import asyncio
 import hashlib
 import hmac
+import math
 import os
 import re
-from datetime import datetime
+from datetime import datetime, timezone
 
-from fastapi import APIRouter, Request
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.concurrency import run_in_threadpool
 
-# Import backend update/prediction logic
-from db.update_information import update_all_data, run_price_predictions
-from sqlalchemy import delete, desc, insert, select, update
-
-from db.core import engine
+from sqlalchemy import Numeric, String, and_, cast, column, delete, desc, func, insert, select, true, tuple_, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.cache import DataVersions, snapshot_cache, user_cache, window_cache
+from app.indicators import compute_rsi, rsi_engine
+from app.timeframes import aggregate_candles, bucket_start, downsample_candles
+from db.engine import get_async_engine, get_async_reader, pool_stats
+from db.metrics import query_metrics, render_pool_metrics
+from db.quotes import latest_quotes
+from db.retention import archive_old_news, decompress_body
+from db.versions import read_versions, versions_stmt
+from db.instruments import get_instruments
 from db.models import (
-    gold_cost_table,
-    silver_cost_table,
-    copper_cost_table,
-    gold_news_table,
-    silver_news_table,
-    copper_news_table,
-    gold_cost_predict_table,
-    silver_cost_predict_table,
-    copper_cost_predict_table,
+    candles_table,
+    intraday_candles_table,
+    news_table,
+    news_archive_table,
+    SEARCH_CONFIGS,
+    SERIES_SOURCES,
+    COST_VIEWS,
+    NEWS_VIEWS,
+    PREDICT_VIEWS,
     users_table,
     demo_trades_table,
+    demo_positions_table,
 )
 
 
-def calculate_rsi(prices, period=14):
+def calculate_rsi(prices, period=14, mode="simple"):
     """Вычисление RSI (Relative Strength Index)"""
     if len(prices) < period + 1:
         return []
-    
-    rsi_values = []
-    
-    for i in range(period, len(prices)):
-        gains = 0
-        losses = 0
-        
-        for j in range(i - period, i):
-            change = prices[j + 1] - prices[j]
-            if change > 0:
-                gains += change
-            else:
-                losses += abs(change)
-        
-        avg_gain = gains / period
-        avg_loss = losses / period
-        
-        if avg_loss == 0:
-            rsi = 100 if avg_gain > 0 else 0
-        else:
-            rs = avg_gain / avg_loss
-            rsi = 100 - (100 / (1 + rs))
-        
-        rsi_values.append(rsi)
-    
-    return rsi_values
+
+    return compute_rsi(prices, period, mode)[period:].tolist()
 
 
 SQLI_PATTERN = re.compile(r"(--|;|/\*|\*/|\b(select|insert|update|delete|drop|union|alter|truncate)\b)", re.IGNORECASE)
@@ -104,124 +90,399 @@ def _pop_flash(request: Request) -> dict:
     return request.session.pop("flash", {"message": "", "level": ""})
 
 
-def _get_current_user(request: Request):
+USER_COLUMNS = (
+    users_table.c.id,
+    users_table.c.username,
+    users_table.c.email,
+    users_table.c.start_capital,
+    users_table.c.current_capital,
+    users_table.c.created_at,
+)
+
+
+async def fetch_user(user_id: int) -> dict | None:
+    """Строка пользователя без хэша пароля"""
+    async with get_async_reader().connect() as connection:
+        stmt = select(*USER_COLUMNS).where(users_table.c.id == user_id).limit(1)
+        user = (await connection.execute(stmt)).mappings().first()
+    return dict(user) if user else None
+
+
+async def _get_current_user(request: Request):
     user_id = request.session.get("user_id")
     if not user_id:
         return None
 
-    with engine.connect() as connection:
-        stmt = select(users_table).where(users_table.c.id == int(user_id)).limit(1)
-        return connection.execute(stmt).mappings().first()
+    # Кэш сбрасывается обработчиками, меняющими капитал (сделка, установка и сброс счета)
+    return await user_cache.aget_or_set(int(user_id), lambda: fetch_user(int(user_id)))
+
+
+def _window_stmt(
+    table,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    limit: int | None = None,
+    since: datetime | None = None,
+):
+    """Запрос окна свечей: диапазон дат, дельта после `since` и/или последние `limit` строк"""
+    stmt = select(table)
+    if start_date is not None:
+        stmt = stmt.where(table.c.date >= start_date)
+    if end_date is not None:
+        stmt = stmt.where(table.c.date <= end_date)
+    if since is not None:
+        stmt = stmt.where(table.c.date > since)
+    if limit is not None:
+        # Последние `limit` свечей окна; порядок восстанавливается после выборки
+        return stmt.order_by(desc(table.c.date)).limit(limit), True
+    return stmt.order_by(table.c.date), False
+
+
+async def _sync_rsi(connection, table, dates):
+    """Догрузка в RSI-движок только свечей, которых ещё нет в его состоянии
+
+    Состояние привязано к версии данных инструмента: если свечи переписал другой
+    процесс (дневная свеча из минутных, дозагрузка пропусков), ряд читается и
+    пересчитывается целиком. Если окно не выходит за последнюю свечу состояния
+    той же версии, запроса нет совсем.
+    """
+    version = await data_versions.get(SERIES_SOURCES[table.name][1])
+    last_date = rsi_engine.last_date(table.name, version)
+    if last_date is not None and (not dates or dates[-1] <= last_date.astype(datetime)):
+        return rsi_engine.lookup(table.name, dates)
+    stmt = select(table.c.date, table.c.close).order_by(table.c.date)
+    if last_date is not None:
+        stmt = stmt.where(table.c.date > last_date.astype(datetime))
+    rows = (await connection.execute(stmt)).all()
+    if rows or last_date is None:
+        rsi_engine.append(table.name, [row[0] for row in rows], [row[1] for row in rows], version)
+    return rsi_engine.lookup(table.name, dates)
+
+
+async def fetch_candles(
+    table,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    limit: int | None = None,
+    since: datetime | None = None,
+    timeframe: str = "1D",
+    max_points: int | None = None,
+):
+    if timeframe != "1D":
+        data = await _fetch_aggregated_candles(table, timeframe, start_date, end_date, limit, since)
+    else:
+        data = await _fetch_daily_candles(table, start_date, end_date, limit, since)
+
+    if max_points is not None:
+        data = downsample_candles(data, max_points)
+    return data
 
 
-def fetch_candles(table, start_date: datetime | None = None):
-    if start_date is None:
+async def _fetch_aggregated_candles(
+    table,
+    timeframe: str,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    limit: int | None = None,
+    since: datetime | None = None,
+):
+    """Окно недельных/месячных свечей из агрегированного ряда, закешированного по (таблица, таймфрейм, версия)"""
+    version = await data_versions.get(SERIES_SOURCES[table.name][1])
+    series = await snapshot_cache.aget_or_set(
+        ("series", table.name, timeframe, version),
+        lambda: _load_aggregated_series(table, timeframe),
+    )
+
+    if start_date is not None:
+        first_bucket = bucket_start(start_date, timeframe)
+        series = [candle for candle in series if candle["time"] >= first_bucket]
+    if end_date is not None:
+        series = [candle for candle in series if candle["time"] <= end_date.strftime("%Y-%m-%d")]
+    if since is not None:
+        # Последний бакет ещё формируется, поэтому отдаётся заново вместе с новыми
+        since_bucket = bucket_start(since, timeframe)
+        series = [candle for candle in series if candle["time"] >= since_bucket]
+    if limit is not None:
+        series = series[-limit:]
+    return series
+
+
+async def _load_aggregated_series(table, timeframe: str) -> list[dict]:
+    daily = await _fetch_daily_candles(table)
+    return aggregate_candles(daily, timeframe, rsi_engine.period, rsi_engine.mode)
+
+
+async def _fetch_daily_candles(
+    table,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    limit: int | None = None,
+    since: datetime | None = None,
+):
+    if start_date is None and since is None:
         start_date = datetime(2019, 1, 1)
 
-    with engine.connect() as connection:
-        stmt = (
-            select(table)
-            .where(table.c.date >= start_date)
-            .order_by(table.c.date)
-        )
-        rows = connection.execute(stmt).mappings().all()
+    async with get_async_reader().connect() as connection:
+        stmt, descending = _window_stmt(table, start_date, end_date, limit, since)
+        rows = (await connection.execute(stmt)).all()
+        if descending:
+            rows = rows[::-1]
+        # RSI считается инкрементально: пересчитываются только новые свечи
+        rsi_values = await _sync_rsi(connection, table, [row.date for row in rows])
 
+    # Строки разбираются по атрибутам, а не через mappings(): окно — сотни свечей на запрос
     data = []
-    close_prices = []
-    
-    for row in rows:
-        date_value = row.get("date")
-        close_price = row.get("close", 0.0)
-        close_prices.append(close_price)
-        
-        data.append(
-            {
-                "time": date_value.strftime("%Y-%m-%d") if date_value else "",
-                "open": round(row.get("open", 0.0), 2),
-                "high": round(row.get("high", 0.0), 2),
-                "low": round(row.get("low", 0.0), 2),
-                "close": round(close_price, 2),
-                "volume": row.get("volume", 0),
-            }
-        )
-    
-    # Вычисление RSI
-    rsi_values = calculate_rsi(close_prices)
-    
-    # Добавление RSI в данные (начиная с периода 14)
-    for i, rsi_value in enumerate(rsi_values):
-        if (i + 14) < len(data):
-            data[i + 14]["rsi"] = round(rsi_value, 2)
-    
+    for row, rsi_value in zip(rows, rsi_values):
+        date_value = row.date
+        item = {
+            "time": date_value.date().isoformat() if date_value else "",
+            "open": round(row.open, 2),
+            "high": round(row.high, 2),
+            "low": round(row.low, 2),
+            "close": round(row.close, 2),
+            "volume": row.volume,
+        }
+        if not math.isnan(rsi_value):
+            item["rsi"] = round(float(rsi_value), 2)
+        data.append(item)
+
     return data
 
 
-def fetch_predict_candles(table, start_date: datetime | None = None):
-    if start_date is None:
+INTRADAY_PAGE_SIZE = 600
+
+
+async def fetch_intraday_candles(instrument: str, since: datetime | None = None,
+                                 limit: int = INTRADAY_PAGE_SIZE) -> list:
+    """Минутные свечи инструмента: последние `limit` или новее `since`"""
+    table = intraday_candles_table
+    stmt = select(table).where(table.c.instrument == instrument)
+    if since is not None:
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        stmt = stmt.where(table.c.date > since)
+    stmt = stmt.order_by(desc(table.c.date)).limit(limit)
+    async with get_async_reader().connect() as connection:
+        rows = (await connection.execute(stmt)).mappings().all()
+
+    return [
+        {
+            "time": int(row["date"].replace(tzinfo=timezone.utc).timestamp()),
+            "open": round(row["open"], 2),
+            "high": round(row["high"], 2),
+            "low": round(row["low"], 2),
+            "close": round(row["close"], 2),
+            "volume": row["volume"] or 0,
+        }
+        for row in reversed(rows)
+    ]
+
+
+async def fetch_predict_candles(
+    table,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    limit: int | None = None,
+    since: datetime | None = None,
+):
+    if start_date is None and since is None:
         start_date = datetime(2019, 1, 1)
 
-    with engine.connect() as connection:
-        stmt = (
-            select(table)
-            .where(table.c.date >= start_date)
-            .order_by(table.c.date)
-        )
-        rows = connection.execute(stmt).mappings().all()
+    async with get_async_reader().connect() as connection:
+        stmt, descending = _window_stmt(table, start_date, end_date, limit, since)
+        rows = (await connection.execute(stmt)).all()
+    if descending:
+        rows = rows[::-1]
 
     data = []
     for row in rows:
-        date_value = row.get("date")
+        date_value = row.date
         data.append(
             {
-                "time": date_value.strftime("%Y-%m-%d") if date_value else "",
-                "open": round(row.get("open", 0.0), 2),
-                "high": round(row.get("high", 0.0), 2),
-                "low": round(row.get("low", 0.0), 2),
-                "close": round(row.get("close", 0.0), 2),
+                "time": date_value.date().isoformat() if date_value else "",
+                "open": round(row.open, 2),
+                "high": round(row.high, 2),
+                "low": round(row.low, 2),
+                "close": round(row.close, 2),
             }
         )
 
     return data
 
 
-def fetch_latest_close_price(table) -> float:
-    with engine.connect() as connection:
-        stmt = select(table.c.close).order_by(desc(table.c.date)).limit(1)
-        row = connection.execute(stmt).first()
-    if not row:
-        return 0.0
-    return round(float(row[0] or 0.0), 2)
+async def fetch_latest_close_price(table, cached: bool = True) -> float:
+    """Последняя цена закрытия; из кеша процесса, пока не сменилась версия данных инструмента
+
+    cached=False читает цену из БД в обход кеша (цена исполнения сделки).
+    """
+    version = await data_versions.get(SERIES_SOURCES[table.name][1])
+    close = latest_quotes.get(table.name, version) if cached else None
+    if close is None:
+        async with get_async_reader().connect() as connection:
+            stmt = select(table.c.date, table.c.close).order_by(desc(table.c.date)).limit(1)
+            row = (await connection.execute(stmt)).first()
+        if not row:
+            return 0.0
+        close = float(row[1] or 0.0)
+        latest_quotes.publish(table.name, row[0], close, version)
+    return round(close, 2)
+
+
+NEWS_PAGE_SIZE = 20
+
+
+def _news_cursor(date_value: datetime | None, news_id: int) -> str:
+    # У статьи без даты курсор — только id: такие статьи идут в конце ленты
+    return f"{date_value.isoformat() if date_value else ''}_{news_id}"
+
 
+def _parse_news_cursor(cursor: str) -> tuple[datetime | None, int]:
+    try:
+        date_raw, id_raw = cursor.rsplit("_", 1)
+        return (datetime.fromisoformat(date_raw) if date_raw else None), int(id_raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный курсор новостей.")
+
+
+async def fetch_news(table, limit: int = NEWS_PAGE_SIZE, before: tuple[datetime | None, int] | None = None):
+    """Страница новостей без текста статей, keyset-пагинация по (date, id)
 
-def fetch_news(table):
-    with engine.connect() as connection:
-        stmt = select(table).order_by(desc(table.c.date), desc(table.c.id))
-        rows = connection.execute(stmt).mappings().all()
+    Статьи без даты идут после всех датированных, по убыванию id. Обе части
+    читаются по индексу (instrument, date, id), вторая — только когда
+    датированные статьи на странице закончились.
+    """
+    columns = (table.c.id, table.c.title, table.c.description, table.c.date)
+    rows = []
+    async with get_async_reader().connect() as connection:
+        if before is None or before[0] is not None:
+            stmt = (
+                select(*columns)
+                .where(table.c.date.isnot(None))
+                .order_by(desc(table.c.date), desc(table.c.id))
+                .limit(limit)
+            )
+            if before is not None:
+                stmt = stmt.where(tuple_(table.c.date, table.c.id) < tuple_(*before))
+            rows = (await connection.execute(stmt)).mappings().all()
+        if len(rows) < limit:
+            stmt = select(*columns).where(table.c.date.is_(None)).order_by(desc(table.c.id)).limit(limit - len(rows))
+            if before is not None and before[0] is None:
+                stmt = stmt.where(table.c.id < before[1])
+            rows = [*rows, *(await connection.execute(stmt)).mappings().all()]
 
     news = []
     for row in rows:
         date_value = row.get("date")
         news.append(
             {
+                "id": row.get("id"),
                 "title": row.get("title") or "",
                 "date": date_value.strftime("%d.%m.%Y") if date_value else "",
                 "summary": row.get("description") or "",
-                "body": row.get("full_text") or "",
+                "cursor": _news_cursor(date_value, row.get("id")),
             }
         )
 
     return news
 
 
-def fetch_trade_history(user_id: int, limit: int = 50):
-    with engine.connect() as connection:
+async def fetch_news_body(table, news_id: int) -> dict | None:
+    """Текст статьи; у старых статей он берётся из сжатого архива news_archive"""
+    archive = news_archive_table
+    async with get_async_reader().connect() as connection:
+        stmt = (
+            select(
+                table.c.id, table.c.title, table.c.date, table.c.full_text,
+                archive.c.codec, archive.c.raw_size, archive.c.body,
+            )
+            .select_from(table.outerjoin(archive, archive.c.news_id == table.c.id))
+            .where(table.c.id == news_id)
+            .limit(1)
+        )
+        row = (await connection.execute(stmt)).mappings().first()
+
+    if not row:
+        return None
+    body = row.get("full_text")
+    if body is None and row.get("body") is not None:
+        # первый вызов импортирует pyarrow, поэтому не в цикле событий
+        body = await run_in_threadpool(decompress_body, row.get("codec"), row.get("body"), row.get("raw_size"))
+    date_value = row.get("date")
+    return {
+        "id": row.get("id"),
+        "title": row.get("title") or "",
+        "date": date_value.strftime("%d.%m.%Y") if date_value else "",
+        "body": body or "",
+    }
+
+
+def _search_query(text: str):
+    """Запрос websearch_to_tsquery, объединённый по всем поисковым конфигурациям (ИЛИ)"""
+    queries = [func.websearch_to_tsquery(config, text) for config in SEARCH_CONFIGS]
+    query = queries[0]
+    for other in queries[1:]:
+        query = query.op("||")(other)
+    return query
+
+
+def search_news_stmt(
+    instrument: str,
+    text: str,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    limit: int = NEWS_PAGE_SIZE,
+    offset: int = 0,
+):
+    """Поиск по индексу ix_news_search, сортировка по релевантности (ts_rank_cd), затем по дате"""
+    query = _search_query(text)
+    rank = func.ts_rank_cd(news_table.c.search, query).label("rank")
+    conditions = [news_table.c.instrument == instrument, news_table.c.search.op("@@")(query)]
+    if start_date is not None:
+        conditions.append(news_table.c.date >= start_date)
+    if end_date is not None:
+        conditions.append(news_table.c.date <= end_date)
+    return (
+        select(news_table.c.id, news_table.c.title, news_table.c.description, news_table.c.date, rank)
+        .where(and_(*conditions))
+        .order_by(desc(rank), desc(news_table.c.date), desc(news_table.c.id))
+        .limit(limit)
+        .offset(offset)
+    )
+
+
+async def search_news(instrument: str, text: str, start_date: datetime | None = None,
+                      end_date: datetime | None = None, limit: int = NEWS_PAGE_SIZE, offset: int = 0):
+    async with get_async_reader().connect() as connection:
+        stmt = search_news_stmt(instrument, text, start_date, end_date, limit, offset)
+        rows = (await connection.execute(stmt)).mappings().all()
+
+    return [
+        {
+            "id": row.get("id"),
+            "title": row.get("title") or "",
+            "date": row.get("date").strftime("%d.%m.%Y") if row.get("date") else "",
+            "summary": row.get("description") or "",
+            "rank": round(float(row.get("rank") or 0.0), 4),
+        }
+        for row in rows
+    ]
+
+
+def _next_news_cursor(news: list, limit: int) -> str | None:
+    if len(news) < limit:
+        return None
+    return news[-1].get("cursor")
+
+
+async def fetch_trade_history(user_id: int, limit: int = 50):
+    async with get_async_reader().connect() as connection:
         stmt = (
             select(demo_trades_table)
             .where(demo_trades_table.c.user_id == user_id)
             .order_by(desc(demo_trades_table.c.created_at), desc(demo_trades_table.c.id))
             .limit(limit)
         )
-        rows = connection.execute(stmt).mappings().all()
+        rows = (await connection.execute(stmt)).mappings().all()
 
     items = []
     for row in rows:
@@ -238,34 +499,47 @@ def fetch_trade_history(user_id: int, limit: int = 50):
     return items
 
 
-def fetch_positions(user_id: int):
-    with engine.connect() as connection:
+async def fetch_positions(user_id: int):
+    async with get_async_reader().connect() as connection:
         stmt = (
-            select(demo_trades_table.c.metal_key, demo_trades_table.c.side, demo_trades_table.c.quantity)
-            .where(demo_trades_table.c.user_id == user_id)
+            select(demo_positions_table.c.metal_key, demo_positions_table.c.quantity)
+            .where(demo_positions_table.c.user_id == user_id)
+            .where(demo_positions_table.c.quantity > 0)
         )
-        rows = connection.execute(stmt).mappings().all()
-
-    positions = {}
-    for row in rows:
-        key = row.get("metal_key", "")
-        quantity = float(row.get("quantity") or 0.0)
-        if row.get("side") == "buy":
-            positions[key] = positions.get(key, 0.0) + quantity
-        elif row.get("side") == "sell":
-            positions[key] = positions.get(key, 0.0) - quantity
-
-    return {k: round(v, 4) for k, v in positions.items() if v > 0}
-
-
-def compute_total_capital(user_id: int, cash_capital: float) -> float:
-    prices_by_metal = {
-        "gold": fetch_latest_close_price(gold_cost_table),
-        "silver": fetch_latest_close_price(silver_cost_table),
-        "cupp": fetch_latest_close_price(copper_cost_table),
-    }
-    positions = fetch_positions(user_id)
-
+        rows = (await connection.execute(stmt)).mappings().all()
+
+    positions = {row["metal_key"]: round(float(row["quantity"] or 0.0), 4) for row in rows}
+    return {k: v for k, v in positions.items() if v > 0}
+
+
+async def fetch_latest_closes(instruments: list[str]) -> list:
+    """Последняя свеча каждого инструмента одним запросом: LATERAL по индексу (instrument, date)"""
+    wanted = values(column("instrument", String), name="wanted").data([(name,) for name in instruments])
+    latest = (
+        select(candles_table.c.date, candles_table.c.close)
+        .where(candles_table.c.instrument == wanted.c.instrument)
+        .order_by(desc(candles_table.c.date))
+        .limit(1)
+        .lateral("latest")
+    )
+    stmt = select(wanted.c.instrument, latest.c.date, latest.c.close).select_from(wanted.join(latest, true()))
+    async with get_async_reader().connect() as connection:
+        return (await connection.execute(stmt)).all()
+
+
+async def fetch_latest_prices() -> dict:
+    versions = {key: await _data_version(key) for key in METALS}
+    prices = {key: latest_quotes.get(metal["cost_table"].name, versions[key]) for key, metal in METALS.items()}
+    missing = {METALS[key]["instrument"]: key for key, close in prices.items() if close is None}
+    if missing:
+        for instrument, date_value, close in await fetch_latest_closes(list(missing)):
+            metal_key = missing[instrument]
+            prices[metal_key] = float(close or 0.0)
+            latest_quotes.publish(METALS[metal_key]["cost_table"].name, date_value, prices[metal_key], versions[metal_key])
+    return {key: round(close or 0.0, 2) for key, close in prices.items()}
+
+
+def compute_total_capital(cash_capital: float, positions: dict, prices_by_metal: dict) -> float:
     positions_value = 0.0
     for metal_key, quantity in positions.items():
         positions_value += float(quantity) * float(prices_by_metal.get(metal_key, 0.0))
@@ -279,51 +553,128 @@ def compute_performance(start_capital: float, current_capital: float) -> float:
     return round(((current_capital - start_capital) / start_capital) * 100, 2)
 
 
-def render_metal(request: Request, metal_key: str):
-    metals = {
-        "gold": {
-            "name": "Золото",
-            "code": "XAU",
-            "cost_table": gold_cost_table,
-            "predict_table": gold_cost_predict_table,
-            "news_table": gold_news_table,
-        },
-        "silver": {
-            "name": "Серебро",
-            "code": "XAG",
-            "cost_table": silver_cost_table,
-            "predict_table": silver_cost_predict_table,
-            "news_table": silver_news_table,
-        },
-        "cupp": {
-            "name": "Медь",
-            "code": "Cu",
-            "cost_table": copper_cost_table,
-            "predict_table": copper_cost_predict_table,
-            "news_table": copper_news_table,
-        },
+# Страницы и API металлов строятся по реестру инструментов один раз при импорте
+METALS = {
+    instrument.slug: {
+        "name": instrument.name,
+        "instrument": instrument.key,
+        "code": instrument.code,
+        "cost_table": COST_VIEWS[instrument.key],
+        "predict_table": PREDICT_VIEWS[instrument.key],
+        "news_table": NEWS_VIEWS[instrument.key],
     }
-    metal = metals.get(metal_key, metals["gold"])
-    chart_data = fetch_candles(metal["cost_table"])
-    predict_data = fetch_predict_candles(metal["predict_table"])
-    current_user = _get_current_user(request)
-
-    trade_history = []
-    positions = {}
-    display_current_capital = 0.0
-    performance_pct = 0.0
-    if current_user:
-        user_id = int(current_user["id"])
-        trade_history = fetch_trade_history(int(current_user["id"]))
-        positions = fetch_positions(int(current_user["id"]))
-        display_current_capital = compute_total_capital(
-            user_id,
-            float(current_user.get("current_capital") or 0.0),
-        )
-        performance_pct = compute_performance(
+    for instrument in get_instruments()
+}
+DEFAULT_METAL = next(iter(METALS))
+templates.env.globals["nav_metals"] = [(key, metal["name"]) for key, metal in METALS.items()]
+
+
+async def load_metal_snapshot(metal: dict) -> dict:
+    """Общие для всех пользователей данные страницы металла"""
+    news, latest_price = await asyncio.gather(
+        fetch_news(metal["news_table"]),
+        fetch_latest_close_price(metal["cost_table"]),
+    )
+    return {
+        "news": news,
+        "news_next_cursor": _next_news_cursor(news, NEWS_PAGE_SIZE),
+        "latest_price": latest_price,
+    }
+
+
+async def _load_user_state(request: Request) -> dict:
+    """Данные демо-счета; все запросы независимы и выполняются параллельно"""
+    state = {
+        "current_user": None,
+        "trade_history": [],
+        "positions": {},
+        "display_current_capital": 0.0,
+        "performance_pct": 0.0,
+    }
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return state
+
+    current_user, trade_history, positions, prices_by_metal = await asyncio.gather(
+        _get_current_user(request),
+        fetch_trade_history(int(user_id)),
+        fetch_positions(int(user_id)),
+        fetch_latest_prices(),
+    )
+    if not current_user:
+        return state
+
+    display_current_capital = compute_total_capital(
+        float(current_user.get("current_capital") or 0.0),
+        positions,
+        prices_by_metal,
+    )
+    state.update(
+        current_user=current_user,
+        trade_history=trade_history,
+        positions=positions,
+        display_current_capital=display_current_capital,
+        performance_pct=compute_performance(
             float(current_user.get("start_capital") or 0.0),
             display_current_capital,
-        )
+        ),
+    )
+    return state
+
+
+async def fetch_data_versions() -> dict:
+    """Версии данных всех инструментов одним запросом (таблица data_versions)"""
+    async with get_async_reader().connect() as connection:
+        return read_versions((await connection.execute(versions_stmt())).all())
+
+
+# Версии перечитываются из БД не чаще раза в DATA_VERSION_TTL секунд: столько может
+# пройти, пока воркер заметит запись другого процесса
+data_versions = DataVersions(lambda: fetch_data_versions(), ttl=float(os.getenv("DATA_VERSION_TTL", "2")))
+
+
+async def _data_version(metal_key: str) -> str:
+    return await data_versions.get(METALS[metal_key]["instrument"])
+
+
+async def _data_etag(request: Request, metal_key: str) -> str:
+    """Слабый ETag: версия данных металла плюс путь и параметры запроса"""
+    target = f"{request.url.path}?{request.url.query}".encode("utf-8")
+    digest = hashlib.blake2b(target, digest_size=8).hexdigest()
+    return f'W/"{await _data_version(metal_key)}-{digest}"'
+
+
+def _etag_headers(etag: str) -> dict:
+    # no-cache: браузер хранит ответ, но каждый раз перепроверяет его по ETag
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def _not_modified(request: Request, etag: str) -> Response | None:
+    """Ответ 304, если клиент прислал совпадающий If-None-Match"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    if "*" in tags or etag.removeprefix("W/") in tags:
+        return Response(status_code=304, headers=_etag_headers(etag))
+    return None
+
+
+async def render_metal(request: Request, metal_key: str):
+    metal = METALS[metal_key]
+    # Страница без демо-счета и flash-сообщения зависит только от данных металла
+    etag = None
+    if not request.session.get("user_id") and "flash" not in request.session:
+        etag = await _data_etag(request, metal_key)
+        not_modified = _not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+    version = await _data_version(metal_key)
+    snapshot, user_state = await asyncio.gather(
+        snapshot_cache.aget_or_set((metal_key, version), lambda: load_metal_snapshot(metal)),
+        _load_user_state(request),
+    )
 
     flash = _pop_flash(request)
 
@@ -332,20 +683,20 @@ def render_metal(request: Request, metal_key: str):
         "year": datetime.now().year,
         "metal_name": metal["name"],
         "metal_code": metal["code"],
-        "chart_data": chart_data,
-        "predict_data": predict_data,
-        "news": fetch_news(metal["news_table"]),
+        "news": snapshot["news"],
+        "news_next_cursor": snapshot["news_next_cursor"],
         "metal_key": metal_key,
-        "latest_price": fetch_latest_close_price(metal["cost_table"]),
-        "current_user": current_user,
-        "trade_history": trade_history,
-        "positions": positions,
-        "display_current_capital": display_current_capital,
-        "performance_pct": performance_pct,
+        "latest_price": snapshot["latest_price"],
+        **user_state,
         "flash_message": flash.get("message", ""),
         "flash_level": flash.get("level", ""),
     }
-    return templates.TemplateResponse("index.html", context)
+    return templates.TemplateResponse(
+        request,
+        "index.html",
+        context,
+        headers=_etag_headers(etag) if etag else None,
+    )
 
 
 @router.post("/auth/register")
@@ -379,13 +730,14 @@ async def register(request: Request):
         return RedirectResponse("/", status_code=303)
 
     now = datetime.now()
-    password_hash = _hash_password(password)
+    # PBKDF2 занимает заметное время CPU, поэтому считается вне event loop
+    password_hash = await run_in_threadpool(_hash_password, password)
 
-    with engine.begin() as connection:
+    async with get_async_engine().begin() as connection:
         existing_stmt = select(users_table.c.id).where(
             (users_table.c.username == username) | (users_table.c.email == email)
         )
-        existing_user = connection.execute(existing_stmt).first()
+        existing_user = (await connection.execute(existing_stmt)).first()
         if existing_user:
             _set_flash(request, "Пользователь с таким логином или email уже существует.", "error")
             return RedirectResponse("/", status_code=303)
@@ -398,7 +750,7 @@ async def register(request: Request):
             current_capital=start_capital,
             created_at=now,
         ).returning(users_table.c.id)
-        new_user_id = connection.execute(insert_stmt).scalar_one()
+        new_user_id = (await connection.execute(insert_stmt)).scalar_one()
 
     request.session["user_id"] = int(new_user_id)
     _set_flash(request, "Регистрация прошла успешно.", "success")
@@ -415,11 +767,11 @@ async def login(request: Request):
         _set_flash(request, "Неверные данные для входа.", "error")
         return RedirectResponse("/", status_code=303)
 
-    with engine.connect() as connection:
+    async with get_async_reader().connect() as connection:
         stmt = select(users_table).where(users_table.c.username == username).limit(1)
-        user = connection.execute(stmt).mappings().first()
+        user = (await connection.execute(stmt)).mappings().first()
 
-    if not user or not _verify_password(password, user.get("password_hash", "")):
+    if not user or not await run_in_threadpool(_verify_password, password, user.get("password_hash", "")):
         _set_flash(request, "Неверные данные для входа.", "error")
         return RedirectResponse("/", status_code=303)
 
@@ -437,7 +789,7 @@ async def logout(request: Request):
 
 @router.post("/trade/account/set")
 async def set_account(request: Request):
-    current_user = _get_current_user(request)
+    current_user = await _get_current_user(request)
     if not current_user:
         _set_flash(request, "Сначала войдите в аккаунт.", "error")
         return RedirectResponse("/", status_code=303)
@@ -456,14 +808,16 @@ async def set_account(request: Request):
         return RedirectResponse("/", status_code=303)
 
     user_id = int(current_user["id"])
-    with engine.begin() as connection:
-        connection.execute(delete(demo_trades_table).where(demo_trades_table.c.user_id == user_id))
+    async with get_async_engine().begin() as connection:
+        await connection.execute(delete(demo_trades_table).where(demo_trades_table.c.user_id == user_id))
+        await connection.execute(delete(demo_positions_table).where(demo_positions_table.c.user_id == user_id))
         stmt = (
             update(users_table)
             .where(users_table.c.id == user_id)
             .values(start_capital=start_capital, current_capital=start_capital)
         )
-        connection.execute(stmt)
+        await connection.execute(stmt)
+    user_cache.invalidate(user_id)
 
     _set_flash(request, "Демо-счет обновлен.", "success")
     return RedirectResponse("/", status_code=303)
@@ -471,39 +825,41 @@ async def set_account(request: Request):
 
 @router.post("/trade/account/reset")
 async def reset_account(request: Request):
-    current_user = _get_current_user(request)
+    current_user = await _get_current_user(request)
     if not current_user:
         _set_flash(request, "Сначала войдите в аккаунт.", "error")
         return RedirectResponse("/", status_code=303)
 
     user_id = int(current_user["id"])
-    start_capital = float(current_user.get("start_capital") or 0.0)
 
-    with engine.begin() as connection:
-        connection.execute(delete(demo_trades_table).where(demo_trades_table.c.user_id == user_id))
-        connection.execute(
+    async with get_async_engine().begin() as connection:
+        await connection.execute(delete(demo_trades_table).where(demo_trades_table.c.user_id == user_id))
+        await connection.execute(delete(demo_positions_table).where(demo_positions_table.c.user_id == user_id))
+        # Стартовый капитал берётся из строки пользователя: в кеше воркера он может быть устаревшим
+        await connection.execute(
             update(users_table)
             .where(users_table.c.id == user_id)
-            .values(current_capital=start_capital)
+            .values(current_capital=users_table.c.start_capital)
         )
+    user_cache.invalidate(user_id)
 
     _set_flash(request, "Результаты демоторговли сброшены.", "success")
     return RedirectResponse("/", status_code=303)
 
 
+def _round_money(value):
+    # Капитал хранится с точностью до копеек: без округления погрешность float копится от сделки к сделке
+    return func.round(cast(value, Numeric), 2)
+
+
 @router.post("/trade/{metal_key}/execute")
 async def execute_trade(request: Request, metal_key: str):
-    current_user = _get_current_user(request)
+    current_user = await _get_current_user(request)
     if not current_user:
         _set_flash(request, "Сначала войдите в аккаунт.", "error")
         return RedirectResponse(f"/{metal_key}", status_code=303)
 
-    metals = {
-        "gold": gold_cost_table,
-        "silver": silver_cost_table,
-        "cupp": copper_cost_table,
-    }
-    if metal_key not in metals:
+    if metal_key not in METALS:
         _set_flash(request, "Неизвестный инструмент.", "error")
         return RedirectResponse("/", status_code=303)
 
@@ -525,46 +881,70 @@ async def execute_trade(request: Request, metal_key: str):
         _set_flash(request, "Количество должно быть больше 0.", "error")
         return RedirectResponse(f"/{metal_key}", status_code=303)
 
-    price = fetch_latest_close_price(metals[metal_key])
+    # Сделка исполняется по цене из БД: свечу дня мог только что обновить поток минутных свечей
+    price = await fetch_latest_close_price(METALS[metal_key]["cost_table"], cached=False)
     total = round(price * quantity, 2)
     user_id = int(current_user["id"])
 
-    with engine.begin() as connection:
-        user_stmt = select(users_table).where(users_table.c.id == user_id).limit(1)
-        user = connection.execute(user_stmt).mappings().first()
-        if not user:
-            _set_flash(request, "Пользователь не найден.", "error")
-            return RedirectResponse(f"/{metal_key}", status_code=303)
-
-        current_capital = float(user.get("current_capital") or 0.0)
-
-        trade_rows_stmt = select(
-            demo_trades_table.c.side,
-            demo_trades_table.c.quantity,
-        ).where(
-            (demo_trades_table.c.user_id == user_id) & (demo_trades_table.c.metal_key == metal_key)
-        )
-        trade_rows = connection.execute(trade_rows_stmt).mappings().all()
-
-        position_quantity = 0.0
-        for row in trade_rows:
-            if row.get("side") == "buy":
-                position_quantity += float(row.get("quantity") or 0.0)
-            elif row.get("side") == "sell":
-                position_quantity -= float(row.get("quantity") or 0.0)
+    user_filter = users_table.c.id == user_id
+    capital = users_table.c.current_capital
 
+    # Капитал меняется атомарным UPDATE ... RETURNING, строка пользователя заново не читается
+    async with get_async_engine().begin() as connection:
         if side == "buy":
-            if total > current_capital:
+            new_capital = (await connection.execute(
+                update(users_table)
+                .where(user_filter & (capital >= total))
+                .values(current_capital=_round_money(capital - total))
+                .returning(capital)
+            )).scalar_one_or_none()
+            if new_capital is None:
+                # Капитал в кэше мог устареть — при следующем запросе строка перечитается
+                user_cache.invalidate(user_id)
                 _set_flash(request, "Недостаточно средств на демо-счете.", "error")
                 return RedirectResponse(f"/{metal_key}", status_code=303)
-            new_capital = round(current_capital - total, 2)
+
+            # Средняя цена пересчитывается в том же UPSERT, без чтения позиции
+            position_stmt = pg_insert(demo_positions_table).values(
+                user_id=user_id,
+                metal_key=metal_key,
+                quantity=quantity,
+                avg_price=price,
+            )
+            held = demo_positions_table.c.quantity
+            await connection.execute(
+                position_stmt.on_conflict_do_update(
+                    index_elements=[demo_positions_table.c.user_id, demo_positions_table.c.metal_key],
+                    set_={
+                        "quantity": held + position_stmt.excluded.quantity,
+                        "avg_price": (
+                            held * demo_positions_table.c.avg_price
+                            + position_stmt.excluded.quantity * position_stmt.excluded.avg_price
+                        ) / (held + position_stmt.excluded.quantity),
+                    },
+                )
+            )
         else:
-            if quantity > position_quantity:
+            position_filter = (
+                (demo_positions_table.c.user_id == user_id)
+                & (demo_positions_table.c.metal_key == metal_key)
+            )
+            remaining = (await connection.execute(
+                update(demo_positions_table)
+                .where(position_filter & (demo_positions_table.c.quantity >= quantity))
+                .values(quantity=demo_positions_table.c.quantity - quantity)
+                .returning(demo_positions_table.c.quantity)
+            )).scalar_one_or_none()
+            if remaining is None:
                 _set_flash(request, "Нельзя продать больше, чем есть в позиции.", "error")
                 return RedirectResponse(f"/{metal_key}", status_code=303)
-            new_capital = round(current_capital + total, 2)
+            if round(remaining, 8) <= 0:
+                await connection.execute(delete(demo_positions_table).where(position_filter))
+            await connection.execute(
+                update(users_table).where(user_filter).values(current_capital=_round_money(capital + total))
+            )
 
-        connection.execute(
+        await connection.execute(
             insert(demo_trades_table).values(
                 user_id=user_id,
                 metal_key=metal_key,
@@ -575,15 +955,29 @@ async def execute_trade(request: Request, metal_key: str):
                 created_at=datetime.now(),
             )
         )
-        connection.execute(
-            update(users_table)
-            .where(users_table.c.id == user_id)
-            .values(current_capital=new_capital)
-        )
+    user_cache.invalidate(user_id)
 
     _set_flash(request, "Сделка выполнена.", "success")
     return RedirectResponse(f"/{metal_key}", status_code=303)
 
+def update_all_data():
+    """Run the data update pipeline.
+
+    The pipeline (scrapers, the Tinkoff client, pandas) is imported on first
+    use, so web workers boot without it.
+    """
+    from db.update_information import update_all_data as run_update
+
+    return run_update()
+
+
+def run_price_predictions():
+    """Run the LSTM predictions; TensorFlow is imported on first use."""
+    from db.update_information import run_price_predictions as run_predictions
+
+    return run_predictions()
+
+
 @router.post("/api/update-data")
 async def api_update_data(request: Request):
     """Trigger full data update (prices + news).
@@ -592,6 +986,9 @@ async def api_update_data(request: Request):
     the event loop. Returns summary JSON with inserted counts / errors.
     """
     result = await run_in_threadpool(update_all_data)
+    snapshot_cache.clear()
+    window_cache.clear()
+    data_versions.invalidate()
     return JSONResponse(result)
 
 
@@ -602,24 +999,211 @@ async def api_run_predictions(request: Request):
     Runs the prediction function in a threadpool and returns status.
     """
     result = await run_in_threadpool(run_price_predictions)
+    snapshot_cache.clear()
+    window_cache.clear()
+    data_versions.invalidate()
     return JSONResponse(result)
 
 
-@router.get('/', response_class=HTMLResponse)
-async def index(request: Request):
-    return render_metal(request, "gold")
+INTERNAL_TOKEN_HEADER = "X-Internal-Token"
+
 
+def _require_internal_token(request: Request) -> None:
+    """Доступ к служебным эндпоинтам DAG — только с общим токеном INTERNAL_API_TOKEN"""
+    expected = os.getenv("INTERNAL_API_TOKEN", "")
+    if not expected:
+        # Без настроенного токена эндпоинт закрыт, а не открыт для всех
+        raise HTTPException(status_code=503, detail="Служебный токен INTERNAL_API_TOKEN не задан.")
+    provided = request.headers.get(INTERNAL_TOKEN_HEADER, "")
+    if not hmac.compare_digest(provided.encode("utf-8"), expected.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Неверный служебный токен.")
 
-@router.get('/gold', response_class=HTMLResponse)
-async def gold(request: Request):
-    return render_metal(request, "gold")
 
+@router.post("/api/archive-news")
+async def api_archive_news(request: Request, older_than_days: int | None = Query(None, ge=1)):
+    """Move bodies of articles older than the retention age into the compressed archive.
 
-@router.get('/silver', response_class=HTMLResponse)
-async def silver(request: Request):
-    return render_metal(request, "silver")
+    Titles, dates, urls and sentiment stay in the news table; the article
+    endpoint keeps returning archived bodies. Defaults to NEWS_RETENTION_DAYS.
+    Requires the shared INTERNAL_API_TOKEN in the X-Internal-Token header.
+    """
+    _require_internal_token(request)
+    result = await run_in_threadpool(archive_old_news, older_than_days)
+    return JSONResponse(result)
+
+
+@router.get("/api/cache-stats")
+async def api_cache_stats():
+    """Hit/miss counters of the dashboard snapshot cache and the API window cache."""
+    return JSONResponse({"snapshot": snapshot_cache.stats(), "windows": window_cache.stats()})
+
+
+@router.get("/metrics")
+async def metrics():
+    """Per-statement DB timings, row counts, errors and pool state in Prometheus text format.
+
+    Series are labelled by engine, calling function and statement type; the
+    counters are per worker process.
+    """
+    body = query_metrics.render() + render_pool_metrics(pool_stats())
+    return Response(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.get("/api/pool-stats")
+async def api_pool_stats():
+    """Connection pool saturation and checkout latency of this worker."""
+    return JSONResponse(pool_stats())
+
+
+def _get_metal_or_404(metal_key: str) -> dict:
+    metal = METALS.get(metal_key)
+    if metal is None:
+        raise HTTPException(status_code=404, detail="Неизвестный инструмент.")
+    return metal
+
+
+@router.get("/api/{metal_key}/candles")
+async def api_candles(
+    request: Request,
+    metal_key: str,
+    start_date: datetime | None = Query(None, alias="from"),
+    end_date: datetime | None = Query(None, alias="to"),
+    limit: int | None = Query(None, ge=1, le=5000),
+    since: datetime | None = None,
+    timeframe: str = Query("1D", pattern="^(1D|1W|1M)$"),
+    max_points: int | None = Query(None, ge=10, le=5000),
+):
+    """Candles for a date window, the last `limit` bars, or bars newer than `since`.
+
+    `timeframe` aggregates daily bars into weeks or months, `max_points`
+    merges neighbouring bars down to a point budget (e.g. the chart width).
+    For aggregated timeframes `since` also returns the still open bucket.
+    """
+    metal = _get_metal_or_404(metal_key)
+    if since is not None:
+        # Дельта не кешируется: свечу текущего дня дописывает db/intraday.py из другого процесса
+        candles = await fetch_candles(metal["cost_table"], start_date, end_date, limit, since, timeframe, max_points)
+        return JSONResponse({"metal": metal_key, "candles": candles})
+    etag = await _data_etag(request, metal_key)
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    candles = await window_cache.aget_or_set(
+        ("candles", metal_key, await _data_version(metal_key), start_date, end_date, limit, None, timeframe, max_points),
+        lambda: fetch_candles(metal["cost_table"], start_date, end_date, limit, None, timeframe, max_points),
+    )
+    return JSONResponse({"metal": metal_key, "candles": candles}, headers=_etag_headers(etag))
+
+
+@router.get("/api/{metal_key}/intraday")
+async def api_intraday(
+    metal_key: str,
+    since: datetime | None = None,
+    limit: int = Query(INTRADAY_PAGE_SIZE, ge=1, le=5000),
+):
+    """Minute bars written by the stream ingestor: the last `limit` bars or those newer than `since`.
+
+    `time` is a UTC Unix timestamp. The response is not cached, since the
+    ingestor writes from its own process.
+    """
+    metal = _get_metal_or_404(metal_key)
+    candles = await fetch_intraday_candles(metal["instrument"], since, limit)
+    return JSONResponse({"metal": metal_key, "candles": candles})
+
+
+@router.get("/api/{metal_key}/forecasts")
+async def api_forecasts(
+    request: Request,
+    metal_key: str,
+    start_date: datetime | None = Query(None, alias="from"),
+    end_date: datetime | None = Query(None, alias="to"),
+    limit: int | None = Query(None, ge=1, le=5000),
+    since: datetime | None = None,
+):
+    """Forecast candles with the same window parameters as the candle API."""
+    metal = _get_metal_or_404(metal_key)
+    etag = await _data_etag(request, metal_key)
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    forecasts = await window_cache.aget_or_set(
+        ("forecasts", metal_key, await _data_version(metal_key), start_date, end_date, limit, since),
+        lambda: fetch_predict_candles(metal["predict_table"], start_date, end_date, limit, since),
+    )
+    return JSONResponse({"metal": metal_key, "forecasts": forecasts}, headers=_etag_headers(etag))
+
+
+@router.get("/api/{metal_key}/news")
+async def api_news(
+    request: Request,
+    metal_key: str,
+    cursor: str | None = None,
+    limit: int = Query(NEWS_PAGE_SIZE, ge=1, le=100),
+):
+    """News listing without article bodies; `cursor` comes from the previous page."""
+    metal = _get_metal_or_404(metal_key)
+    before = _parse_news_cursor(cursor) if cursor else None
+    etag = await _data_etag(request, metal_key)
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    news = await fetch_news(metal["news_table"], limit, before)
+    return JSONResponse(
+        {"news": news, "next_cursor": _next_news_cursor(news, limit)},
+        headers=_etag_headers(etag),
+    )
+
+
+@router.get("/api/{metal_key}/news/search")
+async def api_news_search(
+    request: Request,
+    metal_key: str,
+    q: str = Query(..., min_length=2, max_length=200),
+    start_date: datetime | None = Query(None, alias="from"),
+    end_date: datetime | None = Query(None, alias="to"),
+    limit: int = Query(NEWS_PAGE_SIZE, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+):
+    """Full-text search over title, description and body, best matches first.
+
+    `q` uses web search syntax ("quoted phrases", `or`, `-excluded`) and is
+    matched with both Russian and English stemming; `from`/`to` limit the
+    article date. Pages are requested with `offset`.
+    """
+    metal = _get_metal_or_404(metal_key)
+    etag = await _data_etag(request, metal_key)
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    news = await search_news(metal["instrument"], q.strip(), start_date, end_date, limit, offset)
+    next_offset = offset + limit if len(news) == limit else None
+    return JSONResponse(
+        {"query": q, "news": news, "next_offset": next_offset},
+        headers=_etag_headers(etag),
+    )
+
+
+@router.get("/api/{metal_key}/news/{news_id}")
+async def api_news_body(request: Request, metal_key: str, news_id: int):
+    """Full article text, requested by the news modal when it is opened."""
+    metal = _get_metal_or_404(metal_key)
+    etag = await _data_etag(request, metal_key)
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    article = await fetch_news_body(metal["news_table"], news_id)
+    if article is None:
+        raise HTTPException(status_code=404, detail="Новость не найдена.")
+    return JSONResponse(article, headers=_etag_headers(etag))
+
+
+@router.get('/', response_class=HTMLResponse)
+async def index(request: Request):
+    return await render_metal(request, DEFAULT_METAL)
 
 
-@router.get('/cupp', response_class=HTMLResponse)
-async def cupp(request: Request):
-    return render_metal(request, "cupp")
+# Последний маршрут: страница любого металла из реестра (/gold, /silver, /cupp, ...)
+@router.get('/{metal_key}', response_class=HTMLResponse)
+async def metal_page(request: Request, metal_key: str):
+    _get_metal_or_404(metal_key)
+    return await render_metal(request, metal_key)
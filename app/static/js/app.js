@@ -3,6 +3,10 @@ const maButtonsContainer = document.getElementById('ma-buttons');
 const maButtons = maButtonsContainer
     ? Array.from(maButtonsContainer.querySelectorAll('.ma-btn'))
     : [];
+const timeframeButtonsContainer = document.getElementById('timeframe-buttons');
+const timeframeButtons = timeframeButtonsContainer
+    ? Array.from(timeframeButtonsContainer.querySelectorAll('.ma-btn'))
+    : [];
 
 const resolveAutoMaPeriod = (visibleBars) => {
     if (visibleBars <= 40) return 10;
@@ -35,33 +39,63 @@ const calculateSma = (candles, period) => {
     return maData;
 };
 
+const INITIAL_BARS = 365;
+const INITIAL_VISIBLE_BARS = 250;
+const HISTORY_PAGE_BARS = 365;
+const HISTORY_PRELOAD_BARS = 20;
+const POLL_INTERVAL_MS = 5 * 60 * 1000;
+const PREDICT_BARS = 5;
+
+const fetchJson = async (url) => {
+    const response = await fetch(url, { headers: { Accept: 'application/json' } });
+    if (!response.ok) {
+        throw new Error(`Request failed: ${response.status} ${url}`);
+    }
+    return response.json();
+};
+
+const shiftDay = (time, days) => {
+    const date = new Date(`${time}T00:00:00Z`);
+    date.setUTCDate(date.getUTCDate() + days);
+    return date.toISOString().slice(0, 10);
+};
+
+const createDarkChart = (container, extraOptions = {}) => LightweightCharts.createChart(container, {
+    layout: {
+        background: { color: '#101621' },
+        textColor: '#cbd5f5',
+        fontFamily: 'Inter, sans-serif',
+    },
+    grid: {
+        vertLines: { color: 'rgba(148, 163, 184, 0.1)' },
+        horzLines: { color: 'rgba(148, 163, 184, 0.1)' },
+    },
+    timeScale: {
+        borderColor: 'rgba(148, 163, 184, 0.2)',
+    },
+    rightPriceScale: {
+        borderColor: 'rgba(148, 163, 184, 0.2)',
+    },
+    height: container.clientHeight,
+    width: container.clientWidth,
+    ...extraOptions,
+});
+
 if (chartContainer && window.LightweightCharts) {
-    const rawData = chartContainer.dataset.series;
-    const rawPredictData = chartContainer.dataset.predictSeries;
-    const seriesData = rawData ? JSON.parse(rawData) : [];
-    const predictData = rawPredictData ? JSON.parse(rawPredictData) : [];
-
-    const chart = LightweightCharts.createChart(chartContainer, {
-        layout: {
-            background: { color: '#101621' },
-            textColor: '#cbd5f5',
-            fontFamily: 'Inter, sans-serif',
-        },
-        grid: {
-            vertLines: { color: 'rgba(148, 163, 184, 0.1)' },
-            horzLines: { color: 'rgba(148, 163, 184, 0.1)' },
-        },
-        timeScale: {
-            borderColor: 'rgba(148, 163, 184, 0.2)',
-        },
-        rightPriceScale: {
-            borderColor: 'rgba(148, 163, 184, 0.2)',
-        },
+    const metalKey = chartContainer.dataset.metalKey;
+    const candlesUrl = `/api/${metalKey}/candles`;
+    const forecastsUrl = `/api/${metalKey}/forecasts`;
+
+    let seriesData = [];
+    let timeframe = '1D';
+    let loadGeneration = 0;
+    let isLoadingHistory = false;
+    let historyExhausted = false;
+
+    const chart = createDarkChart(chartContainer, {
         crosshair: {
             mode: LightweightCharts.CrosshairMode.Normal,
         },
-        height: chartContainer.clientHeight,
-        width: chartContainer.clientWidth,
     });
 
     const candlestickSeries = chart.addCandlestickSeries({
@@ -73,8 +107,6 @@ if (chartContainer && window.LightweightCharts) {
         wickDownColor: '#ef4444',
     });
 
-    candlestickSeries.setData(seriesData);
-
     const maSeries = chart.addLineSeries({
         color: '#60a5fa',
         lineWidth: 2,
@@ -82,6 +114,17 @@ if (chartContainer && window.LightweightCharts) {
         lastValueVisible: false,
     });
 
+    const predictCandlestickSeries = chart.addCandlestickSeries({
+        upColor: '#40E0D0',
+        downColor: '#a963ea',
+        borderUpColor: '#40E0D0',
+        borderDownColor: '#a963ea',
+        wickUpColor: '#40E0D0',
+        wickDownColor: '#a963ea',
+        priceLineVisible: true,
+        lastValueVisible: true,
+    });
+
     const getSelectedMaValue = () => {
         const activeButton = maButtons.find((button) => button.classList.contains('is-active'));
         return activeButton ? activeButton.dataset.maValue : 'off';
@@ -112,110 +155,17 @@ if (chartContainer && window.LightweightCharts) {
         maSeries.setData(calculateSma(seriesData, period));
     };
 
-    if (predictData.length > 0) {
-        // Helper to parse time values and safely sort by prediction date
-        const parseTimeForSort = (t) => {
-            if (typeof t === 'number') return t;
-            const parsed = Date.parse(String(t));
-            return Number.isNaN(parsed) ? 0 : parsed;
-        };
-
-        const getLastNPredictions = (data, n = 5) => {
-            if (!Array.isArray(data) || data.length === 0) return [];
-            const sorted = data.slice().sort((a, b) => parseTimeForSort(a.time) - parseTimeForSort(b.time));
-            return sorted.slice(Math.max(0, sorted.length - n));
-        };
-
-        const filteredPredictData = getLastNPredictions(predictData, 5);
-
-        const predictCandlestickSeries = chart.addCandlestickSeries({
-            upColor: '#40E0D0',
-            downColor: '#a963ea',
-            borderUpColor: '#40E0D0',
-            borderDownColor: '#a963ea',
-            wickUpColor: '#40E0D0',
-            wickDownColor: '#a963ea',
-            priceLineVisible: true,
-            lastValueVisible: true,
-        });
-        predictCandlestickSeries.setData(filteredPredictData);
-    }
-
-    maButtons.forEach((button) => {
-        button.addEventListener('click', () => {
-            maButtons.forEach((item) => item.classList.remove('is-active'));
-            button.classList.add('is-active');
-            updateMaSeries();
-        });
-    });
-
-    chart.timeScale().subscribeVisibleLogicalRangeChange(() => {
-        if (getSelectedMaValue() === 'auto') {
-            updateMaSeries();
-        }
-    });
-
-    updateMaSeries();
-
-    chart.timeScale().fitContent();
-
     const volumeChartContainer = document.getElementById('volume-chart');
-    if (volumeChartContainer) {
-        const volumeChart = LightweightCharts.createChart(volumeChartContainer, {
-            layout: {
-                background: { color: '#101621' },
-                textColor: '#cbd5f5',
-                fontFamily: 'Inter, sans-serif',
-            },
-            grid: {
-                vertLines: { color: 'rgba(148, 163, 184, 0.1)' },
-                horzLines: { color: 'rgba(148, 163, 184, 0.1)' },
-            },
-            timeScale: {
-                borderColor: 'rgba(148, 163, 184, 0.2)',
-            },
-            rightPriceScale: {
-                borderColor: 'rgba(148, 163, 184, 0.2)',
-            },
-            height: volumeChartContainer.clientHeight,
-            width: volumeChartContainer.clientWidth,
-        });
-
-        const volumeSeries = volumeChart.addHistogramSeries({
+    const volumeChart = volumeChartContainer ? createDarkChart(volumeChartContainer) : null;
+    const volumeSeries = volumeChart
+        ? volumeChart.addHistogramSeries({
             color: '#3b82f6',
-        });
-
-        const volumeData = seriesData.map(candle => ({
-            time: candle.time,
-            value: candle.volume || 0,
-        }));
-
-        volumeSeries.setData(volumeData);
-        volumeChart.timeScale().fitContent();
-
-        window.addEventListener('resize', () => {
-            volumeChart.applyOptions({
-                width: volumeChartContainer.clientWidth,
-                height: volumeChartContainer.clientHeight,
-            });
-        });
-    }
+        })
+        : null;
 
     const rsiChartContainer = document.getElementById('rsi-chart');
-    if (rsiChartContainer) {
-        const rsiChart = LightweightCharts.createChart(rsiChartContainer, {
-            layout: {
-                background: { color: '#101621' },
-                textColor: '#cbd5f5',
-                fontFamily: 'Inter, sans-serif',
-            },
-            grid: {
-                vertLines: { color: 'rgba(148, 163, 184, 0.1)' },
-                horzLines: { color: 'rgba(148, 163, 184, 0.1)' },
-            },
-            timeScale: {
-                borderColor: 'rgba(148, 163, 184, 0.2)',
-            },
+    const rsiChart = rsiChartContainer
+        ? createDarkChart(rsiChartContainer, {
             rightPriceScale: {
                 borderColor: 'rgba(148, 163, 184, 0.2)',
                 scaleMargins: {
@@ -223,57 +173,201 @@ if (chartContainer && window.LightweightCharts) {
                     bottom: 0.1,
                 },
             },
-            height: rsiChartContainer.clientHeight,
-            width: rsiChartContainer.clientWidth,
-        });
-
-        const rsiLineSeries = rsiChart.addLineSeries({
+        })
+        : null;
+    const rsiLineSeries = rsiChart
+        ? rsiChart.addLineSeries({
             color: '#f59e0b',
             lineWidth: 2,
-        });
+        })
+        : null;
+    const rsiUpperSeries = rsiChart
+        ? rsiChart.addLineSeries({
+            color: 'rgba(239, 68, 68, 0.3)',
+            lineWidth: 1,
+        })
+        : null;
+    const rsiLowerSeries = rsiChart
+        ? rsiChart.addLineSeries({
+            color: 'rgba(34, 197, 94, 0.3)',
+            lineWidth: 1,
+        })
+        : null;
+
+    const toVolumePoint = (candle) => ({
+        time: candle.time,
+        value: candle.volume || 0,
+    });
+
+    const renderSeries = () => {
+        candlestickSeries.setData(seriesData);
+        updateMaSeries();
 
-        const rsiData = seriesData
-            .filter(candle => 'rsi' in candle)
-            .map(candle => ({
+        if (volumeSeries) {
+            volumeSeries.setData(seriesData.map(toVolumePoint));
+        }
+
+        if (rsiLineSeries) {
+            rsiLineSeries.setData(seriesData
+                .filter(candle => 'rsi' in candle)
+                .map(candle => ({
+                    time: candle.time,
+                    value: candle.rsi,
+                })));
+            rsiUpperSeries.setData(seriesData.map(candle => ({
+                time: candle.time,
+                value: 70,
+            })));
+            rsiLowerSeries.setData(seriesData.map(candle => ({
                 time: candle.time,
-                value: candle.rsi,
-            }));
+                value: 30,
+            })));
+        }
+    };
+
+    const loadForecasts = async () => {
+        const payload = await fetchJson(`${forecastsUrl}?limit=${PREDICT_BARS}`);
+        predictCandlestickSeries.setData(payload.forecasts || []);
+    };
+
+    const candlesQuery = (params) => {
+        const query = new URLSearchParams({ timeframe, ...params });
+        return `${candlesUrl}?${query.toString()}`;
+    };
 
-        if (rsiData.length > 0) {
-            rsiLineSeries.setData(rsiData);
+    const loadInitialCandles = async () => {
+        const generation = ++loadGeneration;
+        // Weekly and monthly series are short: load them whole, merged down to the chart width
+        const params = timeframe === '1D'
+            ? { limit: INITIAL_BARS }
+            : { max_points: Math.max(10, Math.round(chartContainer.clientWidth)) };
+        const payload = await fetchJson(candlesQuery(params));
+        if (generation !== loadGeneration) return;
+
+        seriesData = payload.candles || [];
+        historyExhausted = timeframe !== '1D' || seriesData.length < INITIAL_BARS;
+        renderSeries();
+
+        // Keep the visible window smaller than the loaded one so history is not fetched right away
+        chart.timeScale().setVisibleLogicalRange({
+            from: Math.max(0, seriesData.length - INITIAL_VISIBLE_BARS),
+            to: seriesData.length - 1,
+        });
+        if (volumeChart) volumeChart.timeScale().fitContent();
+        if (rsiChart) rsiChart.timeScale().fitContent();
+    };
+
+    // Older history is fetched when the user scrolls towards the left edge
+    const loadOlderCandles = async () => {
+        if (isLoadingHistory || historyExhausted || seriesData.length === 0) return;
+        isLoadingHistory = true;
+        const generation = loadGeneration;
+
+        try {
+            const firstTime = seriesData[0].time;
+            const to = shiftDay(firstTime, -1);
+            const payload = await fetchJson(candlesQuery({ to, limit: HISTORY_PAGE_BARS }));
+            if (generation !== loadGeneration) return;
+
+            const older = (payload.candles || []).filter(candle => candle.time < firstTime);
+            historyExhausted = older.length < HISTORY_PAGE_BARS;
+
+            if (older.length > 0) {
+                seriesData = older.concat(seriesData);
+                renderSeries();
+            }
+        } catch (error) {
+            console.error(error);
+        } finally {
+            isLoadingHistory = false;
         }
+    };
 
-        rsiChart.addLineSeries({
-            color: 'rgba(239, 68, 68, 0.3)',
-            lineWidth: 1,
-        }).setData(seriesData.map(candle => ({
-            time: candle.time,
-            value: 70,
-        })));
+    // New bars are polled as a delta: the server returns only bars after the last known date
+    // (for weekly/monthly bars it also resends the still open bucket, which replaces the last bar)
+    const pollNewCandles = async () => {
+        if (seriesData.length === 0) return;
+
+        const generation = loadGeneration;
+        const lastTime = seriesData[seriesData.length - 1].time;
+        const payload = await fetchJson(candlesQuery({ since: lastTime }));
+        if (generation !== loadGeneration) return;
+
+        const fresh = (payload.candles || []).filter(candle => candle.time >= lastTime);
+
+        fresh.forEach((candle) => {
+            if (candle.time === seriesData[seriesData.length - 1].time) {
+                seriesData[seriesData.length - 1] = candle;
+            } else {
+                seriesData.push(candle);
+            }
+            candlestickSeries.update(candle);
+            if (volumeSeries) volumeSeries.update(toVolumePoint(candle));
+            if (rsiLineSeries && 'rsi' in candle) {
+                rsiLineSeries.update({ time: candle.time, value: candle.rsi });
+                rsiUpperSeries.update({ time: candle.time, value: 70 });
+                rsiLowerSeries.update({ time: candle.time, value: 30 });
+            }
+        });
 
-        rsiChart.addLineSeries({
-            color: 'rgba(34, 197, 94, 0.3)',
-            lineWidth: 1,
-        }).setData(seriesData.map(candle => ({
-            time: candle.time,
-            value: 30,
-        })));
+        if (fresh.length > 0) {
+            updateMaSeries();
+            await loadForecasts();
+        }
+    };
 
-        rsiChart.timeScale().fitContent();
+    timeframeButtons.forEach((button) => {
+        button.addEventListener('click', () => {
+            if (button.dataset.timeframe === timeframe) return;
+            timeframeButtons.forEach((item) => item.classList.remove('is-active'));
+            button.classList.add('is-active');
+            timeframe = button.dataset.timeframe;
+            loadInitialCandles().catch((error) => console.error(error));
+        });
+    });
 
-        window.addEventListener('resize', () => {
-            rsiChart.applyOptions({
-                width: rsiChartContainer.clientWidth,
-                height: rsiChartContainer.clientHeight,
-            });
+    maButtons.forEach((button) => {
+        button.addEventListener('click', () => {
+            maButtons.forEach((item) => item.classList.remove('is-active'));
+            button.classList.add('is-active');
+            updateMaSeries();
+        });
+    });
+
+    chart.timeScale().subscribeVisibleLogicalRangeChange((logicalRange) => {
+        if (getSelectedMaValue() === 'auto') {
+            updateMaSeries();
+        }
+        if (logicalRange && logicalRange.from < HISTORY_PRELOAD_BARS) {
+            loadOlderCandles();
+        }
+    });
+
+    Promise.all([loadInitialCandles(), loadForecasts()])
+        .catch((error) => console.error(error))
+        .finally(() => {
+            window.setInterval(() => {
+                pollNewCandles().catch((error) => console.error(error));
+            }, POLL_INTERVAL_MS);
         });
-    }
 
     window.addEventListener('resize', () => {
         chart.applyOptions({
             width: chartContainer.clientWidth,
             height: chartContainer.clientHeight,
         });
+        if (volumeChart) {
+            volumeChart.applyOptions({
+                width: volumeChartContainer.clientWidth,
+                height: volumeChartContainer.clientHeight,
+            });
+        }
+        if (rsiChart) {
+            rsiChart.applyOptions({
+                width: rsiChartContainer.clientWidth,
+                height: rsiChartContainer.clientHeight,
+            });
+        }
     });
 }
 
@@ -282,14 +376,37 @@ const authModal = document.getElementById('auth-modal');
 const modalTitle = document.getElementById('modal-title');
 const modalDate = document.getElementById('modal-date');
 const modalBody = document.getElementById('modal-body');
+const newsList = document.querySelector('.news-list');
+const newsCounter = document.querySelector('.news-counter');
+const newsMoreButton = document.getElementById('news-more');
+const newsMetalKey = newsList ? newsList.dataset.metalKey : '';
+const newsBodies = new Map();
+
+const loadNewsBody = async (newsId) => {
+    if (!newsBodies.has(newsId)) {
+        const article = await fetchJson(`/api/${newsMetalKey}/news/${newsId}`);
+        newsBodies.set(newsId, article.body || '');
+    }
+    return newsBodies.get(newsId);
+};
 
 const openModal = (card) => {
     if (!modal) return;
+    const newsId = card.dataset.newsId;
     modalTitle.textContent = card.dataset.title || '';
     modalDate.textContent = card.dataset.date || '';
-    modalBody.textContent = card.dataset.body || '';
+    modalBody.textContent = 'Загрузка...';
+    modal.dataset.newsId = newsId;
     modal.classList.add('is-open');
     modal.setAttribute('aria-hidden', 'false');
+
+    loadNewsBody(newsId)
+        .then((body) => {
+            if (modal.dataset.newsId === newsId) modalBody.textContent = body;
+        })
+        .catch(() => {
+            if (modal.dataset.newsId === newsId) modalBody.textContent = 'Не удалось загрузить текст новости.';
+        });
 };
 
 const closeModal = () => {
@@ -310,15 +427,71 @@ const closeAuthModal = () => {
     authModal.setAttribute('aria-hidden', 'true');
 };
 
-document.querySelectorAll('.news-card').forEach((card) => {
-    card.addEventListener('click', () => openModal(card));
-    card.addEventListener('keydown', (event) => {
-        if (event.key === 'Enter' || event.key === ' ') {
+const createNewsCard = (item) => {
+    const card = document.createElement('div');
+    card.className = 'news-card';
+    card.setAttribute('role', 'button');
+    card.tabIndex = 0;
+    card.dataset.newsId = item.id;
+    card.dataset.title = item.title;
+    card.dataset.date = item.date;
+
+    const header = document.createElement('div');
+    header.className = 'news-card-header';
+    const title = document.createElement('h3');
+    title.textContent = item.title;
+    const date = document.createElement('span');
+    date.textContent = item.date;
+    header.append(title, date);
+
+    const summary = document.createElement('p');
+    summary.textContent = item.summary;
+    const more = document.createElement('span');
+    more.className = 'news-more';
+    more.textContent = 'Читать полностью';
+
+    card.append(header, summary, more);
+    return card;
+};
+
+if (newsList) {
+    // Delegated handlers also cover cards appended by "load more"
+    newsList.addEventListener('click', (event) => {
+        const card = event.target.closest('.news-card');
+        if (card) openModal(card);
+    });
+    newsList.addEventListener('keydown', (event) => {
+        const card = event.target.closest('.news-card');
+        if (card && (event.key === 'Enter' || event.key === ' ')) {
             event.preventDefault();
             openModal(card);
         }
     });
-});
+}
+
+if (newsList && newsMoreButton) {
+    newsMoreButton.addEventListener('click', async () => {
+        const cursor = newsMoreButton.dataset.nextCursor;
+        if (!cursor) return;
+        newsMoreButton.disabled = true;
+
+        try {
+            const payload = await fetchJson(`/api/${newsMetalKey}/news?cursor=${encodeURIComponent(cursor)}`);
+            (payload.news || []).forEach((item) => newsList.append(createNewsCard(item)));
+            if (newsCounter) newsCounter.textContent = newsList.querySelectorAll('.news-card').length;
+
+            if (payload.next_cursor) {
+                newsMoreButton.dataset.nextCursor = payload.next_cursor;
+                newsMoreButton.disabled = false;
+            } else {
+                newsMoreButton.remove();
+            }
+        } catch (error) {
+            console.error(error);
+            newsMoreButton.disabled = false;
+        }
+    });
+}
 
 document.querySelectorAll('[data-modal-close]').forEach((element) => {
     element.addEventListener('click', closeModal);
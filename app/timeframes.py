@@ -0,0 +1,108 @@
+"""Timeframe aggregation and downsampling of chart candles.
+
+Daily candles are grouped into weekly (1W) or monthly (1M) buckets, and a
+series can be reduced to a point budget (roughly the chart width in pixels)
+by merging neighbouring bars. Both operations keep OHLC semantics: open of
+the first bar, close of the last one, extreme high/low and summed volume.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+from app.indicators import compute_rsi
+
+
+TIMEFRAMES = ("1D", "1W", "1M")
+
+
+def bucket_starts(days: np.ndarray, timeframe: str) -> np.ndarray:
+    """Start date of the bucket every day falls into."""
+    days = days.astype("datetime64[D]")
+    if timeframe == "1D":
+        return days
+    if timeframe == "1W":
+        # 1970-01-01 was a Thursday: shift every date back to its Monday
+        offsets = (days.astype(np.int64) + 3) % 7
+        return days - offsets.astype("timedelta64[D]")
+    if timeframe == "1M":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"Unknown timeframe: {timeframe}")
+
+
+def bucket_start(value: datetime, timeframe: str) -> str:
+    day = np.array([value.date().isoformat()], dtype="datetime64[D]")
+    return str(bucket_starts(day, timeframe)[0])
+
+
+def _columns(candles: list[dict]) -> dict[str, np.ndarray]:
+    return {
+        "time": np.array([candle["time"] for candle in candles], dtype="datetime64[D]"),
+        "open": np.array([candle["open"] for candle in candles], dtype=np.float64),
+        "high": np.array([candle["high"] for candle in candles], dtype=np.float64),
+        "low": np.array([candle["low"] for candle in candles], dtype=np.float64),
+        "close": np.array([candle["close"] for candle in candles], dtype=np.float64),
+        "volume": np.array([candle.get("volume") or 0 for candle in candles], dtype=np.int64),
+    }
+
+
+def _merge(columns: dict[str, np.ndarray], starts: np.ndarray) -> dict[str, np.ndarray]:
+    ends = np.append(starts[1:], len(columns["close"])) - 1
+    return {
+        "open": columns["open"][starts],
+        "high": np.maximum.reduceat(columns["high"], starts),
+        "low": np.minimum.reduceat(columns["low"], starts),
+        "close": columns["close"][ends],
+        "volume": np.add.reduceat(columns["volume"], starts),
+    }
+
+
+def _to_candles(times: np.ndarray, merged: dict[str, np.ndarray], rsi: np.ndarray | None = None) -> list[dict]:
+    candles = []
+    for i, time in enumerate(times.astype(str)):
+        candle = {
+            "time": time,
+            "open": round(float(merged["open"][i]), 2),
+            "high": round(float(merged["high"][i]), 2),
+            "low": round(float(merged["low"][i]), 2),
+            "close": round(float(merged["close"][i]), 2),
+            "volume": int(merged["volume"][i]),
+        }
+        if rsi is not None and not np.isnan(rsi[i]):
+            candle["rsi"] = round(float(rsi[i]), 2)
+        candles.append(candle)
+    return candles
+
+
+def aggregate_candles(candles: list[dict], timeframe: str, rsi_period: int = 14, rsi_mode: str = "simple") -> list[dict]:
+    """Group ascending daily candles into `timeframe` buckets; RSI is recomputed on bucket closes."""
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f"Unknown timeframe: {timeframe}")
+    if timeframe == "1D" or not candles:
+        return candles
+
+    columns = _columns(candles)
+    buckets = bucket_starts(columns["time"], timeframe)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    merged = _merge(columns, starts)
+    return _to_candles(buckets[starts], merged, compute_rsi(merged["close"], rsi_period, rsi_mode))
+
+
+def downsample_candles(candles: list[dict], max_points: int) -> list[dict]:
+    """Merge neighbouring bars so that at most `max_points` remain.
+
+    Groups are aligned to the end of the series, so the latest bar stays
+    intact; the RSI of a merged bar is the RSI of its last source bar.
+    """
+    if max_points <= 0 or len(candles) <= max_points:
+        return candles
+
+    step = -(-len(candles) // max_points)
+    first = len(candles) % step
+    starts = np.r_[[0] if first else [], np.arange(first, len(candles), step)].astype(np.int64)
+    columns = _columns(candles)
+    merged = _merge(columns, starts)
+
+    ends = np.append(starts[1:], len(candles)) - 1
+    rsi = np.array([candles[i].get("rsi", np.nan) for i in ends], dtype=np.float64)
+    return _to_candles(columns["time"][starts], merged, rsi)
@@ -0,0 +1,83 @@
+"""Concurrent load benchmark for the dashboard and its JSON API.
+
+Runs against an already started server, e.g.:
+
+    uvicorn app.main:app --port 8000
+    python -m benchmarks.dashboard_load --url http://localhost:8000 --concurrency 50 --requests 2000
+
+Comparing the numbers for two revisions of the app (for example before and
+after moving the handlers to the async engine) shows how many requests per
+second a single uvicorn worker sustains while queries are in flight.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+DEFAULT_PATHS = ["/gold", "/silver", "/cupp", "/api/gold/candles?limit=365", "/api/gold/news"]
+
+
+async def _worker(client: httpx.AsyncClient, paths: list[str], queue: asyncio.Queue, latencies: list[float], errors: list[str]) -> None:
+    while True:
+        try:
+            index = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        path = paths[index % len(paths)]
+        started = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 400:
+                errors.append(f"{path}: HTTP {response.status_code}")
+        except httpx.HTTPError as e:
+            errors.append(f"{path}: {e}")
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(url: str, paths: list[str], total: int, concurrency: int) -> dict:
+    queue: asyncio.Queue = asyncio.Queue()
+    for index in range(total):
+        queue.put_nowait(index)
+
+    latencies: list[float] = []
+    errors: list[str] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(_worker(client, paths, queue, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--path", action="append", dest="paths", help="Path to request, may be repeated")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.paths or DEFAULT_PATHS, args.requests, args.concurrency))
+    for key, value in result.items():
+        print(f"{key:>12}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Wall-clock time of a full candle refresh against a local gRPC stub.
+
+Starts an in-process MarketDataService stub (Tinkoff Invest protos) that
+answers GetCandles with daily candles after a fixed latency, then compares:
+
+* `sequential` — the previous behaviour: a fresh channel per instrument,
+  instruments fetched one after another;
+* `shared` — one long-lived `MarketDataClient` fetching all FIGIs
+  concurrently over a single channel.
+
+    python -m benchmarks.market_data --latency-ms 50 --years 7 --runs 5
+
+The stub is plaintext on localhost, so it under-states the cost of a new
+channel (TLS handshake and auth) against the real API. Needs the
+`tinkoff-investments` package.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from concurrent import futures
+from datetime import datetime, timedelta, timezone
+
+import grpc
+
+from db.instruments import get_instruments
+from parser.market_data import DeadlineInterceptor, MarketDataClient
+
+FIGIS = tuple(instrument.figi for instrument in get_instruments())
+
+
+def _servicer(latency: float):
+    from tinkoff.invest.grpc import common_pb2, marketdata_pb2, marketdata_pb2_grpc
+
+    class _MarketDataStub(marketdata_pb2_grpc.MarketDataServiceServicer):
+        def GetCandles(self, request, context):
+            time.sleep(latency)
+            # `from` is a Python keyword, hence getattr
+            start = getattr(request, "from").ToDatetime()
+            end = request.to.ToDatetime()
+            candles = []
+            day = start
+            while day < end:
+                price = common_pb2.Quotation(units=2000 + day.day, nano=50_000_000)
+                candle = marketdata_pb2.HistoricCandle(
+                    open=price, high=price, low=price, close=price, volume=100, is_complete=True,
+                )
+                candle.time.FromDatetime(day)
+                candles.append(candle)
+                day += timedelta(days=1)
+            return marketdata_pb2.GetCandlesResponse(candles=candles)
+
+    return _MarketDataStub(), marketdata_pb2_grpc.add_MarketDataServiceServicer_to_server
+
+
+def start_stub(latency: float) -> tuple[grpc.Server, str]:
+    servicer, add_to_server = _servicer(latency)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=16))
+    add_to_server(servicer, server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    return server, f"127.0.0.1:{port}"
+
+
+def _open_services(target: str, deadline: float):
+    from tinkoff.invest.services import Services
+
+    channel = grpc.intercept_channel(grpc.insecure_channel(target), DeadlineInterceptor(deadline))
+    return Services(channel, token="benchmark"), channel.close
+
+
+def run_sequential(target: str, start: datetime, deadline: float) -> int:
+    received = 0
+    for figi in FIGIS:
+        client = MarketDataClient(services_factory=lambda: _open_services(target, deadline))
+        try:
+            received += len(client.get_candles(figi, start))
+        finally:
+            client.close()
+    return received
+
+
+def run_shared(client: MarketDataClient, start: datetime) -> int:
+    return sum(len(candles) for candles in client.get_candles_many({figi: (start, None) for figi in FIGIS}).values())
+
+
+def _timed(call) -> tuple[float, int]:
+    started = time.perf_counter()
+    received = call()
+    return time.perf_counter() - started, received
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="stub latency per GetCandles call")
+    parser.add_argument("--years", type=int, default=7, help="history depth requested per instrument")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--deadline", type=float, default=15.0)
+    args = parser.parse_args()
+
+    server, target = start_stub(args.latency_ms / 1000)
+    start = datetime.now(timezone.utc) - timedelta(days=365 * args.years)
+    shared = MarketDataClient(services_factory=lambda: _open_services(target, args.deadline))
+    try:
+        results = {"sequential": [], "shared": []}
+        for _ in range(args.runs):
+            results["sequential"].append(_timed(lambda: run_sequential(target, start, args.deadline)))
+            results["shared"].append(_timed(lambda: run_shared(shared, start)))
+    finally:
+        shared.close()
+        server.stop(None)
+
+    for name, samples in results.items():
+        seconds = [elapsed for elapsed, _ in samples]
+        print(f"{name:>10}: median {statistics.median(seconds):.3f} s, "
+              f"max {max(seconds):.3f} s, candles {samples[-1][1]}")
+
+
+if __name__ == "__main__":
+    main()
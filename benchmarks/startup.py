@@ -0,0 +1,103 @@
+"""Startup time and memory of the web app import graph.
+
+Imports `app.main` in fresh interpreters and reports wall time, peak RSS
+and whether any of the heavy pipeline modules (TensorFlow, pandas, the
+scrapers, the Tinkoff client) were loaded:
+
+    python -m benchmarks.startup --runs 5
+
+The web process only needs FastAPI, SQLAlchemy and NumPy; the pipeline is
+imported on the first call of `/api/update-data` or `/api/run-predictions`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+HEAVY_MODULES = (
+    "tensorflow",
+    "keras",
+    "torch",
+    "transformers",
+    "sklearn",
+    "joblib",
+    "pandas",
+    "pyarrow",
+    "bs4",
+    "tinkoff",
+    "db.update_information",
+    "db.core",
+    "predict_model.LSTM",
+)
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+heavy = [name for name in {heavy!r} if name in sys.modules]
+rss_mb = None
+try:
+    # VmHWM is reset by exec, unlike ru_maxrss which keeps the parent's peak on Linux
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                rss_mb = int(line.split()[1]) / 1024
+except OSError:
+    try:
+        import resource
+    except ImportError:  # Windows
+        pass
+    else:
+        # ru_maxrss is in bytes on macOS
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 / 1024
+print(json.dumps({{"seconds": elapsed, "rss_mb": rss_mb, "heavy": heavy}}))
+"""
+
+
+def measure_import(module: str = "app.main") -> dict:
+    """Import `module` in a fresh interpreter and return its import time, peak RSS and heavy modules."""
+    completed = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run(module: str, runs: int) -> dict:
+    results = [measure_import(module) for _ in range(runs)]
+    seconds = [result["seconds"] for result in results]
+    return {
+        "module": module,
+        "runs": runs,
+        "import_median_s": round(statistics.median(seconds), 3),
+        "import_max_s": round(max(seconds), 3),
+        "rss_peak_mb": round(max(result["rss_mb"] for result in results), 1) if results[0]["rss_mb"] is not None else "n/a",
+        "heavy_modules": sorted({name for result in results for name in result["heavy"]}) or "none",
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    result = run(args.module, args.runs)
+    for key, value in result.items():
+        print(f"{key:>16}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,128 +1,498 @@
-from db.create_db import engine
-from parser.get_cost import get_cost, CandleDict
-from sqlalchemy import Table, insert, inspect
+from db.engine import get_engine
+from db.quotes import latest_quotes
+from db.versions import VERSIONED_TABLES, bump_versions
+from parser.get_cost import CandleDict, columns_to_dicts, get_cost_columns_many
+from sqlalchemy import Column, MetaData, Table, delete, inspect, select
+from sqlalchemy.dialects.postgresql import TSVECTOR, insert as pg_insert
+import numpy as np
 import pandas as pd
 
+import base64
+import csv
 import datetime as dt
+import io
+import itertools
+import time
+import uuid
 
 from scraper.scrape import NewsDict, Scraper
+from db.instruments import current_figis, get_instruments
 from db.models import (
-    gold_cost_table,
-    silver_cost_table,
-    copper_cost_table,
-    gold_news_table,
-    silver_news_table,
-    copper_news_table,
-    gold_cost_predict_table,
-    silver_cost_predict_table,
-    copper_cost_predict_table
+    COST_VIEWS,
+    NEWS_VIEWS,
+    SERIES_SOURCES,
+    SERIES_VIEWS,
+    candles_table,
+    forecasts_table,
+    metadata,
+    news_table,
 )
 
-from typing import List
+from typing import Dict, Iterable, List, Sequence
 
 import sys
 from loguru import logger
 
-inspector = inspect(engine)
-
 logger.remove()
 logger.add(sys.stderr, level="INFO")
 
-def insert_data(data: List[CandleDict|NewsDict], table: Table)->None:
-    '''Вставка данных в таблицу'''
+# Представления цен, под именами которых публикуется последняя цена (db/quotes.py)
+PRICE_TABLES = tuple(view for name, view in SERIES_VIEWS.items() if SERIES_SOURCES[name][0] is candles_table)
 
-    with engine.connect() as connection:
-        stmt = insert(table).values(data)
-        connection.execute(stmt)
-        connection.commit()
+# Размер пачки для INSERT ... ON CONFLICT и порог, начиная с которого используется COPY
+INSERT_CHUNK_SIZE = 1000
+COPY_THRESHOLD = 5000
+
+def conflict_columns(table: Table)->List[str]:
+    '''Ключ дедупликации: (instrument, url) для новостей, первичный ключ для свечей и прогнозов'''
+
+    if 'url' in table.c:
+        return [name for name in ('instrument', 'url') if name in table.c]
+    return [column.name for column in table.primary_key.columns]
+
+def resolve_series(table)->tuple:
+    '''Общая таблица и инструмент для представления по металлу; обычная таблица — как есть'''
+
+    return SERIES_SOURCES.get(table.name, (table, None))
+
+def _data_columns(table: Table)->List[Column]:
+    '''Колонки, которые заполняются из данных (без автоинкрементного id, вычисляемых колонок и поисковых векторов)'''
+
+    return [
+        column for column in table.columns
+        if column.autoincrement is not True and column.computed is None and not isinstance(column.type, TSVECTOR)
+    ]
+
+def _dedupe_rows(data: List[dict], keys: List[str])->List[dict]:
+    '''Повторы по ключу внутри одной пачки: остаётся последняя строка'''
+
+    rows: dict = {}
+    for index, row in enumerate(data):
+        key = tuple(row.get(key) for key in keys)
+        # NULL не конфликтует в уникальном индексе, такие строки не схлопываются
+        rows[(index,) if None in key else key] = row
+    return list(rows.values())
+
+def _upsert_stmt(stmt, table: Table, keys: List[str], on_conflict: str):
+    if on_conflict == 'nothing':
+        return stmt.on_conflict_do_nothing(index_elements=keys)
+    updated = {
+        column.name: stmt.excluded[column.name]
+        for column in _data_columns(table)
+        if column.name not in keys
+    }
+    return stmt.on_conflict_do_update(index_elements=keys, set_=updated)
+
+def _copy_rows(connection, stage: Table, columns: List[str], records: Iterable[Sequence])->None:
+    '''Загрузка записей (значения в порядке columns) во временную таблицу через COPY (psycopg 3 или psycopg2)'''
+
+    quote = connection.dialect.identifier_preparer.quote
+    target = '{} ({})'.format(quote(stage.name), ', '.join(quote(name) for name in columns))
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        if hasattr(cursor, 'copy'):
+            with cursor.copy('COPY {} FROM STDIN'.format(target)) as copy:
+                for record in records:
+                    copy.write_row(record)
+        else:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for record in records:
+                writer.writerow(['\\N' if value is None else value for value in record])
+            buffer.seek(0)
+            cursor.copy_expert(
+                "COPY {} FROM STDIN WITH (FORMAT csv, NULL '\\N')".format(target),
+                buffer,
+            )
+    finally:
+        cursor.close()
+
+def _insert_chunks(connection, data: List[dict], table: Table, keys: List[str], on_conflict: str, chunk_size: int)->int:
+    written = 0
+    key_column = table.c[keys[0]]
+    for start in range(0, len(data), chunk_size):
+        stmt = pg_insert(table).values(data[start:start + chunk_size])
+        stmt = _upsert_stmt(stmt, table, keys, on_conflict).returning(key_column)
+        written += len(connection.execute(stmt).all())
+    return written
+
+def _insert_copy(connection, data: List[dict], table: Table, keys: List[str], on_conflict: str)->int:
+    '''COPY во временную таблицу и перенос одним INSERT ... SELECT ... ON CONFLICT'''
+
+    columns = [column.name for column in _data_columns(table)]
+    records = ([row.get(name) for name in columns] for row in data)
+    return _copy_records(connection, records, table, columns, keys, on_conflict)
+
+def _copy_records(connection, records: Iterable[Sequence], table: Table, columns: List[str],
+                  keys: List[str], on_conflict: str)->int:
+    stage = Table(
+        'stage_{}_{}'.format(table.name, uuid.uuid4().hex[:8]),
+        MetaData(),
+        *[Column(column.name, column.type) for column in _data_columns(table)],
+        prefixes=['TEMPORARY'],
+        postgresql_on_commit='DROP',
+    )
+    stage.create(connection)
+    _copy_rows(connection, stage, columns, records)
+    stmt = pg_insert(table).from_select(columns, select(*[stage.c[name] for name in columns]))
+    # rowcount у INSERT ... SELECT SQLAlchemy 2.1 не сохраняет (-1), записанные строки считаются по RETURNING
+    stmt = _upsert_stmt(stmt, table, keys, on_conflict).returning(table.c[keys[0]])
+    return len(connection.execute(stmt).all())
+
+def _conflict_mode(target: Table, on_conflict: str | None)->str:
+    if on_conflict is None:
+        on_conflict = 'nothing' if 'url' in target.c else 'update'
+    if on_conflict not in ('update', 'nothing'):
+        raise ValueError('Неизвестный режим on_conflict: {}'.format(on_conflict))
+    return on_conflict
+
+def _series_constants(target: Table, instrument: str | None)->dict:
+    '''Значения, общие для всех строк: инструмент представления и запуск прогноза'''
+
+    extra = {}
+    if instrument is not None:
+        extra['instrument'] = instrument
+    if 'run' in target.c:
+        # Все строки одной записи прогноза относятся к одному запуску модели
+        extra['run'] = dt.datetime.now().replace(microsecond=0)
+    return extra
+
+def insert_data(data: List[CandleDict|NewsDict], table: Table,
+                on_conflict: str | None = None,
+                chunk_size: int = INSERT_CHUNK_SIZE,
+                use_copy: bool | None = None)->int:
+    '''Идемпотентная вставка данных в таблицу
+
+    on_conflict: 'update' — перезаписать строку с тем же ключом, 'nothing' — пропустить.
+    По умолчанию свечи обновляются (незакрытая свеча дня могла измениться),
+    а уже сохранённые новости пропускаются. Большие загрузки идут через COPY.
+    Возвращает число вставленных или обновлённых строк.
+    '''
+
+    if not data:
+        return 0
+    target, instrument = resolve_series(table)
+    on_conflict = _conflict_mode(target, on_conflict)
+    extra = _series_constants(target, instrument)
+
+    keys = conflict_columns(target)
+    rows = _dedupe_rows([{**row, **extra} for row in data], keys)
+    if use_copy is None:
+        use_copy = len(rows) >= COPY_THRESHOLD
+
+    started = time.perf_counter()
+    with get_engine().begin() as connection:
+        if use_copy:
+            written = _insert_copy(connection, rows, target, keys, on_conflict)
+        else:
+            written = _insert_chunks(connection, rows, target, keys, on_conflict, chunk_size)
+        versions = {}
+        if written and target in VERSIONED_TABLES:
+            versions = bump_versions(connection, {row['instrument'] for row in rows if row.get('instrument')})
+    elapsed = max(time.perf_counter() - started, 1e-9)
+
+    if table in PRICE_TABLES:
+        # Цена с новой версией сразу годится этому процессу; остальные перечитают её из БД
+        latest_quotes.publish_rows(table.name, data, versions.get(instrument))
+
+    logger.info('Таблица {}: {} строк из {} записано ({}), {:.0f} строк/с.'.format(
+        table.name, written, len(data), 'COPY' if use_copy else 'INSERT', len(rows) / elapsed))
+    return written
+
+def new_news(news: List[NewsDict], table: Table)->List[NewsDict]:
+    '''Статьи, ссылок которых ещё нет в таблице новостей инструмента
+
+    Уже сохранённые статьи insert_data всё равно пропустит (ON CONFLICT DO NOTHING),
+    поэтому их отбрасывают заранее — тональность считается только для новых.
+    '''
+
+    urls = {item['url'] for item in news if item.get('url')}
+    if not urls:
+        return list(news)
+    _, instrument = resolve_series(table)
+    stmt = select(news_table.c.url).where(news_table.c.url.in_(list(urls)))
+    if instrument is not None:
+        stmt = stmt.where(news_table.c.instrument == instrument)
+    with get_engine().connect() as connection:
+        stored = {row[0] for row in connection.execute(stmt)}
+    return [item for item in news if item.get('url') not in stored]
+
+def _last_unique(columns: Dict[str, np.ndarray], keys: List[str])->np.ndarray:
+    '''Индексы строк без повторов ключа (остаётся последняя), в исходном порядке'''
+
+    size = len(columns[keys[0]])
+    key = np.rec.fromarrays([columns[name][::-1] for name in keys])
+    _, first_reversed = np.unique(key, return_index=True)
+    return np.sort(size - 1 - first_reversed)
+
+def insert_columns(columns: Dict[str, np.ndarray], table: Table,
+                   on_conflict: str | None = None,
+                   chunk_size: int = INSERT_CHUNK_SIZE,
+                   use_copy: bool | None = None)->int:
+    '''Идемпотентная вставка данных, заданных столбцами NumPy (например, parser.get_cost.candles_to_columns)
 
-    logger.info('Данные вставлены в таблицу {}.'.format(table.name))
+    Режимы и результат — как у insert_data. Большие загрузки идут через COPY
+    прямо из столбцов, без словаря на строку; небольшие передаются в insert_data.
+    '''
+
+    size = len(next(iter(columns.values()))) if columns else 0
+    if not size:
+        return 0
+    if use_copy is None:
+        use_copy = size >= COPY_THRESHOLD
+    if not use_copy:
+        return insert_data(columns_to_dicts(columns), table, on_conflict, chunk_size, use_copy=False)
+
+    target, instrument = resolve_series(table)
+    on_conflict = _conflict_mode(target, on_conflict)
+    extra = _series_constants(target, instrument)
+    keys = conflict_columns(target)
+
+    data_keys = [name for name in keys if name in columns]
+    index = _last_unique(columns, data_keys) if data_keys else np.arange(size)
+    names = [column.name for column in _data_columns(target) if column.name in columns or column.name in extra]
+    values = [
+        columns[name][index].tolist() if name in columns else itertools.repeat(extra[name])
+        for name in names
+    ]
+
+    started = time.perf_counter()
+    with get_engine().begin() as connection:
+        written = _copy_records(connection, zip(*values), target, names, keys, on_conflict)
+        versions = {}
+        if written and target in VERSIONED_TABLES:
+            versions = bump_versions(connection, [instrument] if instrument else np.unique(columns['instrument']).tolist())
+    elapsed = max(time.perf_counter() - started, 1e-9)
+
+    if table in PRICE_TABLES and 'close' in columns:
+        latest = int(np.argmax(columns['date']))
+        latest_quotes.publish(table.name, columns['date'][latest].item(), float(columns['close'][latest]),
+                              versions.get(instrument))
+
+    logger.info('Таблица {}: {} строк из {} записано (COPY из столбцов), {:.0f} строк/с.'.format(
+        table.name, written, size, len(index) / elapsed))
+    return written
 
 def drop_table(table: Table)->None:
     '''Удаление таблицы'''
 
-    with engine.connect() as connection:
+    with get_engine().connect() as connection:
         table.drop(connection)
         connection.commit()
 
 def drop_all_tables(tables: List[Table])->None:
     '''Удаление всех таблиц'''
 
-    with engine.connect() as connection:
+    with get_engine().connect() as connection:
         for table in tables:
             table.drop(connection)
         connection.commit()
 
     logger.info('Все таблицы удалены.')
 
-def table_to_df(table_name: str)->pd.DataFrame:
-    '''Чтение таблицы в DataFrame'''
+def delete_forecasts(instruments: Iterable[str] | None = None)->int:
+    '''Удаление сохранённых прогнозов всех или указанных инструментов
+
+    Прогнозы хранятся в общей таблице forecasts, поэтому удаляются строки, а не таблицы
+    (PREDICT_VIEWS — подзапросы, у них нет drop). Версии данных инструментов увеличиваются.
+    '''
+
+    stmt = delete(forecasts_table).returning(forecasts_table.c.instrument)
+    if instruments is not None:
+        stmt = stmt.where(forecasts_table.c.instrument.in_(list(instruments)))
+    with get_engine().begin() as connection:
+        removed = [row[0] for row in connection.execute(stmt)]
+        if removed:
+            bump_versions(connection, set(removed))
+    logger.info('Удалено строк прогнозов: {}.'.format(len(removed)))
+    return len(removed)
+
+# Экспорт и чтение таблиц идут серверным курсором пачками по EXPORT_CHUNK_SIZE строк
+EXPORT_CHUNK_SIZE = 10000
+EXPORT_FORMATS = ('csv', 'parquet')
+
+def _export_source(connection, table_name: str):
+    '''Таблица или представление по имени: прежние имена по металлам, общие таблицы или отражение из БД'''
+
+    if table_name in SERIES_VIEWS:
+        return SERIES_VIEWS[table_name]
+    if table_name in metadata.tables:
+        return metadata.tables[table_name]
+    return Table(table_name, MetaData(), autoload_with=connection)
+
+def _projection(source, columns: List[str] | None = None,
+                start_date: dt.datetime | None = None,
+                end_date: dt.datetime | None = None):
+    '''Запрос только нужных колонок и диапазона дат'''
+
+    # Вычисляемые колонки (поисковый вектор новостей) выгружаются только по явному запросу
+    selected = [source.c[name] for name in columns] if columns else [
+        column for column in source.c if getattr(column, 'computed', None) is None
+    ]
+    stmt = select(*selected)
+    if 'date' in source.c:
+        if start_date is not None:
+            stmt = stmt.where(source.c.date >= start_date)
+        if end_date is not None:
+            stmt = stmt.where(source.c.date <= end_date)
+        stmt = stmt.order_by(source.c.date)
+    return stmt
+
+def iter_table_rows(table_name: str, columns: List[str] | None = None,
+                    start_date: dt.datetime | None = None,
+                    end_date: dt.datetime | None = None,
+                    chunk_size: int = EXPORT_CHUNK_SIZE):
+    '''Генератор пачек строк таблицы; первым элементом отдаются колонки результата
+
+    Используется серверный курсор, поэтому в памяти держится не больше одной пачки.
+    '''
+
+    with get_engine().connect() as connection:
+        source = _export_source(connection, table_name)
+        stmt = _projection(source, columns, start_date, end_date)
+        yield list(stmt.selected_columns)
+        result = connection.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(stmt)
+        for partition in result.partitions(chunk_size):
+            yield partition
+
+def table_to_df(table_name: str, columns: List[str] | None = None,
+                start_date: dt.datetime | None = None,
+                end_date: dt.datetime | None = None,
+                chunk_size: int = EXPORT_CHUNK_SIZE)->pd.DataFrame:
+    '''Чтение таблицы в DataFrame
 
-    with engine.connect() as connection:
-        df = pd.read_sql(table_name, con=connection)
-        return df
+    Прежние имена таблиц по металлам (gold_cost, sliver_news, ...) читаются
+    из общих таблиц с теми же колонками, что были раньше. columns и
+    start_date/end_date ограничивают выборку, чтобы не тянуть лишнее
+    (например, full_text новостей).
+    '''
 
-def db_to_csv(folder: str = 'data')->None:
-    '''Экспорт всех таблиц в CSV'''
+    chunks = iter_table_rows(table_name, columns, start_date, end_date, chunk_size)
+    names = [column.name for column in next(chunks)]
+    frames = [pd.DataFrame(partition, columns=names) for partition in chunks]
+    if not frames:
+        return pd.DataFrame(columns=names)
+    return pd.concat(frames, ignore_index=True)
 
-    tables = inspector.get_table_names()
+def _python_type(column)->type:
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return str
+
+def _arrow_schema(columns):
+    '''Схема Parquet по типам колонок SQLAlchemy, чтобы все пачки писались одинаково'''
+
+    import pyarrow as pa
+
+    fields = []
+    for column in columns:
+        python_type = _python_type(column)
+        if python_type is dt.datetime:
+            arrow_type = pa.timestamp('us')
+        elif python_type is int:
+            arrow_type = pa.int64()
+        elif python_type is float:
+            arrow_type = pa.float64()
+        elif python_type is bytes:
+            # Сжатые тексты news_archive и другие двоичные колонки
+            arrow_type = pa.binary()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+def _binary_value(value, encode: bool = False):
+    '''Двоичное значение как bytes (драйвер может отдать memoryview); для CSV — в base64'''
+
+    if value is None:
+        return None
+    value = bytes(value)
+    return base64.b64encode(value).decode('ascii') if encode else value
+
+def export_table(table_name: str, path: str, fmt: str = 'csv',
+                 columns: List[str] | None = None,
+                 start_date: dt.datetime | None = None,
+                 end_date: dt.datetime | None = None,
+                 chunk_size: int = EXPORT_CHUNK_SIZE)->int:
+    '''Потоковый экспорт таблицы в CSV или Parquet (zstd, одна группа строк на пачку)
+
+    Двоичные колонки пишутся в Parquet как binary, в CSV — строкой base64.
+    Возвращает число выгруженных строк.
+    '''
+
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError('Неизвестный формат экспорта: {}'.format(fmt))
+
+    chunks = iter_table_rows(table_name, columns, start_date, end_date, chunk_size)
+    selected = next(chunks)
+    exported = 0
+    binary = {index for index, column in enumerate(selected) if _python_type(column) is bytes}
+    if fmt == 'csv':
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow([column.name for column in selected])
+            for partition in chunks:
+                if binary:
+                    partition = [
+                        [_binary_value(value, encode=True) if index in binary else value for index, value in enumerate(row)]
+                        for row in partition
+                    ]
+                writer.writerows(partition)
+                exported += len(partition)
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = _arrow_schema(selected)
+        with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+            for partition in chunks:
+                arrays = [
+                    pa.array([
+                        _binary_value(row[index]) if index in binary else row[index] for row in partition
+                    ], type=field.type)
+                    for index, field in enumerate(schema)
+                ]
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                exported += len(partition)
+
+    logger.info('Таблица {} экспортирована в {}: {} строк.'.format(table_name, path, exported))
+    return exported
+
+def db_to_csv(folder: str = 'data', fmt: str = 'csv')->None:
+    '''Экспорт всех таблиц в CSV или Parquet'''
+
+    tables = inspect(get_engine()).get_table_names()
     for table in tables:
-        df = table_to_df(table)
-        df.to_csv(f'{folder}/{table}.csv', index=False)
-        logger.info('Таблица {} экспортирована в CSV.'.format(table))
+        export_table(table, f'{folder}/{table}.{fmt}', fmt)
 
 def filling_all_tables()->None:
-    '''Заполнение всех таблиц'''
+    '''Заполнение всех таблиц по реестру инструментов'''
 
     logger.info('Заполнение всех таблиц...')
-    # Заполнение таблицы стоимости золота
-    gold_cost = get_cost('BBG000VJ5YR4')
-    insert_data(gold_cost, gold_cost_table)
-    logger.info('Заполнена таблица стоимости золота.')
-
-    # Заполнение таблицы стоимости серебра
-    silver_cost = get_cost('BBG000VHQTD1')
-    insert_data(silver_cost, silver_cost_table)
-    logger.info('Заполнена таблица стоимости серебра.')
-
-    # Заполнение таблицы стоимости меди
-    copper_cost = get_cost('FUTCOPPE0326')
-    insert_data(copper_cost, copper_cost_table)
-    logger.info('Заполнена таблица стоимости меди.')
-
-    gold_scraper = Scraper(
-        url='https://www.finversia.ru/dragmetally',
-        keywords=['золот', 'gold'],
-        output_file=False,
-        years=5,
-        max_pages=200
-    )
-    silver_scraper = Scraper(
-        url='https://www.finversia.ru/dragmetally',
-        keywords=['серебр', 'silver'],
-        output_file=False,
-        years=5,
-        max_pages=200
-    )
-    copper_scraper = Scraper(
-        url='https://www.finversia.ru/syrevye-rynki',
-        keywords=['мед', 'copper'],
-        output_file=False,
-        years=5,
-        max_pages=200
-    )
-
-    # Заполнение таблицы новостей о золоте
-    insert_data(gold_scraper.parsing(), gold_news_table)
-    logger.info('Заполнена таблица новостей о золоте.')
+    instruments = get_instruments()
+    # Свечи всех инструментов запрашиваются параллельно через общий клиент
+    figis = current_figis(instruments)
+    costs = get_cost_columns_many(list(figis.values()))
+    for instrument in instruments:
+        insert_columns(costs[figis[instrument.key]], COST_VIEWS[instrument.key], use_copy=True)
+        logger.info('Заполнена таблица стоимости: {}.'.format(instrument.name))
 
-    # Заполнение таблицы новостей о серебре
-    insert_data(silver_scraper.parsing(), silver_news_table)
-    logger.info('Заполнена таблица новостей о серебре.')
+    # Сентимент считается при загрузке; модель импортируется здесь, чтобы db.core не тянул scikit-learn
+    from predict_model.sentiment import refresh_daily_sentiment, score_news
 
-    # Заполнение таблицы новостей о меде
-    insert_data(copper_scraper.parsing(), copper_news_table)
-    logger.info('Заполнена таблица новостей о меди.')
+    for instrument in instruments:
+        for source in instrument.news:
+            scraper = Scraper(
+                url=source.url,
+                keywords=list(source.keywords),
+                output_file=False,
+                years=5,
+                max_pages=200
+            )
+            insert_data(score_news(scraper.parsing()), NEWS_VIEWS[instrument.key], use_copy=True)
+        refresh_daily_sentiment(instrument.key)
+        logger.info('Заполнена таблица новостей: {}.'.format(instrument.name))
 
 
 if __name__ == '__main__':
@@ -134,10 +504,7 @@ if __name__ == '__main__':
     #     silver_news_table,
     #     copper_news_table])
     #
-    drop_all_tables([
-        gold_cost_predict_table,
-        silver_cost_predict_table,
-        copper_cost_predict_table])
+    delete_forecasts()
 
     # filling_all_tables()
     #
@@ -1,25 +1,162 @@
-import os
+import re
+from datetime import datetime
 
-from sqlalchemy import create_engine
-from db.models import metadata
-from dotenv import load_dotenv
+from sqlalchemy import delete, insert, inspect, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.schema import CreateColumn
+from db.engine import get_engine
+from db.models import (
+    LEGACY_TABLES,
+    candles_table,
+    demo_positions_table,
+    demo_trades_table,
+    metadata,
+)
 
 import sys
 from loguru import logger
 logger.remove()
 logger.add(sys.stderr, level="INFO")
 
-load_dotenv()
+def replay_trades(trades) -> list[dict]:
+    '''Позиции по истории сделок в порядке исполнения: средняя цена покупки, закрытые позиции отбрасываются'''
 
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_NAME = os.getenv("DB_NAME")
-DB_HOST = os.getenv("DB_HOST", "localhost")
+    positions: dict[tuple[int, str], dict] = {}
+    for trade in trades:
+        position = positions.setdefault(
+            (trade["user_id"], trade["metal_key"]),
+            {"quantity": 0.0, "avg_price": 0.0},
+        )
+        quantity = float(trade["quantity"] or 0.0)
+        if trade["side"] == "buy":
+            total_quantity = position["quantity"] + quantity
+            position["avg_price"] = (
+                position["quantity"] * position["avg_price"] + quantity * float(trade["price"] or 0.0)
+            ) / total_quantity
+            position["quantity"] = total_quantity
+        elif trade["side"] == "sell":
+            position["quantity"] -= quantity
+
+    return [
+        {"user_id": user_id, "metal_key": metal_key, **position}
+        for (user_id, metal_key), position in positions.items()
+        if round(position["quantity"], 8) > 0
+    ]
+
+
+def rebuild_demo_positions() -> None:
+    '''Пересчёт таблицы позиций по истории сделок (средняя цена покупки)'''
+
+    with get_engine().begin() as connection:
+        stmt = select(demo_trades_table).order_by(demo_trades_table.c.created_at, demo_trades_table.c.id)
+        rows = replay_trades(connection.execute(stmt).mappings())
+        connection.execute(delete(demo_positions_table))
+        if rows:
+            connection.execute(insert(demo_positions_table), rows)
+
+    logger.info('Таблица позиций пересчитана по истории сделок.')
+
+
+def migrate_legacy_tables() -> None:
+    '''Перенос данных из старых таблиц по металлам в общие таблицы candles, forecasts и news
+
+    Старые таблицы не удаляются; повторы (например, одинаковые url новостей) пропускаются.
+    '''
+
+    existing = set(inspect(get_engine()).get_table_names())
+    run = datetime.now().replace(microsecond=0)
+    with get_engine().begin() as connection:
+        for legacy, target, instrument in LEGACY_TABLES:
+            if legacy.name not in existing:
+                continue
+            columns = [column.name for column in legacy.columns if column.name != 'id']
+            source = select(literal(instrument), *[legacy.c[name] for name in columns])
+            names = ['instrument', *columns]
+            if 'run' in target.c:
+                # Сохранённые прогнозы считаются одним запуском модели
+                source = source.add_columns(literal(run))
+                names.append('run')
+            if 'id' in legacy.c:
+                # Порядок id сохраняется для keyset-пагинации по (date, id)
+                source = source.order_by(legacy.c.id)
+            stmt = pg_insert(target).from_select(names, source).on_conflict_do_nothing()
+            moved = len(connection.execute(stmt.returning(*target.primary_key.columns)).all())
+            logger.info('Перенесено строк из {} в {}: {}.'.format(legacy.name, target.name, moved))
+
+
+def add_missing_columns() -> None:
+    '''Добавление новых колонок моделей в уже существующие таблицы (create_all их не добавляет)'''
+
+    engine = get_engine()
+    inspector = inspect(engine)
+    existing = set(inspector.get_table_names())
+    with engine.begin() as connection:
+        preparer = connection.dialect.identifier_preparer
+        for table in metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            present = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                # Полное описание колонки, включая GENERATED ALWAYS AS для вычисляемых
+                connection.exec_driver_sql('ALTER TABLE {} ADD COLUMN IF NOT EXISTS {}'.format(
+                    preparer.format_table(table),
+                    CreateColumn(column).compile(dialect=connection.dialect),
+                ))
+                logger.info('Добавлена колонка {}.{}.'.format(table.name, column.name))
+
+
+def _referenced_columns(table, sqltext: str) -> set:
+    return {column.name for column in table.columns if re.search(r'\b{}\b'.format(column.name), sqltext)}
+
+
+def rebuild_computed_columns() -> None:
+    '''Пересоздание вычисляемых колонок, выражение которых в базе ссылается на другие колонки, чем в модели
+
+    Например, поисковый вектор news.search после добавления archived_search.
+    Индексы удалённой колонки пересоздаёт create_db.
+    '''
+
+    engine = get_engine()
+    inspector = inspect(engine)
+    existing = set(inspector.get_table_names())
+    with engine.begin() as connection:
+        preparer = connection.dialect.identifier_preparer
+        for table in metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            stored = {column['name']: column.get('computed') for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.computed is None or not stored.get(column.name):
+                    continue
+                expected = _referenced_columns(table, str(column.computed.sqltext))
+                if _referenced_columns(table, stored[column.name]['sqltext']) == expected:
+                    continue
+                connection.exec_driver_sql('ALTER TABLE {} DROP COLUMN {}'.format(
+                    preparer.format_table(table), preparer.format_column(column),
+                ))
+                connection.exec_driver_sql('ALTER TABLE {} ADD COLUMN {}'.format(
+                    preparer.format_table(table),
+                    CreateColumn(column).compile(dialect=connection.dialect),
+                ))
+                logger.info('Пересоздана вычисляемая колонка {}.{}.'.format(table.name, column.name))
 
-engine = create_engine(f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}")
 
 def create_db():
+    engine = get_engine()
+    existing = set(inspect(engine).get_table_names())
+    add_missing_columns()
+    rebuild_computed_columns()
     metadata.create_all(engine)
+    # create_all не добавляет индексы в уже существующие таблицы
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    if candles_table.name not in existing:
+        migrate_legacy_tables()
+    if demo_positions_table.name not in existing:
+        rebuild_demo_positions()
     logger.info('База данных и таблицы созданы.')
 
 if __name__ == '__main__':
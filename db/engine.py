@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from db.metrics import instrument_engine
+
+load_dotenv()
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class PoolSettings:
+    '''Параметры пула соединений из переменных окружения
+
+    Пул свой в каждом процессе: при N воркерах uvicorn к базе может быть
+    открыто до N * (DB_POOL_SIZE + DB_MAX_OVERFLOW) соединений.
+    '''
+
+    def __init__(self):
+        self.user = os.getenv('DB_USER')
+        self.password = os.getenv('DB_PASSWORD')
+        self.name = os.getenv('DB_NAME')
+        self.host = os.getenv('DB_HOST', 'localhost')
+        self.pool_size = int(os.getenv('DB_POOL_SIZE', '5'))
+        self.max_overflow = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+        self.pool_timeout = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+        self.pool_recycle = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+        self.pre_ping = _env_bool('DB_POOL_PRE_PING', True)
+        # 0 — без ограничения времени выполнения запроса
+        self.statement_timeout_ms = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))
+
+    def url(self, driver: str | None = None) -> str:
+        scheme = f'postgresql+{driver}' if driver else 'postgresql'
+        return f'{scheme}://{self.user}:{self.password}@{self.host}/{self.name}'
+
+    def pool_kwargs(self) -> dict:
+        return {
+            'pool_size': self.pool_size,
+            'max_overflow': self.max_overflow,
+            'pool_timeout': self.pool_timeout,
+            'pool_recycle': self.pool_recycle,
+            'pool_pre_ping': self.pre_ping,
+        }
+
+
+class PoolMetrics:
+    '''Время ожидания соединения из пула и число выдач/таймаутов'''
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'checkout_wait_avg_ms': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'checkout_wait_max_ms': round(self.wait_max * 1000, 3),
+            }
+
+
+class _TimedPoolMixin:
+    '''Замер времени получения соединения (ожидание в очереди, подключение, pre-ping)'''
+
+    metrics: PoolMetrics
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.metrics.observe(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.observe(time.perf_counter() - started)
+        return connection
+
+
+def _timed_pool_class(base, metrics: PoolMetrics):
+    return type(f'Timed{base.__name__}', (_TimedPoolMixin, base), {'metrics': metrics})
+
+
+pool_metrics = {'sync': PoolMetrics(), 'async': PoolMetrics()}
+
+_engines: dict = {}
+_settings: dict = {}
+# Варианты асинхронного engine с разным уровнем изоляции поверх одного пула
+_views: dict = {}
+_lock = threading.Lock()
+
+
+def get_engine():
+    '''Общий синхронный engine (конвейер обновления, прогнозы, экспорт); создаётся при первом обращении'''
+
+    with _lock:
+        if 'sync' not in _engines:
+            settings = PoolSettings()
+            connect_args = {}
+            if settings.statement_timeout_ms:
+                connect_args['options'] = f'-c statement_timeout={settings.statement_timeout_ms}'
+            _settings['sync'] = settings
+            _engines['sync'] = create_engine(
+                settings.url(),
+                poolclass=_timed_pool_class(QueuePool, pool_metrics['sync']),
+                connect_args=connect_args,
+                **settings.pool_kwargs(),
+            )
+            instrument_engine(_engines['sync'], 'sync')
+        return _engines['sync']
+
+
+def get_async_engine():
+    '''Общий асинхронный engine для обработчиков FastAPI, меняющих данные (begin()); создаётся при первом обращении'''
+
+    with _lock:
+        return _async_views()['transactional']
+
+
+def get_async_reader():
+    '''Тот же пул асинхронных соединений в режиме AUTOCOMMIT — для обработчиков, которые только читают
+
+    asyncpg открывает транзакцию явным BEGIN и закрывает её ROLLBACK, в том числе
+    вокруг pre-ping: без транзакции выдача соединения и один SELECT стоят два обхода
+    до базы вместо шести. Отдельный SELECT и так читает согласованный снимок.
+    '''
+
+    with _lock:
+        return _async_views()['reader']
+
+
+def _async_views() -> dict:
+    if 'async' not in _engines:
+        settings = PoolSettings()
+        connect_args = {}
+        if settings.statement_timeout_ms:
+            connect_args['server_settings'] = {'statement_timeout': str(settings.statement_timeout_ms)}
+        _settings['async'] = settings
+        # Соединения в пуле — без транзакции, поэтому pre-ping не делает BEGIN/ROLLBACK;
+        # транзакционные обработчики получают уровень изоляции на время выдачи соединения
+        _engines['async'] = create_async_engine(
+            settings.url('asyncpg'),
+            poolclass=_timed_pool_class(AsyncAdaptedQueuePool, pool_metrics['async']),
+            connect_args=connect_args,
+            isolation_level='AUTOCOMMIT',
+            **settings.pool_kwargs(),
+        )
+        # События выполнения запросов есть только у синхронной части асинхронного engine
+        instrument_engine(_engines['async'].sync_engine, 'async')
+        _views['reader'] = _engines['async']
+        _views['transactional'] = _engines['async'].execution_options(isolation_level='READ COMMITTED')
+    return _views
+
+
+def pool_stats() -> dict:
+    '''Заполненность пулов созданных engine и время выдачи соединений'''
+
+    stats = {}
+    with _lock:
+        engines = dict(_engines)
+    for name, engine in engines.items():
+        pool = engine.pool
+        max_overflow = _settings[name].max_overflow
+        capacity = pool.size() + max(max_overflow, 0)
+        checked_out = pool.checkedout()
+        stats[name] = {
+            'size': pool.size(),
+            'max_overflow': max_overflow,
+            'checked_out': checked_out,
+            'checked_in': pool.checkedin(),
+            'overflow': pool.overflow(),
+            'saturation': round(checked_out / capacity, 3) if capacity else 0.0,
+            **pool_metrics[name].snapshot(),
+        }
+    return stats
+
+
+async def dispose_engines() -> None:
+    '''Закрытие соединений пулов при остановке приложения'''
+
+    with _lock:
+        engines = dict(_engines)
+        _engines.clear()
+        _views.clear()
+    for name, engine in engines.items():
+        if name == 'async':
+            await engine.dispose()
+        else:
+            engine.dispose()
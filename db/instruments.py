@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+
+from loguru import logger
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+# Реестр инструментов: figi, страницы сайта, источники новостей и модели прогноза
+INSTRUMENTS_FILE = os.getenv('INSTRUMENTS_FILE', str(PROJECT_ROOT / 'instruments.json'))
+# Ключ инструмента хранится в колонках String(16)
+KEY_MAX_LENGTH = 16
+
+
+@dataclass(frozen=True)
+class NewsSource:
+    url: str
+    keywords: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class FuturesRoll:
+    '''Правило перехода на следующий фьючерсный контракт
+
+    Подходят контракты, figi которых начинается с figi_prefix и/или базовый
+    актив равен basic_asset; берётся ближайший, до последнего дня торгов
+    которого больше roll_days дней.
+    '''
+
+    figi_prefix: str | None = None
+    basic_asset: str | None = None
+    roll_days: int = 5
+
+
+@dataclass(frozen=True)
+class Instrument:
+    '''Инструмент из реестра
+
+    key — ключ в общих таблицах, slug — адрес страницы и API (/gold, /api/cupp/...),
+    legacy — префикс прежних имён таблиц (sliver_cost) и ключ LSTM.
+    '''
+
+    key: str
+    figi: str
+    slug: str
+    name: str
+    code: str
+    legacy: str
+    news: Tuple[NewsSource, ...] = ()
+    model: str | None = None
+    futures: FuturesRoll | None = None
+
+    @property
+    def cost_view(self) -> str:
+        return '{}_cost'.format(self.legacy)
+
+    @property
+    def predict_view(self) -> str:
+        return '{}_predict_cost'.format(self.legacy)
+
+    @property
+    def news_view(self) -> str:
+        return '{}_news'.format(self.legacy)
+
+    @property
+    def model_path(self) -> Path:
+        return PROJECT_ROOT / (self.model or 'predict_model/models/{}_lstm_bundle.pkl'.format(self.legacy))
+
+
+def _instrument(entry: dict) -> Instrument:
+    missing = [name for name in ('key', 'figi') if not entry.get(name)]
+    if missing:
+        raise ValueError('Инструмент {} без обязательных полей: {}'.format(entry, ', '.join(missing)))
+    key = entry['key']
+    if len(key) > KEY_MAX_LENGTH:
+        raise ValueError('Ключ инструмента длиннее {} символов: {}'.format(KEY_MAX_LENGTH, key))
+    futures = entry.get('futures')
+    if futures is not None:
+        futures = FuturesRoll(**futures)
+        if not (futures.figi_prefix or futures.basic_asset):
+            raise ValueError('Инструмент {}: для futures нужен figi_prefix или basic_asset'.format(key))
+    return Instrument(
+        key=key,
+        figi=entry['figi'],
+        slug=entry.get('slug', key),
+        name=entry.get('name', key),
+        code=entry.get('code', key.upper()),
+        legacy=entry.get('legacy', key),
+        news=tuple(NewsSource(source['url'], tuple(source['keywords'])) for source in entry.get('news', ())),
+        model=entry.get('model'),
+        futures=futures,
+    )
+
+
+def load_instruments(path: str | Path = INSTRUMENTS_FILE) -> Tuple[Instrument, ...]:
+    '''Чтение и проверка реестра инструментов из JSON'''
+
+    with open(path, encoding='utf-8') as file:
+        entries = json.load(file)['instruments']
+    instruments = tuple(_instrument(entry) for entry in entries)
+    for field in ('key', 'slug', 'legacy'):
+        values = [getattr(instrument, field) for instrument in instruments]
+        duplicates = sorted({value for value in values if values.count(value) > 1})
+        if duplicates:
+            raise ValueError('Повторяющиеся значения {} в реестре инструментов: {}'.format(field, ', '.join(duplicates)))
+    return instruments
+
+
+@lru_cache(maxsize=None)
+def get_instruments() -> Tuple[Instrument, ...]:
+    '''Реестр процесса; читается один раз при первом обращении (при импорте db.models)'''
+
+    return load_instruments(INSTRUMENTS_FILE)
+
+
+def get_instrument(key: str) -> Instrument:
+    for instrument in get_instruments():
+        if instrument.key == key:
+            return instrument
+    raise KeyError('Неизвестный инструмент: {}'.format(key))
+
+
+def pick_contract(futures: Iterable, roll: FuturesRoll, today: date) -> str | None:
+    '''figi ближайшего подходящего контракта из списка фьючерсов API (None — подходящих нет)'''
+
+    candidates = []
+    for future in futures:
+        if roll.figi_prefix and not future.figi.startswith(roll.figi_prefix):
+            continue
+        if roll.basic_asset and (future.basic_asset or '').lower() != roll.basic_asset.lower():
+            continue
+        last_trade = future.last_trade_date.date()
+        if last_trade - timedelta(days=roll.roll_days) > today:
+            candidates.append((last_trade, future.figi))
+    return min(candidates)[1] if candidates else None
+
+
+_current: Dict[str, Tuple[date, str]] = {}
+_current_lock = threading.Lock()
+
+
+def current_figis(instruments: Iterable[Instrument] | None = None) -> Dict[str, str]:
+    '''figi для загрузки цен по ключу инструмента; у фьючерсов — текущий контракт
+
+    Список фьючерсов запрашивается у API не чаще раза в день. Если запрос не
+    удался или подходящего контракта нет, используется figi из реестра.
+    '''
+
+    instruments = list(get_instruments() if instruments is None else instruments)
+    today = datetime.now(timezone.utc).date()
+    result = {instrument.key: instrument.figi for instrument in instruments}
+    rolling = [instrument for instrument in instruments if instrument.futures is not None]
+    with _current_lock:
+        stale = [instrument for instrument in rolling if _current.get(instrument.key, (None,))[0] != today]
+        if stale:
+            try:
+                # Клиент Tinkoff нужен только для фьючерсов и импортируется здесь
+                from parser.market_data import get_market_data_client
+
+                futures = get_market_data_client().get_futures()
+            except Exception as error:
+                logger.warning('Список фьючерсов не получен ({}), используются figi из реестра.'.format(error))
+                futures = None
+            if futures is not None:
+                for instrument in stale:
+                    figi = pick_contract(futures, instrument.futures, today)
+                    if figi is None:
+                        logger.warning('Для {} нет подходящего контракта, используется {}.'.format(instrument.key, instrument.figi))
+                        figi = instrument.figi
+                    elif figi != _current.get(instrument.key, (None, instrument.figi))[1]:
+                        logger.info('{}: текущий контракт {}.'.format(instrument.key, figi))
+                    _current[instrument.key] = (today, figi)
+        for instrument in rolling:
+            if instrument.key in _current:
+                result[instrument.key] = _current[instrument.key][1]
+    return result
@@ -0,0 +1,235 @@
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List
+
+from loguru import logger
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from db.engine import get_engine
+from db.instruments import current_figis
+from db.models import candles_table, intraday_candles_table
+from db.versions import bump_versions
+
+# Минутные свечи копятся в памяти и пишутся пачкой: по числу свечей или по времени с прошлой записи
+INTRADAY_BATCH_SIZE = int(os.getenv('INTRADAY_BATCH_SIZE', '500'))
+INTRADAY_FLUSH_SECONDS = float(os.getenv('INTRADAY_FLUSH_SECONDS', '5'))
+
+BAR_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def stream_instruments() -> Dict[str, str]:
+    '''figi потока -> инструмент в общих таблицах; у фьючерсов — текущий контракт'''
+
+    return {figi: key for key, figi in current_figis().items()}
+
+
+def _day_start(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _days_condition(table, days: set):
+    return or_(*(
+        and_(table.c.instrument == instrument, table.c.date >= day, table.c.date < day + timedelta(days=1))
+        for instrument, day in sorted(days)
+    ))
+
+
+def daily_rollup_stmt(days: set):
+    '''Дневные OHLCV по минутным свечам для набора (инструмент, начало дня)
+
+    open — первой свечи дня, close — последней, high/low — крайние, volume —
+    сумма; last — время последней минутной свечи.
+    '''
+
+    table = intraday_candles_table
+    day = func.date_trunc('day', table.c.date).label('day')
+    return (
+        select(
+            table.c.instrument,
+            day,
+            array_agg(aggregate_order_by(table.c.open, table.c.date.asc()))[1].label('open'),
+            func.max(table.c.high).label('high'),
+            func.min(table.c.low).label('low'),
+            array_agg(aggregate_order_by(table.c.close, table.c.date.desc()))[1].label('close'),
+            func.sum(table.c.volume).label('volume'),
+            func.max(table.c.date).label('last'),
+        )
+        .where(_days_condition(table, days))
+        .group_by(table.c.instrument, day)
+    )
+
+
+def _extreme(pick: Callable, *values):
+    present = [value for value in values if value is not None]
+    return pick(present) if present else None
+
+
+def merge_daily(rollup, existing=None, time_of_day: timedelta = timedelta(0)) -> dict:
+    '''Дневная свеча из минутных с учётом уже сохранённой за тот же день
+
+    У сохранённой свечи (например, загруженной price_sync до запуска потока)
+    остаются время строки и open, high/low расширяются, close берётся
+    последний минутный, volume — больший из двух. Новая строка дня ставится на
+    то же время суток, что и прежние дневные свечи инструмента: тогда
+    price_sync потом обновит её, а не добавит вторую.
+    '''
+
+    if existing is None:
+        return {
+            'instrument': rollup['instrument'],
+            'date': rollup['day'] + time_of_day,
+            **{name: rollup[name] for name in BAR_COLUMNS},
+        }
+    return {
+        'instrument': rollup['instrument'],
+        'date': existing['date'],
+        'open': existing['open'] if existing['open'] is not None else rollup['open'],
+        'high': _extreme(max, existing['high'], rollup['high']),
+        'low': _extreme(min, existing['low'], rollup['low']),
+        'close': rollup['close'],
+        'volume': _extreme(max, existing['volume'], rollup['volume']),
+    }
+
+
+def _times_of_day(connection, instruments: set) -> Dict[str, timedelta]:
+    '''Время суток последней дневной свечи каждого инструмента'''
+
+    rows = connection.execute(
+        select(candles_table.c.instrument, func.max(candles_table.c.date))
+        .where(candles_table.c.instrument.in_(sorted(instruments)))
+        .group_by(candles_table.c.instrument)
+    ).all()
+    return {instrument: latest - _day_start(latest) for instrument, latest in rows if latest is not None}
+
+
+def write_bars(rows: List[dict]) -> dict:
+    '''Запись пачки минутных свечей и пересчёт дневных свечей затронутых дней в одной транзакции'''
+
+    days = {(row['instrument'], _day_start(row['date'])) for row in rows}
+    stmt = pg_insert(intraday_candles_table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['instrument', 'date'],
+        set_={name: stmt.excluded[name] for name in BAR_COLUMNS},
+    )
+    with get_engine().begin() as connection:
+        connection.execute(stmt)
+        rollups = connection.execute(daily_rollup_stmt(days)).mappings().all()
+        existing = {
+            (row['instrument'], _day_start(row['date'])): row
+            for row in connection.execute(select(candles_table).where(_days_condition(candles_table, days))).mappings()
+        }
+        times_of_day = _times_of_day(connection, {instrument for instrument, _ in days})
+        daily = [
+            merge_daily(rollup, existing.get((rollup['instrument'], rollup['day'])),
+                        times_of_day.get(rollup['instrument'], timedelta(0)))
+            for rollup in rollups
+        ]
+        if daily:
+            upsert = pg_insert(candles_table).values(daily)
+            connection.execute(upsert.on_conflict_do_update(
+                index_elements=['instrument', 'date'],
+                set_={name: upsert.excluded[name] for name in BAR_COLUMNS},
+            ))
+            # Веб-процессы узнают о новой дневной свече по версии: ETag, снимок страницы, RSI и последняя цена обновятся;
+            # строку признаков LSTM за этот день пересчитает update_feature_store по расхождению со свечой
+            bump_versions(connection, {row['instrument'] for row in daily})
+
+    return {'bars': len(rows), 'days': len(daily)}
+
+
+class IntradayIngestor:
+    '''Запись минутных свечей из потока микропачками
+
+    Повторы одной минуты схлопываются в памяти (остаётся последняя). Пачка
+    пишется, когда в ней batch_size свечей или с прошлой записи прошло
+    flush_seconds; при записи пересчитываются дневные свечи затронутых дней.
+    '''
+
+    def __init__(self, instruments: Dict[str, str] | None = None,
+                 batch_size: int = INTRADAY_BATCH_SIZE, flush_seconds: float = INTRADAY_FLUSH_SECONDS,
+                 write: Callable[[List[dict]], dict] = write_bars, clock: Callable[[], float] = time.monotonic):
+        self.instruments = stream_instruments() if instruments is None else instruments
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._write = write
+        self._clock = clock
+        self._pending: Dict[tuple, dict] = {}
+        self._flushed_at = clock()
+        self.stats = {'bars': 0, 'batches': 0, 'days': 0, 'skipped': 0}
+
+    def add(self, bar: dict) -> None:
+        instrument = self.instruments.get(bar['figi'])
+        if instrument is None:
+            self.stats['skipped'] += 1
+            return
+        self._pending[(instrument, bar['date'])] = {
+            'instrument': instrument,
+            'date': bar['date'],
+            **{name: bar[name] for name in BAR_COLUMNS},
+        }
+
+    def due(self) -> bool:
+        if len(self._pending) >= self.batch_size:
+            return True
+        return bool(self._pending) and self._clock() - self._flushed_at >= self.flush_seconds
+
+    def flush(self) -> None:
+        self._flushed_at = self._clock()
+        if not self._pending:
+            return
+        rows = list(self._pending.values())
+        result = self._write(rows)
+        # Пачка убирается только после успешной записи
+        self._pending.clear()
+        self.stats['bars'] += len(rows)
+        self.stats['batches'] += 1
+        self.stats['days'] += result['days']
+        logger.info('Минутные свечи: записано {}, дневных свечей обновлено {}.'.format(len(rows), result['days']))
+
+    def run(self, bars: Iterable[dict | None]) -> dict:
+        '''Чтение источника до конца; None (служебное сообщение потока) только проверяет таймер'''
+
+        try:
+            for bar in bars:
+                if bar is not None:
+                    self.add(bar)
+                if self.due():
+                    self.flush()
+        finally:
+            self.flush()
+        return dict(self.stats)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Запись минутных свечей из потока Tinkoff API')
+    commands = parser.add_subparsers(dest='command', required=True)
+    stream_parser = commands.add_parser('stream', help='подписаться на поток и писать свечи до остановки')
+    stream_parser.add_argument('--figi', action='append', help='figi инструмента (по умолчанию все из реестра)')
+    stream_parser.add_argument('--record', help='дописывать полученные свечи в файл JSON Lines для replay')
+    replay_parser = commands.add_parser('replay', help='воспроизвести записанный поток без API')
+    replay_parser.add_argument('path')
+    replay_parser.add_argument('--speed', type=float, default=0.0, help='ускорение относительно реального времени, 0 — без пауз')
+    args = parser.parse_args()
+
+    # Источники подключаются здесь: поток требует клиента Tinkoff
+    from parser.stream import replay_bars, stream_bars
+
+    ingestor = IntradayIngestor()
+    if args.command == 'stream':
+        bars = stream_bars(args.figi or list(ingestor.instruments), args.record)
+    else:
+        bars = replay_bars(args.path, args.speed)
+
+    try:
+        ingestor.run(bars)
+    except KeyboardInterrupt:
+        pass
+    logger.info('Итог: {}'.format(ingestor.stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from loguru import logger
+from sqlalchemy import event
+
+# Границы корзин гистограмм: длительность запроса в секундах и число строк
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (1, 10, 100, 1000, 10000, 100000)
+# Запросы дольше порога пишутся в лог вместе с параметрами; 0 — не писать
+SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', '500'))
+SLOW_QUERY_MAX_CHARS = 2000
+# Значения параметров с такими именами в лог не попадают
+SECRET_PARAMS = ('password', 'token', 'secret')
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[1])
+_THIS_FILE = str(Path(__file__).resolve())
+
+
+class Histogram:
+    '''Накопительная гистограмма в формате Prometheus (счётчики по верхним границам корзин)'''
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        total = 0
+        result = []
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            result.append((bound if bound == '+Inf' else repr(float(bound)), total))
+        return result
+
+
+class QueryMetrics:
+    '''Время, число строк, ошибки и медленные запросы по (engine, вызывающая функция, тип запроса)'''
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self.durations: dict[tuple, Histogram] = {}
+        self.rows: dict[tuple, Histogram] = {}
+        self.errors: dict[tuple, int] = {}
+        self.slow: dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, seconds: float, rows: int | None) -> None:
+        with self._lock:
+            self.durations.setdefault(labels, Histogram(DURATION_BUCKETS)).observe(seconds)
+            if rows is not None:
+                self.rows.setdefault(labels, Histogram(ROW_BUCKETS)).observe(rows)
+            if self.slow_query_ms and seconds * 1000 >= self.slow_query_ms:
+                self.slow[labels] = self.slow.get(labels, 0) + 1
+
+    def observe_error(self, labels: tuple) -> None:
+        with self._lock:
+            self.errors[labels] = self.errors.get(labels, 0) + 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.durations.clear()
+            self.rows.clear()
+            self.errors.clear()
+            self.slow.clear()
+
+    def render(self) -> str:
+        '''Метрики в текстовом формате Prometheus'''
+
+        with self._lock:
+            lines = []
+            lines += _histogram_lines('db_query_duration_seconds', 'Duration of DB statements.', self.durations)
+            lines += _histogram_lines('db_query_rows', 'Rows returned or affected by DB statements.', self.rows)
+            lines += _counter_lines('db_query_errors_total', 'DB statements that raised an error.', self.errors)
+            lines += _counter_lines('db_slow_queries_total', 'DB statements slower than DB_SLOW_QUERY_MS.', self.slow)
+        return '\n'.join(lines) + '\n'
+
+
+LABEL_NAMES = ('engine', 'caller', 'statement')
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = ['{}="{}"'.format(name, _escape(value)) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}'
+
+
+def _histogram_lines(name: str, help_text: str, series: dict) -> list[str]:
+    lines = ['# HELP {} {}'.format(name, help_text), '# TYPE {} histogram'.format(name)]
+    for labels, histogram in sorted(series.items()):
+        for bound, count in histogram.cumulative():
+            lines.append('{}_bucket{} {}'.format(name, _labels(LABEL_NAMES, labels, 'le="{}"'.format(bound)), count))
+        lines.append('{}_sum{} {}'.format(name, _labels(LABEL_NAMES, labels), repr(float(histogram.sum))))
+        lines.append('{}_count{} {}'.format(name, _labels(LABEL_NAMES, labels), histogram.count))
+    return lines
+
+
+def _counter_lines(name: str, help_text: str, series: dict) -> list[str]:
+    lines = ['# HELP {} {}'.format(name, help_text), '# TYPE {} counter'.format(name)]
+    for labels, value in sorted(series.items()):
+        lines.append('{}{} {}'.format(name, _labels(LABEL_NAMES, labels), value))
+    return lines
+
+
+def render_pool_metrics(stats: dict) -> str:
+    '''Показатели пулов из db.engine.pool_stats() в формате Prometheus'''
+
+    gauges = (
+        ('db_pool_size', 'size', 'gauge', 'Configured pool size.'),
+        ('db_pool_checked_out', 'checked_out', 'gauge', 'Connections currently checked out.'),
+        ('db_pool_overflow', 'overflow', 'gauge', 'Overflow connections currently open.'),
+        ('db_pool_saturation', 'saturation', 'gauge', 'Checked out connections relative to pool capacity.'),
+        ('db_pool_checkouts_total', 'checkouts', 'counter', 'Connections handed out by the pool.'),
+        ('db_pool_timeouts_total', 'timeouts', 'counter', 'Checkouts that timed out.'),
+    )
+    lines = []
+    for name, key, kind, help_text in gauges:
+        lines += ['# HELP {} {}'.format(name, help_text), '# TYPE {} {}'.format(name, kind)]
+        for engine_name, values in sorted(stats.items()):
+            lines.append('{}{} {}'.format(name, _labels(('engine',), (engine_name,)), values[key]))
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def _is_project_frame(frame) -> bool:
+    filename = frame.f_code.co_filename
+    return filename.startswith(PROJECT_ROOT) and filename != _THIS_FILE and 'site-packages' not in filename
+
+
+def _frames():
+    frame = sys._getframe(1)
+    while frame is not None:
+        yield frame
+        frame = frame.f_back
+    # Асинхронный engine выполняет запрос в отдельном greenlet: стек корутин — у родителя
+    try:
+        from greenlet import getcurrent
+    except ImportError:
+        return
+    parent = getcurrent().parent
+    frame = parent.gr_frame if parent is not None else None
+    while frame is not None:
+        yield frame
+        frame = frame.f_back
+
+
+def _caller() -> str:
+    '''Ближайшая функция проекта, выполняющая запрос; служебные (_name, lambda) — только если других нет'''
+
+    fallback = None
+    for frame in _frames():
+        if not _is_project_frame(frame):
+            continue
+        name = frame.f_code.co_name
+        qualified = '{}.{}'.format(frame.f_globals.get('__name__', '?'), name)
+        if name.startswith(('_', '<')):
+            fallback = fallback or qualified
+            continue
+        return qualified
+    return fallback or 'unknown'
+
+
+def _statement_kind(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else 'UNKNOWN'
+
+
+def _redact(params):
+    if isinstance(params, dict):
+        return {
+            key: '***' if any(secret in str(key).lower() for secret in SECRET_PARAMS) else value
+            for key, value in params.items()
+        }
+    if isinstance(params, (list, tuple)) and params and isinstance(params[0], dict):
+        # executemany: в лог — первые наборы параметров
+        return [_redact(item) for item in params[:3]] + (['... {} more'.format(len(params) - 3)] if len(params) > 3 else [])
+    return params
+
+
+def _named_parameters(context, parameters):
+    '''Параметры по именам из скомпилированного запроса: у драйверов с позиционными параметрами имён нет'''
+
+    compiled = getattr(context, 'compiled_parameters', None)
+    if not compiled:
+        return parameters
+    return compiled[0] if len(compiled) == 1 else compiled
+
+
+def _truncate(text: str) -> str:
+    return text if len(text) <= SLOW_QUERY_MAX_CHARS else text[:SLOW_QUERY_MAX_CHARS] + '...'
+
+
+query_metrics = QueryMetrics()
+
+
+def instrument_engine(engine, name: str, metrics: QueryMetrics = query_metrics) -> None:
+    '''Подписка на события выполнения запросов синхронного engine (для асинхронного — engine.sync_engine)'''
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append((time.perf_counter(), _caller()))
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started, caller = conn.info['query_started'].pop()
+        elapsed = time.perf_counter() - started
+        rowcount = getattr(cursor, 'rowcount', -1)
+        metrics.observe((name, caller, _statement_kind(statement)), elapsed, rowcount if rowcount >= 0 else None)
+        if metrics.slow_query_ms and elapsed * 1000 >= metrics.slow_query_ms:
+            logger.warning('Медленный запрос {:.1f} мс ({}, {}): {} | параметры: {}'.format(
+                elapsed * 1000, name, caller, _truncate(' '.join(statement.split())),
+                _truncate(repr(_redact(_named_parameters(context, parameters))))))
+
+    @event.listens_for(engine, 'handle_error')
+    def _error(context):
+        # Ошибки подключения приходят без контекста выполнения, для них before_cursor_execute не вызывался
+        started = context.connection.info.get('query_started') if context.execution_context is not None else None
+        caller = started.pop()[1] if started else _caller()
+        metrics.observe_error((name, caller, _statement_kind(context.statement or '')))
@@ -1,7 +1,31 @@
-from sqlalchemy import Column, Table, MetaData, String, DateTime, Float, Integer, ForeignKey
+from sqlalchemy import BigInteger, Column, Computed, Table, MetaData, String, DateTime, Float, Integer, ForeignKey, Index, LargeBinary, func, select
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+from db.instruments import get_instruments
 
 metadata = MetaData()
 
+# Конфигурации полнотекстового поиска: статьи на русском, но в них много английских названий и тикеров
+SEARCH_CONFIGS = ('russian', 'english')
+# Вес поля в ранжировании: заголовок важнее описания, описание важнее текста
+SEARCH_FIELDS = (('title', 'A'), ('description', 'B'), ('full_text', 'C'))
+
+
+# Текст архивной статьи (db/retention.py) остаётся в поиске через archived_search
+ARCHIVED_SEARCH_FIELDS = (('full_text', 'C'),)
+
+
+def search_vector_sql(fields=SEARCH_FIELDS) -> str:
+    return ' || '.join(
+        "setweight(to_tsvector('{}', coalesce({}, '')), '{}')".format(config, field, weight)
+        for field, weight in fields
+        for config in SEARCH_CONFIGS
+    )
+
+
+def _news_search_sql() -> str:
+    return "{} || coalesce(archived_search, ''::tsvector)".format(search_vector_sql())
+
 
 users_table = Table(
     "users",
@@ -29,89 +53,228 @@ demo_trades_table = Table(
     Column("created_at", DateTime, nullable=False),
 )
 
-gold_cost_table = Table(
-    'gold_cost',
+demo_positions_table = Table(
+    "demo_positions",
     metadata,
-Column('date', DateTime, primary_key=True),
-    Column('open', Float),
-    Column('high', Float),
-    Column('low', Float),
-    Column('close', Float),
-    Column('volume', Integer),)
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+    Column("metal_key", String(16), primary_key=True),
+    Column("quantity", Float, nullable=False, default=0.0),
+    Column("avg_price", Float, nullable=False, default=0.0),
+)
 
-silver_cost_table = Table(
-    'sliver_cost',
+# Общие таблицы временных рядов: один набор таблиц на все инструменты
+candles_table = Table(
+    'candles',
     metadata,
-Column('date', DateTime, primary_key=True),
+    Column('instrument', String(16), primary_key=True),
+    Column('date', DateTime, primary_key=True),
     Column('open', Float),
     Column('high', Float),
     Column('low', Float),
     Column('close', Float),
     Column('volume', Integer),)
 
-copper_cost_table = Table(
-    'copper_cost',
+# Минутные свечи из потока рыночных данных (db/intraday.py); за день сворачиваются в candles
+intraday_candles_table = Table(
+    'intraday_candles',
     metadata,
-Column('date', DateTime, primary_key=True),
+    Column('instrument', String(16), primary_key=True),
+    Column('date', DateTime, primary_key=True),
     Column('open', Float),
     Column('high', Float),
     Column('low', Float),
     Column('close', Float),
     Column('volume', Integer),)
 
-gold_cost_predict_table = Table(
-    'gold_predict_cost',
-    metadata,
-Column('date', DateTime, primary_key=True),
-    Column('open', Float),
-    Column('high', Float),
-    Column('low', Float),
-    Column('close', Float),)
-
-silver_cost_predict_table = Table(
-    'sliver_predict_cost',
-    metadata,
-Column('date', DateTime, primary_key=True),
-    Column('open', Float),
-    Column('high', Float),
-    Column('low', Float),
-    Column('close', Float),)
-
-copper_cost_predict_table = Table(
-    'copper_predict_cost',
+forecasts_table = Table(
+    'forecasts',
     metadata,
-Column('date', DateTime, primary_key=True),
+    Column('instrument', String(16), primary_key=True),
+    Column('run', DateTime, primary_key=True),
+    Column('date', DateTime, primary_key=True),
     Column('open', Float),
     Column('high', Float),
     Column('low', Float),
     Column('close', Float),)
 
-gold_news_table = Table(
-    'gold_news',
+news_table = Table(
+    'news',
     metadata,
-Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('instrument', String(16), nullable=False),
     Column('title', String),
     Column('description', String),
     Column('full_text', String),
     Column('date', DateTime),
-    Column('url', String),)
+    Column('url', String),
+    # Сентимент считается один раз при загрузке новости: метка -1/0/1, уверенность SVM и версия модели
+    Column('sentiment', Integer),
+    Column('sentiment_score', Float),
+    Column('sentiment_model', String(32)),
+    # Лексемы текста, перенесённого в news_archive: заполняются при архивации вместо обнулённого full_text
+    Column('archived_search', TSVECTOR),
+    # Поисковый вектор считает сама база при вставке и изменении строки
+    Column('search', TSVECTOR, Computed(_news_search_sql(), persisted=True)),
+    Index('ix_news_instrument_date_id', 'instrument', 'date', 'id'),
+    Index('ix_news_search', 'search', postgresql_using='gin'),
+    # Одна статья может относиться к нескольким металлам, поэтому url уникален в пределах инструмента
+    Index('ux_news_instrument_url', 'instrument', 'url', unique=True),)
 
-silver_news_table = Table(
-    'sliver_news',
+# Пропуски в дневных свечах, уже запрошенные у API (db/price_sync.py): пустые диапазоны — выходные биржи
+candle_gaps_table = Table(
+    'candle_gaps',
     metadata,
-Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('title', String),
-    Column('description', String),
-    Column('full_text', String),
-    Column('date', DateTime),
-    Column('url', String),)
+    Column('instrument', String(16), primary_key=True),
+    Column('start', DateTime, primary_key=True),
+    Column('end', DateTime, primary_key=True),
+    Column('received', Integer, nullable=False),
+    Column('checked_at', DateTime, nullable=False),)
 
-copper_news_table = Table(
-    'copper_news',
+# Холодное хранилище: сжатые тексты старых статей (db/retention.py), в news остаются заголовок, дата, url и сентимент
+news_archive_table = Table(
+    'news_archive',
     metadata,
-Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('title', String),
-    Column('description', String),
-    Column('full_text', String),
-    Column('date', DateTime),
-    Column('url', String),)
+    Column('news_id', Integer, ForeignKey('news.id', ondelete='CASCADE'), primary_key=True),
+    Column('codec', String(16), nullable=False),
+    Column('raw_size', Integer, nullable=False),
+    Column('body', LargeBinary, nullable=False),
+    Column('archived_at', DateTime, nullable=False),)
+
+# Сумма сентимента новостей за день, ограниченная [-1, 1], и число оценённых статей
+daily_sentiment_table = Table(
+    'daily_sentiment',
+    metadata,
+    Column('instrument', String(16), primary_key=True),
+    Column('date', DateTime, primary_key=True),
+    Column('sentiment', Integer, nullable=False),
+    Column('articles', Integer, nullable=False),)
+
+# Версия данных инструмента: растёт при каждой записи свечей, прогнозов и новостей (db/versions.py)
+data_versions_table = Table(
+    'data_versions',
+    metadata,
+    Column('instrument', String(16), primary_key=True),
+    Column('version', BigInteger, nullable=False),
+    Column('updated_at', DateTime, nullable=False),)
+
+# Признаки для LSTM по дням: наращиваются по мере поступления свечей (predict_model/features.py)
+features_table = Table(
+    'features',
+    metadata,
+    Column('instrument', String(16), primary_key=True),
+    Column('date', DateTime, primary_key=True),
+    *[Column(name, Float) for name in (
+        'open', 'high', 'low', 'close', 'volume', 'sentiment',
+        'hl_range', 'oc_change', 'close_return', 'close_return_3', 'close_return_5',
+        'ma_close_5', 'ma_close_10', 'ma_close_20', 'volatility_5', 'volatility_10',
+        'price_momentum_5', 'price_momentum_10', 'sentiment_ma_3', 'sentiment_ma_7',
+    )],)
+
+# Ключи инструментов из реестра (instruments.json)
+INSTRUMENTS = tuple(instrument.key for instrument in get_instruments())
+
+# Представления по прежним именам таблиц и их источник: (общая таблица, инструмент)
+SERIES_VIEWS: dict = {}
+SERIES_SOURCES: dict = {}
+
+
+def _instrument_view(table: Table, instrument: str, name: str):
+    '''Ряд одного инструмента с колонками прежней таблицы (только для чтения)'''
+
+    # Поисковые векторы (вычисляемый и архивный) в представления не попадают
+    columns = [
+        column for column in table.columns
+        if column.name not in ('instrument', 'run') and column.computed is None
+        and not isinstance(column.type, TSVECTOR)
+    ]
+    stmt = select(*columns).where(table.c.instrument == instrument)
+    if 'run' in table.c:
+        # Прогнозы — только последний запуск модели
+        runs = table.alias('{}_runs'.format(name))
+        latest_run = select(func.max(runs.c.run)).where(runs.c.instrument == instrument).scalar_subquery()
+        stmt = stmt.where(table.c.run == latest_run)
+    view = stmt.subquery(name)
+    SERIES_VIEWS[name] = view
+    SERIES_SOURCES[name] = (table, instrument)
+    return view
+
+
+# Ряды каждого инструмента реестра доступны как представления по прежним именам (gold_cost, sliver_news, ...)
+COST_VIEWS = {}
+PREDICT_VIEWS = {}
+NEWS_VIEWS = {}
+for _instrument in get_instruments():
+    COST_VIEWS[_instrument.key] = _instrument_view(candles_table, _instrument.key, _instrument.cost_view)
+    PREDICT_VIEWS[_instrument.key] = _instrument_view(forecasts_table, _instrument.key, _instrument.predict_view)
+    NEWS_VIEWS[_instrument.key] = _instrument_view(news_table, _instrument.key, _instrument.news_view)
+
+
+def _view(table: Table, instrument: str, name: str):
+    return SERIES_VIEWS[name] if name in SERIES_VIEWS else _instrument_view(table, instrument, name)
+
+
+# Имена модуля для первых трёх металлов остаются и без записи в реестре
+gold_cost_table = _view(candles_table, 'gold', 'gold_cost')
+silver_cost_table = _view(candles_table, 'silver', 'sliver_cost')
+copper_cost_table = _view(candles_table, 'copper', 'copper_cost')
+
+gold_cost_predict_table = _view(forecasts_table, 'gold', 'gold_predict_cost')
+silver_cost_predict_table = _view(forecasts_table, 'silver', 'sliver_predict_cost')
+copper_cost_predict_table = _view(forecasts_table, 'copper', 'copper_predict_cost')
+
+gold_news_table = _view(news_table, 'gold', 'gold_news')
+silver_news_table = _view(news_table, 'silver', 'sliver_news')
+copper_news_table = _view(news_table, 'copper', 'copper_news')
+
+
+# Старые таблицы по металлам; нужны только для переноса данных в общие таблицы
+legacy_metadata = MetaData()
+
+
+def _legacy_cost(name: str) -> Table:
+    return Table(
+        name,
+        legacy_metadata,
+        Column('date', DateTime, primary_key=True),
+        Column('open', Float),
+        Column('high', Float),
+        Column('low', Float),
+        Column('close', Float),
+        Column('volume', Integer),)
+
+
+def _legacy_predict(name: str) -> Table:
+    return Table(
+        name,
+        legacy_metadata,
+        Column('date', DateTime, primary_key=True),
+        Column('open', Float),
+        Column('high', Float),
+        Column('low', Float),
+        Column('close', Float),)
+
+
+def _legacy_news(name: str) -> Table:
+    return Table(
+        name,
+        legacy_metadata,
+        Column('id', Integer, primary_key=True, autoincrement=True),
+        Column('title', String),
+        Column('description', String),
+        Column('full_text', String),
+        Column('date', DateTime),
+        Column('url', String),)
+
+
+# (старая таблица, общая таблица, инструмент)
+LEGACY_TABLES = [
+    (_legacy_cost('gold_cost'), candles_table, 'gold'),
+    (_legacy_cost('sliver_cost'), candles_table, 'silver'),
+    (_legacy_cost('copper_cost'), candles_table, 'copper'),
+    (_legacy_predict('gold_predict_cost'), forecasts_table, 'gold'),
+    (_legacy_predict('sliver_predict_cost'), forecasts_table, 'silver'),
+    (_legacy_predict('copper_predict_cost'), forecasts_table, 'copper'),
+    (_legacy_news('gold_news'), news_table, 'gold'),
+    (_legacy_news('sliver_news'), news_table, 'silver'),
+    (_legacy_news('copper_news'), news_table, 'copper'),
+]
@@ -0,0 +1,130 @@
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Callable, List
+
+import numpy as np
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from db.core import insert_data, resolve_series
+from db.engine import get_engine
+from db.models import candle_gaps_table, candles_table
+from parser.get_cost import CandleDict, get_cost_range
+
+# Глубина истории, загружаемой для пустого ряда
+HISTORY_DAYS = 365 * 7
+# Сколько пропусков дозапрашивается за один запуск; остальные — в следующих запусках
+MAX_GAP_REQUESTS = int(os.getenv('PRICE_SYNC_MAX_GAPS', '20'))
+
+
+def _utc_midnight(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def find_gaps(days, checked=()) -> List[tuple[date, date]]:
+    '''Пропущенные рабочие дни между соседними сохранёнными свечами
+
+    Возвращает диапазоны (первый, последний пропущенный день) без уже
+    проверенных ранее. Пропуск только из субботы и воскресенья не считается.
+    '''
+
+    days = np.unique(np.asarray(days, dtype='datetime64[D]'))
+    if len(days) < 2:
+        return []
+    starts = days[:-1] + 1
+    weekdays = np.busday_count(starts, days[1:])
+    checked = set(checked)
+    gaps = []
+    for index in np.flatnonzero(weekdays > 0):
+        gap = (starts[index].item(), (days[index + 1] - 1).item())
+        if gap not in checked:
+            gaps.append(gap)
+    return gaps
+
+
+def _stored_state(instrument: str) -> tuple[list, set]:
+    with get_engine().connect() as connection:
+        dates = connection.execute(
+            select(candles_table.c.date)
+            .where(candles_table.c.instrument == instrument)
+            .order_by(candles_table.c.date)
+        ).scalars().all()
+        checked = {
+            (row.start.date(), row.end.date())
+            for row in connection.execute(
+                select(candle_gaps_table.c.start, candle_gaps_table.c.end)
+                .where(candle_gaps_table.c.instrument == instrument)
+            )
+        }
+    return dates, checked
+
+
+def _mark_checked(instrument: str, gap: tuple[date, date], received: int) -> None:
+    row = {
+        'instrument': instrument,
+        'start': datetime.combine(gap[0], time.min),
+        'end': datetime.combine(gap[1], time.min),
+        'received': received,
+        'checked_at': datetime.now().replace(microsecond=0),
+    }
+    stmt = pg_insert(candle_gaps_table).values(row)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['instrument', 'start', 'end'],
+        set_={'received': stmt.excluded.received, 'checked_at': stmt.excluded.checked_at},
+    )
+    with get_engine().begin() as connection:
+        connection.execute(stmt)
+
+
+def sync_prices(figi: str, table,
+                fetch: Callable[[str, datetime, datetime | None], List[CandleDict]] = get_cost_range,
+                max_gaps: int = MAX_GAP_REQUESTS) -> dict:
+    '''Дозагрузка свечей инструмента: хвост после последней сохранённой даты и пропуски внутри ряда
+
+    Последний сохранённый день запрашивается повторно — его свеча могла быть
+    ещё не закрыта. Пропуск, за который API ничего не вернул (праздник биржи),
+    запоминается в candle_gaps и больше не запрашивается. Возвращает отчёт о
+    запрошенных диапазонах и записанных свечах; changed_from — самая ранняя
+    записанная свеча, с неё пересчитываются признаки LSTM.
+    '''
+
+    instrument = resolve_series(table)[1]
+    dates, checked = _stored_state(instrument)
+    report = {'instrument': instrument, 'watermark': dates[-1].isoformat() if dates else None}
+
+    if dates:
+        start = _utc_midnight(dates[-1].date())
+    else:
+        start = _utc_midnight(date.today() - timedelta(days=HISTORY_DAYS))
+    written = []
+    candles = fetch(figi, start, None)
+    report['tail'] = {
+        'from': start.date().isoformat(),
+        'received': len(candles),
+        'inserted': insert_data(candles, table),
+    }
+    if report['tail']['inserted']:
+        written.extend(candle['date'] for candle in candles)
+
+    gaps = find_gaps(dates, checked)
+    filled = []
+    for gap in gaps[:max_gaps]:
+        candles = fetch(figi, _utc_midnight(gap[0]), _utc_midnight(gap[1] + timedelta(days=1)))
+        inserted = insert_data(candles, table)
+        if inserted:
+            written.extend(candle['date'] for candle in candles)
+        _mark_checked(instrument, gap, len(candles))
+        filled.append({
+            'from': gap[0].isoformat(),
+            'to': gap[1].isoformat(),
+            'received': len(candles),
+            'inserted': inserted,
+        })
+    report['gaps'] = filled
+    report['gaps_pending'] = max(len(gaps) - max_gaps, 0)
+    report['changed_from'] = min(written).isoformat() if written else None
+
+    logger.info('Синхронизация {}: хвост с {} — {} свечей, пропусков дозапрошено {}, осталось {}.'.format(
+        instrument, report['tail']['from'], report['tail']['received'], len(filled), report['gaps_pending']))
+    return report
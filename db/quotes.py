@@ -0,0 +1,63 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Iterable, Mapping
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class LatestQuotes:
+    '''Последняя цена закрытия по каждой таблице цен, хранится в памяти процесса.
+
+    Цена запоминается вместе с версией данных инструмента (db/versions.py), при
+    которой она прочитана или записана. Запрос с другой версией — промах:
+    значит, свечи писал другой процесс (DAG, db.intraday), и цену нужно
+    перечитать из БД. TTL страхует записи без версии.
+    '''
+
+    def __init__(self, ttl: float = 3600.0):
+        self.ttl = ttl
+        self._quotes: dict[str, tuple[datetime, float, float, str | None]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, version: str | None = None) -> float | None:
+        with self._lock:
+            quote = self._quotes.get(key)
+            if quote is None:
+                return None
+            if quote[2] <= time.monotonic():
+                del self._quotes[key]
+                return None
+            if version is not None and quote[3] != version:
+                return None
+            return quote[1]
+
+    def publish(self, key: str, date: datetime, close: float, version: str | None = None) -> None:
+        '''Запоминает цену, если свеча не старше уже известной той же версии'''
+        date = _naive_utc(date)
+        with self._lock:
+            current = self._quotes.get(key)
+            if current is not None and current[3] == version and current[0] > date:
+                return
+            self._quotes[key] = (date, float(close), time.monotonic() + self.ttl, version)
+
+    def publish_rows(self, key: str, rows: Iterable[Mapping], version: str | None = None) -> None:
+        candles = [row for row in rows if row.get('date') is not None and row.get('close') is not None]
+        if candles:
+            latest = max(candles, key=lambda row: row['date'])
+            self.publish(key, latest['date'], latest['close'], version)
+
+    def invalidate(self, key: str | None = None) -> None:
+        with self._lock:
+            if key is None:
+                self._quotes.clear()
+            else:
+                self._quotes.pop(key, None)
+
+
+latest_quotes = LatestQuotes(ttl=float(os.getenv('LATEST_QUOTE_TTL', '3600')))
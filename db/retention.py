@@ -0,0 +1,110 @@
+import os
+from datetime import datetime, timedelta
+
+from loguru import logger
+from sqlalchemy import and_, literal_column, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from db.engine import get_engine
+from db.models import ARCHIVED_SEARCH_FIELDS, news_archive_table, news_table, search_vector_sql
+
+# Тексты статей старше NEWS_RETENTION_DAYS дней переносятся в news_archive в сжатом виде
+NEWS_RETENTION_DAYS = int(os.getenv('NEWS_RETENTION_DAYS', '365'))
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_CODEC = 'zstd'
+ARCHIVE_LEVEL = 9
+
+
+def compress_body(text: str) -> tuple[bytes, int]:
+    '''Сжатие текста статьи; возвращает сжатые байты и исходный размер'''
+
+    # pyarrow уже нужен для экспорта в Parquet и умеет zstd, отдельная зависимость не требуется
+    import pyarrow as pa
+
+    raw = text.encode('utf-8')
+    return pa.Codec(ARCHIVE_CODEC, compression_level=ARCHIVE_LEVEL).compress(raw, asbytes=True), len(raw)
+
+
+def decompress_body(codec: str, body: bytes, raw_size: int) -> str:
+    '''Восстановление текста статьи из архива'''
+
+    import pyarrow as pa
+
+    return pa.Codec(codec).decompress(body, decompressed_size=raw_size, asbytes=True).decode('utf-8')
+
+
+def archive_update_stmt(ids: list):
+    '''Обнуление full_text заархивированных статей с сохранением его лексем для поиска'''
+
+    # Выражения SET считаются по строке до изменения, поэтому вектор строится из прежнего full_text
+    return (
+        update(news_table)
+        .where(news_table.c.id.in_(ids))
+        .values(full_text=None, archived_search=literal_column(search_vector_sql(ARCHIVED_SEARCH_FIELDS)))
+    )
+
+
+def archive_old_news(older_than_days: int | None = None, batch_size: int = ARCHIVE_BATCH_SIZE) -> dict:
+    '''Перенос текстов статей старше заданного возраста в news_archive
+
+    Статьи обходятся по id пачками; каждая пачка — своя транзакция, в которой
+    сжатый текст записывается в архив, а full_text в news обнуляется. Лексемы
+    текста тем же UPDATE сохраняются в archived_search, поэтому статья
+    по-прежнему находится поиском по тексту. Повторный запуск продолжает
+    с оставшихся статей.
+    '''
+
+    days = NEWS_RETENTION_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.now() - timedelta(days=days)
+    conditions = [news_table.c.date < cutoff, news_table.c.full_text.is_not(None)]
+
+    archived = 0
+    raw_total = 0
+    compressed_total = 0
+    last_id = 0
+    engine = get_engine()
+    while True:
+        query = (
+            select(news_table.c.id, news_table.c.full_text)
+            .where(and_(news_table.c.id > last_id, *conditions))
+            .order_by(news_table.c.id)
+            .limit(batch_size)
+        )
+        with engine.connect() as connection:
+            rows = connection.execute(query).all()
+        if not rows:
+            break
+
+        now = datetime.now().replace(microsecond=0)
+        records = []
+        for news_id, full_text in rows:
+            body, raw_size = compress_body(full_text)
+            records.append({'news_id': news_id, 'codec': ARCHIVE_CODEC, 'raw_size': raw_size, 'body': body, 'archived_at': now})
+            raw_total += raw_size
+            compressed_total += len(body)
+
+        stmt = pg_insert(news_archive_table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['news_id'],
+            set_={name: stmt.excluded[name] for name in ('codec', 'raw_size', 'body', 'archived_at')},
+        )
+        ids = [record['news_id'] for record in records]
+        with engine.begin() as connection:
+            connection.execute(stmt, records)
+            connection.execute(archive_update_stmt(ids))
+        archived += len(rows)
+        last_id = ids[-1]
+
+    logger.info('Архивировано статей: {} (старше {}), сжатие {} -> {} байт.'.format(
+        archived, cutoff.date(), raw_total, compressed_total))
+    return {
+        'archived': archived,
+        'cutoff': cutoff.replace(microsecond=0).isoformat(),
+        'raw_bytes': raw_total,
+        'compressed_bytes': compressed_total,
+        'ratio': round(compressed_total / raw_total, 3) if raw_total else None,
+    }
+
+
+if __name__ == '__main__':
+    archive_old_news()
@@ -5,64 +5,105 @@ backend endpoints. The DAG will call the backend endpoints instead of
 containing scraping/prediction logic itself.
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any
 import logging
 
-from db.core import insert_data, table_to_df
-from db.models import (
-    gold_cost_table,
-    silver_cost_table,
-    copper_cost_table,
-    gold_news_table,
-    silver_news_table,
-    copper_news_table,
-)
-from parser.get_cost import get_cost_daily
+from db.core import insert_data, new_news, resolve_series, table_to_df
+from db.instruments import Instrument, NewsSource, current_figis, get_instruments
+from db.models import COST_VIEWS, NEWS_VIEWS
+from db.price_sync import sync_prices
 from scraper.scrape import Scraper
-from predict_model.LSTM import main as run_predictions_main
 
 logger = logging.getLogger(__name__)
 
 
 def _update_price_table(figi: str, table) -> Dict[str, Any]:
+    """Fetch candles after the last stored one and fill holes in the series."""
     try:
-        candles = get_cost_daily(figi)
-        if candles:
-            insert_data(candles, table)
-            return {"inserted": len(candles)}
-        return {"inserted": 0, "note": "no new candles"}
+        return sync_prices(figi, table)
     except Exception as e:
         logger.exception("Failed to update price table %s", getattr(table, 'name', table))
         return {"error": str(e)}
 
 
-def _update_news(url: str, keywords: list[str], table) -> Dict[str, Any]:
+def _update_news(sources: tuple[NewsSource, ...], table) -> Dict[str, Any]:
+    """Scrape every news source of an instrument and store the articles with their sentiment."""
+    news = []
+    errors = []
+    for source in sources:
+        try:
+            scraper = Scraper(url=source.url, keywords=list(source.keywords), output_file=False, years=1, max_pages=1)
+            news.extend(scraper.get_recent_news() or [])
+        except Exception as e:
+            logger.exception("Failed to scrape %s for %s", source.url, getattr(table, 'name', table))
+            errors.append(f"{source.url}: {e}")
     try:
-        scraper = Scraper(url=url, keywords=keywords, output_file=False, years=1, max_pages=1)
-        news = scraper.get_recent_news()
+        received = len(news)
+        # articles stored by earlier runs are skipped before the SVM sees them
+        news = new_news(news, table) if news else []
         if news:
-            insert_data(news, table)
-            return {"inserted": len(news)}
-        return {"inserted": 0, "note": "no new news"}
+            # imported here: scoring needs scikit-learn and the SVM artifact
+            from predict_model.sentiment import refresh_daily_sentiment, score_news
+
+            written = insert_data(score_news(news), table)
+            dates = [item["date"] for item in news if item.get("date") is not None]
+            result = {"inserted": written, "received": received}
+            if written and dates:
+                refresh_daily_sentiment(resolve_series(table)[1], min(dates))
+                # features of the days whose sentiment changed are recomputed too
+                result["changed_from"] = min(dates).isoformat()
+        else:
+            result = {"inserted": 0, "received": received, "note": "no new news"}
     except Exception as e:
         logger.exception("Failed to update news table %s", getattr(table, 'name', table))
+        result = {"error": str(e)}
+    if errors:
+        result["errors"] = errors
+    return result
+
+
+def _update_features(metal: str, since: str | None = None) -> Dict[str, Any]:
+    try:
+        # imported here: the feature store needs pandas
+        from predict_model.features import update_feature_store
+
+        return {"inserted": update_feature_store(metal, since=since)}
+    except Exception as e:
+        logger.exception("Failed to update feature store for %s", metal)
         return {"error": str(e)}
 
 
-def update_all_data() -> Dict[str, Any]:
-    """Run full update: prices and news for all metals.
+def _update_instrument(instrument: Instrument, figi: str) -> Dict[str, Any]:
+    """Prices, then news, then the feature rows built from both, for one instrument.
 
-    Returns a summary dict with inserted counts and possible errors.
+    Feature rows are recomputed from the earliest candle or news day written
+    in this run, so backfilled gaps and older articles reach the LSTM input.
     """
-    summary: dict[str, Any] = {}
+    prices = _update_price_table(figi, COST_VIEWS[instrument.key])
+    news = _update_news(instrument.news, NEWS_VIEWS[instrument.key])
+    changed = [value for value in (prices.get("changed_from"), news.get("changed_from")) if value]
+    return {
+        f"{instrument.key}_prices": prices,
+        f"{instrument.key}_news": news,
+        f"{instrument.key}_features": _update_features(instrument.legacy, min(changed) if changed else None),
+    }
+
 
-    summary['gold_prices'] = _update_price_table('BBG000VJ5YR4', gold_cost_table)
-    summary['silver_prices'] = _update_price_table('BBG000VHQTD1', silver_cost_table)
-    summary['copper_prices'] = _update_price_table('FUTCOPPE0326', copper_cost_table)
+def update_all_data() -> Dict[str, Any]:
+    """Run full update: prices, news and features for every instrument of the registry.
 
-    summary['gold_news'] = _update_news('https://www.finversia.ru/dragmetally', ['золот', 'gold'], gold_news_table)
-    summary['silver_news'] = _update_news('https://www.finversia.ru/dragmetally', ['серебр', 'silver'], silver_news_table)
-    summary['copper_news'] = _update_news('https://www.finversia.ru/syrevye-rynki', ['мед', 'copper'], copper_news_table)
+    Instruments are updated concurrently; prices go over the shared market
+    data client, futures are synced from their current contract. Returns a
+    summary dict with inserted counts and possible errors.
+    """
+    summary: dict[str, Any] = {}
+    instruments = get_instruments()
+    figis = current_figis(instruments)
+    with ThreadPoolExecutor(max_workers=len(instruments), thread_name_prefix='update') as executor:
+        futures = [executor.submit(_update_instrument, instrument, figis[instrument.key]) for instrument in instruments]
+        for future in futures:
+            summary.update(future.result())
 
     return summary
 
@@ -73,6 +114,9 @@ def run_price_predictions() -> Dict[str, Any]:
     Returns status dict. The prediction code writes predicted rows into DB.
     """
     try:
+        # TensorFlow is only needed here, so it is not imported with the module
+        from predict_model.LSTM import main as run_predictions_main
+
         run_predictions_main()
         return {"status": "ok"}
     except Exception as e:
@@ -0,0 +1,55 @@
+from datetime import datetime
+from typing import Dict, Iterable
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from db.models import candles_table, data_versions_table, forecasts_table, news_table
+
+# Записи в эти таблицы меняют то, что показывают страницы и API металлов
+VERSIONED_TABLES = (candles_table, forecasts_table, news_table)
+
+# Версия инструмента, у которого ещё не было ни одной записи
+INITIAL_VERSION = '0'
+
+
+def version_token(version: int, updated_at: datetime) -> str:
+    '''Строка версии для ETag и ключей кеша
+
+    Время изменения отличает версии и после пересоздания базы, когда счётчик начинается заново.
+    '''
+
+    return '{}.{:x}'.format(version, int(updated_at.timestamp() * 1_000_000))
+
+
+def bump_versions(connection, instruments: Iterable[str]) -> Dict[str, str]:
+    '''Увеличение версий инструментов в транзакции записи; возвращает новые строки версий
+
+    Веб-процессы сверяют по версии ETag, снимки страниц и последние цены, поэтому
+    видят и записи, сделанные другими процессами (DAG, db.intraday).
+    '''
+
+    instruments = sorted(set(instruments))
+    if not instruments:
+        return {}
+    table = data_versions_table
+    stmt = pg_insert(table).values([
+        {'instrument': instrument, 'version': 1, 'updated_at': func.clock_timestamp()}
+        for instrument in instruments
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['instrument'],
+        set_={'version': table.c.version + 1, 'updated_at': stmt.excluded.updated_at},
+    ).returning(table.c.instrument, table.c.version, table.c.updated_at)
+    return read_versions(connection.execute(stmt))
+
+
+def versions_stmt():
+    table = data_versions_table
+    return select(table.c.instrument, table.c.version, table.c.updated_at)
+
+
+def read_versions(rows) -> Dict[str, str]:
+    '''Строки версий по результату versions_stmt'''
+
+    return {instrument: version_token(version, updated_at) for instrument, version, updated_at in rows}
@@ -3,16 +3,24 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from datetime import timedelta, datetime
+from datetime import timedelta, datetime, timezone
 
-from tinkoff.invest import CandleInterval, Client, HistoricCandle
-from tinkoff.invest.schemas import CandleSource, FindInstrumentResponse
+import numpy as np
+from tinkoff.invest import Client, HistoricCandle
+from tinkoff.invest.schemas import FindInstrumentResponse
 from tinkoff.invest.utils import now
-from typing import List, TypedDict
+from parser.market_data import get_candles_many, get_market_data_client
+from typing import Dict, List, TypedDict
 
 
 TOKEN = os.getenv('INVEST_TOKEN')
 
+# Quotation: units — целая часть, nano — дробная в миллиардных долях (оба со знаком числа)
+NANO = 1_000_000_000
+PRICE_FIELDS = ('open', 'high', 'low', 'close')
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
 class CandleDict(TypedDict):
     date: datetime
     open: float
@@ -32,18 +40,41 @@ def find(name: str) -> FindInstrumentResponse:
     with Client(token=TOKEN) as client:
         return client.instruments.find_instrument(query=name)
 
+def quotation_to_float(quotation) -> float:
+    '''Одна котировка Quotation в число — так же, как в candles_to_columns'''
+
+    return (quotation.units * NANO + quotation.nano) / NANO
+
+def candles_to_columns(arr: List[HistoricCandle]) -> Dict[str, np.ndarray]:
+    '''Перевод свечей в столбцы NumPy: date (datetime64[us], UTC), open/high/low/close (float64), volume (int64)
+
+    Цены собираются в целых нано-единицах (units * 10^9 + nano) и делятся один
+    раз, поэтому nano с ведущими нулями и отрицательные котировки считаются точно.
+    Столбцы подходят для insert_columns и для pd.DataFrame без промежуточных словарей.
+    '''
+
+    count = len(arr)
+    columns = {
+        'date': np.fromiter(((candle.time - _EPOCH) // _MICROSECOND for candle in arr),
+                            dtype=np.int64, count=count).astype('datetime64[us]'),
+    }
+    for field in PRICE_FIELDS:
+        units = np.fromiter((getattr(candle, field).units for candle in arr), dtype=np.int64, count=count)
+        nano = np.fromiter((getattr(candle, field).nano for candle in arr), dtype=np.int64, count=count)
+        columns[field] = (units * NANO + nano) / NANO
+    columns['volume'] = np.fromiter((candle.volume for candle in arr), dtype=np.int64, count=count)
+    return columns
+
+def columns_to_dicts(columns: Dict[str, np.ndarray]) -> List[CandleDict]:
+    '''Столбцы свечей в список словарей (дата — naive datetime в UTC)'''
+
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*(columns[name].tolist() for name in names))]
+
 def list_to_dict(arr: List[HistoricCandle]) -> List[CandleDict]:
     '''Функция для перевода массива в словарь'''
-    all_candle = []
-    for candle in arr:
-        all_candle.append({'date': candle.time,
-                           'open': float(f'{candle.open.units}.{candle.open.nano}'),
-                           'high': float(f'{candle.high.units}.{candle.high.nano}'),
-                           'low': float(f'{candle.low.units}.{candle.low.nano}'),
-                           'close': float(f'{candle.close.units}.{candle.close.nano}'),
-                           'volume': int(candle.volume),
-                           })
-    return all_candle
+
+    return columns_to_dicts(candles_to_columns(arr))
 
 def list_to_volume_dict(arr: List[HistoricCandle]) -> List[VolumeDict]:
     '''Функция для перевода массива свечей в словарь объёма'''
@@ -54,31 +85,45 @@ def list_to_volume_dict(arr: List[HistoricCandle]) -> List[VolumeDict]:
                            })
     return all_candle
 
+def _get_candles_range(figi: str, start: datetime, end: datetime | None = None) -> List[HistoricCandle]:
+    '''Дневные свечи за период [start, end); без end — по текущий момент
+
+    Запрос идёт через общий клиент процесса (один канал gRPC, deadline и повторы).
+    '''
+
+    return get_market_data_client().get_candles(figi, start, end)
+
 def _get_candles(figi: str, delta: timedelta) -> List[HistoricCandle]:
     '''Общий helper для получения свечей'''
 
-    with Client(TOKEN) as client:
-        all_candle = []
-        for candle in client.get_all_candles(
-                instrument_id=figi,
-                from_=now() - delta,
-                interval=CandleInterval.CANDLE_INTERVAL_DAY,
-                candle_source_type=CandleSource.CANDLE_SOURCE_UNSPECIFIED,
-        ):
-            all_candle.append(candle)
-
-    return all_candle
+    return _get_candles_range(figi, now() - delta)
 
 def get_cost(figi: str) -> List[CandleDict]:
     '''Функция для получения цены по figi'''
 
     return list_to_dict(_get_candles(figi, timedelta(days=365 * 7)))
 
+def get_cost_columns(figi: str, days: int = 365 * 7) -> Dict[str, np.ndarray]:
+    '''Функция для получения цены по figi в виде столбцов NumPy (для больших загрузок)'''
+
+    return candles_to_columns(_get_candles(figi, timedelta(days=days)))
+
+def get_cost_columns_many(figis: List[str], days: int = 365 * 7) -> Dict[str, Dict[str, np.ndarray]]:
+    '''Функция для получения цен нескольких figi параллельно, в виде столбцов NumPy'''
+
+    candles = get_candles_many(figis, now() - timedelta(days=days))
+    return {figi: candles_to_columns(candles[figi]) for figi in figis}
+
 def get_cost_daily(figi: str, days: int = 1) -> List[CandleDict]:
     '''Функция для получения цены по figi'''
 
     return list_to_dict(_get_candles(figi, timedelta(days=days)))
 
+def get_cost_range(figi: str, start: datetime, end: datetime | None = None) -> List[CandleDict]:
+    '''Функция для получения цены по figi за период [start, end)'''
+
+    return list_to_dict(_get_candles_range(figi, start, end))
+
 def get_volume(figi: str) -> List[VolumeDict]:
     '''Функция для получения объёма торгов по figi'''
 
@@ -0,0 +1,221 @@
+import atexit
+import collections
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import grpc
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+TOKEN = os.getenv('INVEST_TOKEN')
+# Адрес API; для локальной заглушки (benchmarks/market_data.py) задаётся свой
+TINKOFF_TARGET = os.getenv('TINKOFF_TARGET')
+# Ограничение на каждый gRPC-вызов и повторы с экспоненциальной задержкой
+DEADLINE_SECONDS = float(os.getenv('TINKOFF_DEADLINE', '15'))
+MAX_RETRIES = int(os.getenv('TINKOFF_RETRIES', '3'))
+BACKOFF_SECONDS = float(os.getenv('TINKOFF_BACKOFF', '0.5'))
+MAX_WORKERS = int(os.getenv('TINKOFF_MAX_WORKERS', '4'))
+
+# Временные ошибки, после которых запрос повторяется
+RETRY_CODES = (
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+)
+
+
+class _CallDetails(
+    collections.namedtuple('_CallDetails', ('method', 'timeout', 'metadata', 'credentials', 'wait_for_ready', 'compression')),
+    grpc.ClientCallDetails,
+):
+    pass
+
+
+class DeadlineInterceptor(grpc.UnaryUnaryClientInterceptor, grpc.UnaryStreamClientInterceptor):
+    '''Проставляет deadline каждому вызову, у которого он не задан'''
+
+    def __init__(self, timeout: float = DEADLINE_SECONDS):
+        self.timeout = timeout
+
+    def _details(self, details):
+        if details.timeout is not None:
+            return details
+        return _CallDetails(
+            details.method, self.timeout, details.metadata, details.credentials,
+            getattr(details, 'wait_for_ready', None), getattr(details, 'compression', None),
+        )
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        return continuation(self._details(client_call_details), request)
+
+    def intercept_unary_stream(self, continuation, client_call_details, request):
+        return continuation(self._details(client_call_details), request)
+
+
+def _status_code(error: Exception):
+    '''Код gRPC из grpc.RpcError или из RequestError клиента Tinkoff'''
+
+    code = getattr(error, 'code', None)
+    return code() if callable(code) else code
+
+
+def _sdk_services(token: str | None, target: str | None, timeout: float):
+    '''Открытие клиента Tinkoff: один канал на процесс, закрывается вместе с клиентом'''
+
+    from tinkoff.invest import Client
+
+    kwargs = {'interceptors': [DeadlineInterceptor(timeout)]}
+    if target:
+        kwargs['target'] = target
+    client = Client(token, **kwargs)
+    return client.__enter__(), lambda: client.__exit__(None, None, None)
+
+
+class MarketDataClient:
+    '''Долгоживущий клиент рыночных данных
+
+    Канал gRPC открывается при первом запросе и используется всеми потоками;
+    свечи по нескольким инструментам запрашиваются параллельно, каждый
+    запрос повторяется при временных ошибках.
+    '''
+
+    def __init__(self, token: str | None = TOKEN, target: str | None = TINKOFF_TARGET,
+                 deadline: float = DEADLINE_SECONDS, retries: int = MAX_RETRIES,
+                 backoff: float = BACKOFF_SECONDS, max_workers: int = MAX_WORKERS,
+                 services_factory: Callable | None = None):
+        self.token = token
+        self.target = target
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.max_workers = max_workers
+        self._services_factory = services_factory or (lambda: _sdk_services(self.token, self.target, self.deadline))
+        self._services = None
+        self._close = None
+        self._lock = threading.Lock()
+
+    def services(self):
+        with self._lock:
+            if self._services is None:
+                self._services, self._close = self._services_factory()
+            return self._services
+
+    def close(self) -> None:
+        with self._lock:
+            close, self._services, self._close = self._close, None, None
+        if close is not None:
+            close()
+
+    def _backoff(self, attempt: int, description: str, reason) -> None:
+        delay = self.backoff * 2 ** attempt + random.uniform(0, self.backoff)
+        logger.warning('{}: {} (попытка {} из {}), повтор через {:.2f} с.'.format(
+            description, reason, attempt + 1, self.retries + 1, delay))
+        time.sleep(delay)
+
+    def _retry(self, call: Callable, description: str):
+        for attempt in range(self.retries + 1):
+            try:
+                return call()
+            except Exception as error:
+                code = _status_code(error)
+                if code not in RETRY_CODES or attempt == self.retries:
+                    raise
+                self._backoff(attempt, description, code)
+
+    def get_candles(self, figi: str, start: datetime, end: datetime | None = None) -> list:
+        '''Дневные свечи инструмента за период [start, end); без end — по текущий момент'''
+
+        from tinkoff.invest import CandleInterval
+        from tinkoff.invest.schemas import CandleSource
+
+        def _fetch():
+            return list(self.services().get_all_candles(
+                instrument_id=figi,
+                from_=start,
+                to=end,
+                interval=CandleInterval.CANDLE_INTERVAL_DAY,
+                candle_source_type=CandleSource.CANDLE_SOURCE_UNSPECIFIED,
+            ))
+
+        return self._retry(_fetch, 'Свечи {}'.format(figi))
+
+    def get_futures(self) -> list:
+        '''Все фьючерсы, доступные в API (figi, базовый актив, последний день торгов)'''
+
+        return self._retry(lambda: list(self.services().instruments.futures().instruments), 'Фьючерсы')
+
+    def get_candles_many(self, requests: Dict[str, Tuple[datetime, datetime | None]]) -> Dict[str, list]:
+        '''Свечи нескольких инструментов параллельно: {figi: (start, end)} -> {figi: свечи}'''
+
+        if not requests:
+            return {}
+        workers = min(self.max_workers, len(requests))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='market-data') as executor:
+            futures = {
+                figi: executor.submit(self.get_candles, figi, start, end)
+                for figi, (start, end) in requests.items()
+            }
+            return {figi: future.result() for figi, future in futures.items()}
+
+    def stream_candles(self, figis: List[str]) -> Iterator:
+        '''Закрытые минутные свечи по figi из потока MarketDataStream
+
+        None отдаётся на служебные сообщения (ping, ответы на подписку), чтобы
+        потребитель мог сбрасывать накопленное по таймеру. Deadline на поток не
+        ставится (DeadlineInterceptor перехватывает только вызовы с одним
+        запросом); после обрыва поток открывается заново с той же подпиской.
+        '''
+
+        from tinkoff.invest import CandleInstrument, SubscriptionInterval
+
+        subscription = [
+            CandleInstrument(figi=figi, interval=SubscriptionInterval.SUBSCRIPTION_INTERVAL_ONE_MINUTE)
+            for figi in figis
+        ]
+        attempt = 0
+        while True:
+            stream = self.services().create_market_data_stream()
+            stream.candles.waiting_close().subscribe(subscription)
+            try:
+                for message in stream:
+                    attempt = 0
+                    yield message.candle
+                reason = 'поток закрыт сервером'
+            except Exception as error:
+                reason = _status_code(error)
+                if reason not in RETRY_CODES:
+                    raise
+            finally:
+                stream.stop()
+            if attempt >= self.retries:
+                raise ConnectionError('Поток свечей {}: {}'.format(', '.join(figis), reason))
+            self._backoff(attempt, 'Поток свечей', reason)
+            attempt += 1
+
+
+_client: MarketDataClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_market_data_client() -> MarketDataClient:
+    '''Общий клиент процесса; создаётся при первом обращении'''
+
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MarketDataClient()
+            atexit.register(_client.close)
+        return _client
+
+
+def get_candles_many(figis: List[str], start: datetime, end: datetime | None = None) -> Dict[str, list]:
+    '''Свечи одного периода по списку figi, запрошенные параллельно'''
+
+    return get_market_data_client().get_candles_many({figi: (start, end) for figi in figis})
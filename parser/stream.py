@@ -0,0 +1,76 @@
+import json
+import time
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Iterator, List, TypedDict
+
+from parser.get_cost import PRICE_FIELDS, quotation_to_float
+from parser.market_data import get_market_data_client
+
+
+class IntradayBar(TypedDict):
+    figi: str
+    date: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: int
+
+
+def candle_to_bar(candle) -> IntradayBar:
+    '''Свеча из потока Tinkoff в словарь; дата — naive datetime в UTC, как в candles_to_columns'''
+
+    bar = {'figi': candle.figi, 'date': candle.time.astimezone(timezone.utc).replace(tzinfo=None)}
+    for field in PRICE_FIELDS:
+        bar[field] = quotation_to_float(getattr(candle, field))
+    bar['volume'] = int(candle.volume)
+    return bar
+
+
+def _bar_to_json(bar: IntradayBar) -> str:
+    return json.dumps({**bar, 'date': bar['date'].isoformat()})
+
+
+def _bar_from_json(line: str) -> IntradayBar:
+    bar = json.loads(line)
+    bar['date'] = datetime.fromisoformat(bar['date'])
+    return bar
+
+
+def record_bars(bars: Iterable[IntradayBar | None], path: str) -> Iterator[IntradayBar | None]:
+    '''Пропускает свечи дальше, дописывая каждую в файл JSON Lines для replay_bars'''
+
+    with open(path, 'a', encoding='utf-8') as file:
+        for bar in bars:
+            if bar is not None:
+                file.write(_bar_to_json(bar) + '\n')
+                file.flush()
+            yield bar
+
+
+def stream_bars(figis: List[str], record: str | None = None) -> Iterator[IntradayBar | None]:
+    '''Минутные свечи из потока Tinkoff API; None — служебное сообщение без свечи'''
+
+    candles = get_market_data_client().stream_candles(figis)
+    bars = (candle_to_bar(candle) if candle is not None else None for candle in candles)
+    return record_bars(bars, record) if record else bars
+
+
+def replay_bars(path: str, speed: float = 0.0,
+                sleep: Callable[[float], None] = time.sleep) -> Iterator[IntradayBar]:
+    '''Воспроизведение записанного потока (JSON Lines) вместо живого API
+
+    speed — во сколько раз быстрее реального времени идут свечи: при 60 минута
+    потока проходит за секунду; 0 — без пауз.
+    '''
+
+    previous = None
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            bar = _bar_from_json(line)
+            if speed > 0 and previous is not None and bar['date'] > previous:
+                sleep((bar['date'] - previous).total_seconds() / speed)
+            previous = bar['date'] if previous is None else max(previous, bar['date'])
+            yield bar
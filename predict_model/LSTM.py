@@ -4,9 +4,10 @@ Run as a module:
 
 	python -m predict_model.LSTM
 
-The script reads gold prices and news from the database, rebuilds the feature
-set expected by the saved LSTM bundle, forecasts the next horizon, and writes
-the predicted candles into `gold_predict_cost`.
+The script appends new candles and news to the feature store
+(`predict_model/features.py`), reads the last `timesteps` feature rows
+expected by the saved LSTM bundle, forecasts the next horizon, and writes
+the predicted candles into the `forecasts` table as a new run.
 """
 
 from __future__ import annotations
@@ -15,31 +16,20 @@ import pickle
 from pathlib import Path
 from typing import Iterable
 
-import joblib
 import numpy as np
 import pandas as pd
 from loguru import logger
-from sqlalchemy import delete, insert
 from tensorflow.keras.models import model_from_json
 
-from db.core import table_to_df
-from db.create_db import engine
-from db.models import (
-	gold_cost_predict_table,
-	silver_cost_predict_table,
-	copper_cost_predict_table,
-)
+from db.core import insert_data
+# load_market_data is re-exported for callers that still build the full frame
+from predict_model.features import load_feature_window, load_market_data, update_feature_store  # noqa: F401
+from db.instruments import get_instruments
+from db.models import PREDICT_VIEWS
 
 
-PROJECT_ROOT = Path(__file__).resolve().parents[1]
-SVM_PATH = PROJECT_ROOT / "predict_model" / "models" / "svm_sentiment_pipeline.pkl"
-
-# map metal key to DB predict table variable
-PREDICT_TABLES = {
-	"gold": gold_cost_predict_table,
-	"sliver": silver_cost_predict_table,
-	"copper": copper_cost_predict_table,
-}
+# map LSTM metal key (legacy table prefix) to its DB predict table
+PREDICT_TABLES = {instrument.legacy: PREDICT_VIEWS[instrument.key] for instrument in get_instruments()}
 
 
 def load_bundle(bundle_path: Path) -> dict:
@@ -66,94 +56,6 @@ def load_bundle(bundle_path: Path) -> dict:
 	return bundle
 
 
-def _normalize_dates(series: pd.Series) -> pd.Series:
-	return pd.to_datetime(series).dt.floor("D")
-
-
-def _compute_price_features(df: pd.DataFrame) -> pd.DataFrame:
-	df = df.copy()
-	df["hl_range"] = df["high"] - df["low"]
-	df["oc_change"] = df["close"] - df["open"]
-	df["close_return"] = df["close"].pct_change().replace([np.inf, -np.inf], 0).fillna(0)
-	df["close_return_3"] = df["close"].pct_change(3).replace([np.inf, -np.inf], 0).fillna(0)
-	df["close_return_5"] = df["close"].pct_change(5).replace([np.inf, -np.inf], 0).fillna(0)
-	df["ma_close_5"] = df["close"].rolling(5).mean()
-	df["ma_close_10"] = df["close"].rolling(10).mean()
-	df["ma_close_20"] = df["close"].rolling(20).mean()
-	df["volatility_5"] = df["close"].pct_change().rolling(5).std()
-	df["volatility_10"] = df["close"].pct_change().rolling(10).std()
-	df["price_momentum_5"] = df["close"].pct_change(5).replace([np.inf, -np.inf], 0).fillna(0)
-	df["price_momentum_10"] = df["close"].pct_change(10).replace([np.inf, -np.inf], 0).fillna(0)
-	return df
-
-
-def load_market_data(metal: str, history_years: int = 2) -> pd.DataFrame:
-	"""Load candles and news for `metal` from DB and build the model input frame.
-
-	metal should be one of: 'gold', 'sliver', 'copper'.
-	"""
-
-	df_cost = table_to_df(f"{metal}_cost")
-	if df_cost.empty:
-		raise ValueError(f"{metal}_cost table is empty")
-
-	df_cost = df_cost.copy()
-	df_cost["date"] = _normalize_dates(df_cost["date"])
-	df_cost = df_cost.sort_values("date").groupby("date", as_index=False).agg(
-		{"open": "mean", "high": "mean", "low": "mean", "close": "mean", "volume": "mean"}
-	)
-	df_cost["volume"] = df_cost["volume"].fillna(0)
-
-	if history_years is not None:
-		max_cost_date = pd.to_datetime(df_cost["date"].max())
-		cutoff_date = (max_cost_date - pd.DateOffset(years=history_years)).normalize()
-		df_cost = df_cost[df_cost["date"] >= cutoff_date].copy()
-
-	df_cost = _compute_price_features(df_cost)
-
-	try:
-		df_news = table_to_df(f"{metal}_news")
-	except Exception:
-		df_news = pd.DataFrame(columns=["date", "full_text"])
-
-	if not df_news.empty:
-		df_news = df_news.copy()
-		df_news["date"] = _normalize_dates(df_news["date"])
-		if history_years is not None:
-			df_news = df_news[pd.to_datetime(df_news["date"]) >= df_cost["date"].min()].copy()
-
-		svm_pipeline = joblib.load(SVM_PATH)
-		df_news = df_news.dropna(subset=["full_text"]).copy()
-		sentiments = svm_pipeline.predict(df_news["full_text"].astype(str))
-		sentiment_map = {0: -1, 1: 0, 2: 1}
-		df_news["sentiment"] = pd.Series(sentiments, index=df_news.index).map(sentiment_map).astype(int)
-
-		daily_sentiment = df_news.groupby("date", as_index=False)["sentiment"].sum()
-		daily_sentiment["sentiment"] = daily_sentiment["sentiment"].clip(-1, 1)
-	else:
-		daily_sentiment = pd.DataFrame({"date": df_cost["date"], "sentiment": 0})
-
-	df = pd.merge(df_cost, daily_sentiment, on="date", how="left")
-	df["sentiment"] = df["sentiment"].fillna(0).astype(int)
-	df["sentiment_ma_3"] = df["sentiment"].rolling(3).mean()
-	df["sentiment_ma_7"] = df["sentiment"].rolling(7).mean()
-	df["price_momentum_5"] = df["close"].pct_change(5).replace([np.inf, -np.inf], 0).fillna(0)
-	df["price_momentum_10"] = df["close"].pct_change(10).replace([np.inf, -np.inf], 0).fillna(0)
-
-	fill_cols = [
-		"ma_close_5",
-		"ma_close_10",
-		"ma_close_20",
-		"volatility_5",
-		"volatility_10",
-		"sentiment_ma_3",
-		"sentiment_ma_7",
-	]
-	df[fill_cols] = df[fill_cols].bfill().ffill().fillna(0)
-	df = df.sort_values("date").set_index("date")
-	return df
-
-
 def build_model(bundle: dict):
 	model = model_from_json(bundle["model_json"])
 	model.set_weights(bundle["model_weights"])
@@ -196,20 +98,17 @@ def forecast_prices_for_metal(bundle: dict, df: pd.DataFrame) -> pd.DataFrame:
 
 
 def replace_predictions_in_db(predictions: pd.DataFrame, predict_table) -> None:
+	"""Store the forecast as a new model run; readers of `predict_table` see the latest run."""
 	records = predictions.copy()
 	records["date"] = pd.to_datetime(records["date"]).map(lambda value: pd.Timestamp(value).to_pydatetime())
 	payload = records.to_dict(orient="records")
-	dates = [row["date"] for row in payload]
-
-	with engine.begin() as connection:
-		connection.execute(delete(predict_table).where(predict_table.c.date.in_(dates)))
-		connection.execute(insert(predict_table), payload)
+	insert_data(payload, predict_table)
 
 
 def main() -> None:
-	metals = ["gold", "sliver", "copper"]
-	for metal in metals:
-		bundle_path = PROJECT_ROOT / "predict_model" / "models" / f"{metal}_lstm_bundle.pkl"
+	for instrument in get_instruments():
+		metal = instrument.legacy
+		bundle_path = instrument.model_path
 		logger.info("Loading saved LSTM bundle for {}...", metal)
 		if not bundle_path.exists():
 			logger.warning("Bundle for %s not found, skipping", metal)
@@ -220,11 +119,12 @@ def main() -> None:
 
 		history_years = int(bundle.get("history_years", 2))
 
-		logger.info("Loading %s market data from database...", metal)
+		logger.info("Updating {} feature store...", metal)
 		try:
-			market_df = load_market_data(metal, history_years=history_years)
+			update_feature_store(metal, history_years=history_years)
+			market_df = load_feature_window(metal, int(bundle["timesteps"]))
 		except Exception as e:
-			logger.error("Failed to load market data for %s: %s", metal, e)
+			logger.error("Failed to load market data for {}: {}", metal, e)
 			continue
 
 		logger.info("Forecasting %s prices...", metal)
@@ -0,0 +1,304 @@
+"""Feature store for the LSTM input frame.
+
+The model input (candles, derived price features and the daily news
+sentiment stored at ingestion) is persisted in the `features` table, one row per instrument and day. New
+candles are appended using only the trailing `FEATURE_LOOKBACK` stored rows,
+and the forecast step reads the last `timesteps` rows instead of rebuilding
+the frame from the raw tables:
+
+	python -m predict_model.features
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from sqlalchemy import desc, func, select
+
+from db.core import insert_data, table_to_df
+from db.engine import get_engine
+from db.instruments import get_instruments
+from db.models import SERIES_SOURCES, daily_sentiment_table, features_table
+
+
+PRICE_COLUMNS = ["open", "high", "low", "close", "volume"]
+FEATURE_COLUMNS = [
+	*PRICE_COLUMNS,
+	"sentiment",
+	"hl_range",
+	"oc_change",
+	"close_return",
+	"close_return_3",
+	"close_return_5",
+	"ma_close_5",
+	"ma_close_10",
+	"ma_close_20",
+	"volatility_5",
+	"volatility_10",
+	"price_momentum_5",
+	"price_momentum_10",
+	"sentiment_ma_3",
+	"sentiment_ma_7",
+]
+FILL_COLUMNS = [
+	"ma_close_5",
+	"ma_close_10",
+	"ma_close_20",
+	"volatility_5",
+	"volatility_10",
+	"sentiment_ma_3",
+	"sentiment_ma_7",
+]
+# the longest trailing window a feature needs (ma_close_20)
+FEATURE_LOOKBACK = 20
+# LSTM metal names of the registry (instruments.json): the legacy table prefix
+METALS = [instrument.legacy for instrument in get_instruments()]
+
+
+def instrument_for(metal: str) -> str:
+	"""Instrument key of the unified tables for an LSTM metal name ('sliver' -> 'silver')."""
+	return SERIES_SOURCES[f"{metal}_cost"][1]
+
+
+def _normalize_dates(series: pd.Series) -> pd.Series:
+	return pd.to_datetime(series).dt.floor("D")
+
+
+def _pct_change(series: pd.Series, periods: int = 1) -> pd.Series:
+	return series.pct_change(periods).replace([np.inf, -np.inf], 0).fillna(0)
+
+
+def _compute_price_features(df: pd.DataFrame) -> pd.DataFrame:
+	df = df.copy()
+	returns = df["close"].pct_change()
+	df["hl_range"] = df["high"] - df["low"]
+	df["oc_change"] = df["close"] - df["open"]
+	df["close_return"] = returns.replace([np.inf, -np.inf], 0).fillna(0)
+	df["close_return_3"] = _pct_change(df["close"], 3)
+	df["close_return_5"] = _pct_change(df["close"], 5)
+	df["ma_close_5"] = df["close"].rolling(5).mean()
+	df["ma_close_10"] = df["close"].rolling(10).mean()
+	df["ma_close_20"] = df["close"].rolling(20).mean()
+	df["volatility_5"] = returns.rolling(5).std()
+	df["volatility_10"] = returns.rolling(10).std()
+	# the bundles were trained with momentum columns equal to the 5/10-day returns
+	df["price_momentum_5"] = df["close_return_5"]
+	df["price_momentum_10"] = _pct_change(df["close"], 10)
+	return df
+
+
+def _add_sentiment_features(df: pd.DataFrame) -> pd.DataFrame:
+	df["sentiment"] = df["sentiment"].fillna(0).astype(int)
+	df["sentiment_ma_3"] = df["sentiment"].rolling(3).mean()
+	df["sentiment_ma_7"] = df["sentiment"].rolling(7).mean()
+	df[FILL_COLUMNS] = df[FILL_COLUMNS].bfill().ffill().fillna(0)
+	return df
+
+
+def build_feature_frame(df_cost: pd.DataFrame, daily_sentiment: pd.DataFrame) -> pd.DataFrame:
+	"""Full feature frame from daily candles and daily sentiment (both with a `date` column)."""
+	df = _compute_price_features(df_cost.sort_values("date"))
+	df = pd.merge(df, daily_sentiment[["date", "sentiment"]], on="date", how="left")
+	return _add_sentiment_features(df)
+
+
+def extend_feature_frame(history: pd.DataFrame, new_rows: pd.DataFrame) -> pd.DataFrame:
+	"""Features for `new_rows` computed from the trailing `FEATURE_LOOKBACK` rows of `history`.
+
+	`history` holds stored rows older than every date in `new_rows`; only its
+	candle and sentiment columns are used. `new_rows` needs a `date`, candle
+	columns and `sentiment`.
+	"""
+	context = history[["date", *PRICE_COLUMNS, "sentiment"]].tail(FEATURE_LOOKBACK)
+	frame = pd.concat(
+		[context, new_rows[["date", *PRICE_COLUMNS, "sentiment"]]],
+		ignore_index=True,
+	)
+	frame = _add_sentiment_features(_compute_price_features(frame))
+	return frame.iloc[len(context):].reset_index(drop=True)
+
+
+def _load_candles(metal: str, start_date=None) -> pd.DataFrame:
+	df_cost = table_to_df(f"{metal}_cost", columns=["date", *PRICE_COLUMNS], start_date=start_date)
+	if df_cost.empty:
+		return df_cost
+	df_cost["date"] = _normalize_dates(df_cost["date"])
+	df_cost = df_cost.sort_values("date").groupby("date", as_index=False).agg(
+		{"open": "mean", "high": "mean", "low": "mean", "close": "mean", "volume": "mean"}
+	)
+	df_cost["volume"] = df_cost["volume"].fillna(0)
+	return df_cost
+
+
+def _daily_sentiment(metal: str, start_date=None) -> pd.DataFrame:
+	"""Daily news sentiment of `metal`, pre-aggregated at ingestion (predict_model/sentiment.py)."""
+	stmt = select(daily_sentiment_table.c.date, daily_sentiment_table.c.sentiment).where(
+		daily_sentiment_table.c.instrument == instrument_for(metal)
+	)
+	if start_date is not None:
+		stmt = stmt.where(daily_sentiment_table.c.date >= start_date)
+	with get_engine().connect() as connection:
+		records = connection.execute(stmt.order_by(daily_sentiment_table.c.date)).all()
+	if not records:
+		return pd.DataFrame({"date": pd.Series(dtype="datetime64[ns]"), "sentiment": pd.Series(dtype=int)})
+
+	daily_sentiment = pd.DataFrame(records, columns=["date", "sentiment"])
+	daily_sentiment["date"] = _normalize_dates(daily_sentiment["date"])
+	return daily_sentiment
+
+
+def load_market_data(metal: str, history_years: int = 2) -> pd.DataFrame:
+	"""Load candles and news for `metal` from DB and build the model input frame.
+
+	metal is the legacy prefix of a registry instrument ('gold', 'sliver', 'copper', ...).
+	"""
+
+	df_cost = _load_candles(metal)
+	if df_cost.empty:
+		raise ValueError(f"{metal}_cost table is empty")
+
+	if history_years is not None:
+		max_cost_date = pd.to_datetime(df_cost["date"].max())
+		cutoff_date = (max_cost_date - pd.DateOffset(years=history_years)).normalize()
+		df_cost = df_cost[df_cost["date"] >= cutoff_date].copy()
+
+	# only the news from the first candle kept above
+	daily_sentiment = _daily_sentiment(
+		metal,
+		start_date=pd.Timestamp(df_cost["date"].min()).to_pydatetime() if history_years is not None else None,
+	)
+	df = build_feature_frame(df_cost, daily_sentiment)
+	return df.sort_values("date").set_index("date")
+
+
+def _stored_tail(instrument: str, rows: int, before=None) -> pd.DataFrame:
+	stmt = (
+		select(features_table)
+		.where(features_table.c.instrument == instrument)
+		.order_by(desc(features_table.c.date))
+		.limit(rows)
+	)
+	if before is not None:
+		stmt = stmt.where(features_table.c.date < before)
+	with get_engine().connect() as connection:
+		records = connection.execute(stmt).mappings().all()
+	if not records:
+		return pd.DataFrame(columns=["instrument", "date", *FEATURE_COLUMNS])
+	df = pd.DataFrame(records).sort_values("date").reset_index(drop=True)
+	df["date"] = pd.to_datetime(df["date"])
+	return df
+
+
+def _records(frame: pd.DataFrame) -> list[dict]:
+	records = []
+	for row in frame[["date", *FEATURE_COLUMNS]].itertuples(index=False):
+		record = {"date": pd.Timestamp(row[0]).to_pydatetime()}
+		record.update({name: float(value) for name, value in zip(FEATURE_COLUMNS, row[1:])})
+		records.append(record)
+	return records
+
+
+def first_stored_date(instrument: str):
+	"""Date of the oldest stored feature row of `instrument` (None for an empty store)."""
+	stmt = select(func.min(features_table.c.date)).where(features_table.c.instrument == instrument)
+	with get_engine().connect() as connection:
+		return connection.execute(stmt).scalar()
+
+
+def recompute_start(last_date, since=None, first_date=None):
+	"""Day from which stored feature rows are recomputed.
+
+	Normally the last stored day (its candle may still have been open). When
+	older raw data changed since the store was written (a backfilled gap in
+	the candles, rescored news), every row from the day of `since` on is
+	recomputed, but not earlier than the first stored row.
+	"""
+	start = pd.Timestamp(last_date)
+	if since is None:
+		return start
+	since = pd.Timestamp(since)
+	if since.tzinfo is not None:
+		since = since.tz_convert("UTC").tz_localize(None)
+	since = since.floor("D")
+	if first_date is not None:
+		since = max(since, pd.Timestamp(first_date))
+	return min(start, since)
+
+
+def first_drifted_date(stored: pd.DataFrame, candles: pd.DataFrame):
+	"""Earliest stored day whose candle no longer matches `candles` (None if all match).
+
+	The intraday service rewrites the daily candle of the current day in
+	`candles` after its feature row may already have been stored.
+	"""
+	if stored.empty or candles.empty:
+		return None
+	merged = pd.merge(
+		stored[["date", *PRICE_COLUMNS]], candles[["date", *PRICE_COLUMNS]], on="date", suffixes=("", "_raw")
+	)
+	drifted = np.zeros(len(merged), dtype=bool)
+	for column in PRICE_COLUMNS:
+		stored_values = merged[column].to_numpy(dtype=float)
+		raw_values = merged[f"{column}_raw"].to_numpy(dtype=float)
+		drifted |= ~np.isclose(stored_values, raw_values, equal_nan=True)
+	if not drifted.any():
+		return None
+	return pd.Timestamp(merged.loc[drifted, "date"].min())
+
+
+def update_feature_store(metal: str, history_years: int = 2, since=None) -> int:
+	"""Append feature rows for candles newer than the stored ones; returns rows written.
+
+	An empty store is built once from `history_years` of raw data. After that
+	the last stored day is recomputed together with the new ones, because its
+	candle may still have been open when it was stored. `since` is the
+	earliest date whose candles or sentiment changed (see `recompute_start`);
+	rows from that day on are recomputed from the `FEATURE_LOOKBACK` stored
+	rows before it. Stored rows of the trailing window whose candle was
+	rewritten since (see `first_drifted_date`) are recomputed as well.
+	"""
+	instrument = instrument_for(metal)
+	stored = _stored_tail(instrument, FEATURE_LOOKBACK + 1)
+
+	if stored.empty:
+		frame = load_market_data(metal, history_years).reset_index()
+	else:
+		last_date = stored["date"].iloc[-1]
+		start = recompute_start(last_date, since, first_stored_date(instrument) if since is not None else None)
+		candles = _load_candles(metal, start_date=min(start, stored["date"].iloc[0]).to_pydatetime())
+		drifted = first_drifted_date(stored, candles)
+		if drifted is not None:
+			start = min(start, drifted)
+		if start < last_date:
+			history = _stored_tail(instrument, FEATURE_LOOKBACK, before=start.to_pydatetime())
+		else:
+			history = stored.iloc[:-1]
+		if not candles.empty:
+			candles = candles[candles["date"] >= start]
+		if candles.empty:
+			return 0
+		start = start.to_pydatetime()
+		sentiment = _daily_sentiment(metal, start_date=start)
+		new_rows = pd.merge(candles, sentiment, on="date", how="left")
+		frame = extend_feature_frame(history, new_rows)
+
+	records = [{"instrument": instrument, **record} for record in _records(frame)]
+	written = insert_data(records, features_table)
+	logger.info("Feature store for {}: {} rows written.", metal, written)
+	return written
+
+
+def load_feature_window(metal: str, rows: int) -> pd.DataFrame:
+	"""The last `rows` feature rows of `metal`, indexed by date in ascending order."""
+	df = _stored_tail(instrument_for(metal), rows)
+	return df.drop(columns=["instrument"]).set_index("date")
+
+
+def main() -> None:
+	for metal in METALS:
+		update_feature_store(metal)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,232 @@
+"""News sentiment scored once, when an article is stored.
+
+Every article gets the SVM label (-1/0/1), the decision margin of that label
+and the version of the model that produced it. Daily sums per instrument are
+kept in the `daily_sentiment` table, which is all the feature store reads.
+Articles stored before this step, or scored by an older model, are scored by
+the backfill command, which also rewrites the feature rows of rescored days:
+
+	python -m predict_model.sentiment backfill [--batch-size 500] [--all]
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import joblib
+import numpy as np
+from loguru import logger
+from sqlalchemy import and_, bindparam, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from db.engine import get_engine
+from db.instruments import get_instrument
+from db.models import INSTRUMENTS, daily_sentiment_table, news_archive_table, news_table
+from db.retention import decompress_body
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+SVM_PATH = PROJECT_ROOT / "predict_model" / "models" / "svm_sentiment_pipeline.pkl"
+
+SENTIMENT_MAP = {0: -1, 1: 0, 2: 1}
+# texts are vectorized in batches of this size to bound the TF-IDF matrix
+SCORE_BATCH_SIZE = 256
+
+
+@lru_cache(maxsize=1)
+def _svm_pipeline():
+	return joblib.load(SVM_PATH)
+
+
+@lru_cache(maxsize=1)
+def model_version() -> str:
+	"""Short content hash of the SVM artifact; changes whenever the model is retrained."""
+	digest = hashlib.sha256()
+	with open(SVM_PATH, "rb") as artifact:
+		for block in iter(lambda: artifact.read(1 << 20), b""):
+			digest.update(block)
+	return digest.hexdigest()[:16]
+
+
+def score_texts(texts: list[str], batch_size: int = SCORE_BATCH_SIZE, pipeline=None) -> tuple[list[int], list[float]]:
+	"""Sentiment labels (-1/0/1) and the decision margin of each label."""
+	pipeline = pipeline if pipeline is not None else _svm_pipeline()
+	labels: list[int] = []
+	scores: list[float] = []
+	for start in range(0, len(texts), batch_size):
+		margins = np.asarray(pipeline.decision_function([str(text) for text in texts[start:start + batch_size]]))
+		best = margins.argmax(axis=1)
+		labels.extend(SENTIMENT_MAP[int(label)] for label in pipeline.classes_[best])
+		scores.extend(float(score) for score in margins[np.arange(len(best)), best])
+	return labels, scores
+
+
+def score_news(rows: list[dict], pipeline=None, version: str | None = None) -> list[dict]:
+	"""Copies of `rows` with sentiment fields; rows without `full_text` stay unscored."""
+	texts = [row["full_text"] for row in rows if row.get("full_text")]
+	labels, scores = score_texts(texts, pipeline=pipeline) if texts else ([], [])
+	version = version or model_version()
+	results = iter(zip(labels, scores))
+	scored = []
+	for row in rows:
+		label, score, model = None, None, None
+		if row.get("full_text"):
+			label, score = next(results)
+			model = version
+		scored.append({**row, "sentiment": label, "sentiment_score": score, "sentiment_model": model})
+	return scored
+
+
+def daily_sentiment_stmt(instrument: str, start_date: datetime | None = None):
+	"""Upsert of daily sums (clipped to [-1, 1]) of scored articles from `start_date`'s day on."""
+	day = func.date_trunc("day", news_table.c.date)
+	conditions = [
+		news_table.c.instrument == instrument,
+		news_table.c.sentiment.is_not(None),
+		news_table.c.date.is_not(None),
+	]
+	if start_date is not None:
+		conditions.append(news_table.c.date >= start_date.replace(hour=0, minute=0, second=0, microsecond=0))
+	source = (
+		select(
+			news_table.c.instrument,
+			day,
+			func.greatest(-1, func.least(1, func.sum(news_table.c.sentiment))),
+			func.count(),
+		)
+		.where(and_(*conditions))
+		.group_by(news_table.c.instrument, day)
+	)
+	stmt = pg_insert(daily_sentiment_table).from_select(["instrument", "date", "sentiment", "articles"], source)
+	return stmt.on_conflict_do_update(
+		index_elements=["instrument", "date"],
+		set_={"sentiment": stmt.excluded.sentiment, "articles": stmt.excluded.articles},
+	)
+
+
+def refresh_daily_sentiment(instrument: str, start_date: datetime | None = None) -> int:
+	"""Recompute the stored daily sentiment of `instrument`; returns the number of days written."""
+	with get_engine().begin() as connection:
+		# rowcount of INSERT ... SELECT is not kept by SQLAlchemy 2.1, count the returned days instead
+		stmt = daily_sentiment_stmt(instrument, start_date).returning(daily_sentiment_table.c.date)
+		written = len(connection.execute(stmt).all())
+	logger.info("Daily sentiment for {}: {} days refreshed.", instrument, written)
+	return written
+
+
+def refresh_features(instrument: str, start_date: datetime | None = None) -> int:
+	"""Recompute the stored LSTM feature rows of `instrument` from `start_date`'s day on.
+
+	The feature store copies the daily sentiment, so rows of rescored days
+	are rewritten; without `start_date` the whole store is recomputed.
+	Returns the number of rows written.
+	"""
+	# imported here: the feature store pulls in pandas and the DB loaders
+	from predict_model.features import first_stored_date, update_feature_store
+
+	if start_date is None:
+		start_date = first_stored_date(instrument)
+		if start_date is None:
+			return 0
+	try:
+		return update_feature_store(get_instrument(instrument).legacy, since=start_date)
+	except ValueError as error:
+		logger.warning("Features of {} were not recomputed: {}", instrument, error)
+		return 0
+
+
+def _stored_text(row) -> str:
+	"""Article text from `news`, or from its compressed `news_archive` copy once archived."""
+	if row["full_text"] is not None:
+		return row["full_text"]
+	return decompress_body(row["codec"], row["body"], row["raw_size"])
+
+
+def backfill(batch_size: int = 500, rescore_all: bool = False) -> int:
+	"""Score stored articles that are unscored or scored by another model version.
+
+	Archived articles are scored from the `news_archive` copy of their text,
+	so every stored day carries labels of one model version. Articles are
+	walked by id in batches; the daily aggregates and the stored
+	feature rows of every touched instrument are recomputed from its oldest
+	rescored day. Returns the number of articles scored.
+	"""
+	version = model_version()
+	archive = news_archive_table
+	conditions = [or_(news_table.c.full_text.is_not(None), archive.c.body.is_not(None))]
+	if not rescore_all:
+		conditions.append(news_table.c.sentiment_model.is_distinct_from(version))
+
+	stmt = (
+		update(news_table)
+		.where(news_table.c.id == bindparam("b_id"))
+		.values(
+			sentiment=bindparam("b_sentiment"),
+			sentiment_score=bindparam("b_score"),
+			sentiment_model=bindparam("b_model"),
+		)
+	)
+	touched: dict[str, datetime] = {}
+	scored = 0
+	last_id = 0
+	engine = get_engine()
+	while True:
+		query = (
+			select(
+				news_table.c.id, news_table.c.instrument, news_table.c.date, news_table.c.full_text,
+				archive.c.codec, archive.c.raw_size, archive.c.body,
+			)
+			.select_from(news_table.outerjoin(archive, archive.c.news_id == news_table.c.id))
+			.where(and_(news_table.c.id > last_id, *conditions))
+			.order_by(news_table.c.id)
+			.limit(batch_size)
+		)
+		with engine.connect() as connection:
+			rows = connection.execute(query).mappings().all()
+		if not rows:
+			break
+
+		labels, scores = score_texts([_stored_text(row) for row in rows])
+		params = [
+			{"b_id": row["id"], "b_sentiment": label, "b_score": score, "b_model": version}
+			for row, label, score in zip(rows, labels, scores)
+		]
+		with engine.begin() as connection:
+			connection.execute(stmt, params)
+
+		for row in rows:
+			if row["date"] is not None and row["date"] < touched.get(row["instrument"], datetime.max):
+				touched[row["instrument"]] = row["date"]
+		scored += len(rows)
+		last_id = rows[-1]["id"]
+		logger.info("Sentiment backfill: {} articles scored.", scored)
+
+	for instrument, oldest in touched.items():
+		refresh_daily_sentiment(instrument, oldest)
+		refresh_features(instrument, oldest)
+	return scored
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="News sentiment scoring")
+	commands = parser.add_subparsers(dest="command", required=True)
+	backfill_parser = commands.add_parser("backfill", help="score stored articles and rebuild daily sentiment")
+	backfill_parser.add_argument("--batch-size", type=int, default=500)
+	backfill_parser.add_argument("--all", action="store_true", help="rescore articles of the current model too")
+	commands.add_parser("refresh", help="rebuild daily sentiment and the stored features from the stored labels")
+	args = parser.parse_args()
+
+	if args.command == "backfill":
+		backfill(args.batch_size, args.all)
+	else:
+		for instrument in INSTRUMENTS:
+			refresh_daily_sentiment(instrument)
+			refresh_features(instrument)
+
+
+if __name__ == "__main__":
+	main()
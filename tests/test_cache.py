@@ -0,0 +1,100 @@
+import asyncio
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.cache import DataVersions, TTLCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expires_entries_and_counts_hits():
+    clock = _Clock()
+    cache = TTLCache(maxsize=4, ttl=10, clock=clock)
+
+    assert cache.get_or_set("gold", lambda: 1) == 1
+    assert cache.get_or_set("gold", lambda: 2) == 1
+
+    clock.now = 11
+    assert cache.get_or_set("gold", lambda: 3) == 3
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_ttl_cache_is_size_bounded_and_invalidates():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("gold", 1)
+    cache.set("silver", 2)
+    cache.get("gold")
+    cache.set("cupp", 3)
+
+    assert cache.get("silver") is None
+    assert cache.get("gold") == 1
+    assert cache.stats()["evictions"] == 1
+
+    cache.invalidate("gold")
+    assert cache.get("gold") is None
+    cache.clear()
+    assert cache.stats()["size"] == 0
+
+
+def test_data_versions_are_reread_after_ttl_or_invalidate():
+    clock = _Clock()
+    stored = {"gold": "1.a"}
+    loads = []
+
+    async def _load():
+        loads.append(1)
+        return dict(stored)
+
+    versions = DataVersions(_load, ttl=2, clock=clock)
+    assert asyncio.run(versions.get("gold")) == "1.a"
+    assert asyncio.run(versions.get("silver")) == "0"
+
+    stored["gold"] = "2.b"
+    assert asyncio.run(versions.get("gold")) == "1.a"
+    clock.now = 2
+    assert asyncio.run(versions.get("gold")) == "2.b"
+
+    stored["gold"] = "3.c"
+    versions.invalidate()
+    assert asyncio.run(versions.get("gold")) == "3.c"
+    assert len(loads) == 3
+
+
+def test_data_versions_share_one_read_between_concurrent_requests():
+    stored = {"gold": "1.a"}
+    loads = []
+
+    async def _load():
+        loads.append(dict(stored))
+        await asyncio.sleep(0)
+        return dict(stored)
+
+    versions = DataVersions(_load, ttl=2, clock=_Clock())
+
+    async def _requests():
+        return await asyncio.gather(*(versions.get("gold") for _ in range(20)))
+
+    assert asyncio.run(_requests()) == ["1.a"] * 20
+    assert len(loads) == 1
+
+    # a read started before this worker's write is not kept after invalidate()
+    async def _write_during_read():
+        pending = asyncio.ensure_future(versions.get("gold"))
+        await asyncio.sleep(0)
+        stored["gold"] = "2.b"
+        versions.invalidate()
+        return await pending, await versions.get("gold")
+
+    versions.invalidate()
+    assert asyncio.run(_write_during_read()) == ("1.a", "2.b")
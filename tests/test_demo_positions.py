@@ -0,0 +1,146 @@
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import app.main as app_main
+import app.routes.general as general
+from db.create_db import replay_trades
+
+
+class _Result:
+    def __init__(self, value):
+        self._value = value
+
+    def scalar_one_or_none(self):
+        return self._value
+
+
+class _Connection:
+    """Records compiled statements; each UPDATE answers the next value from `returning`"""
+
+    def __init__(self, returning):
+        self.statements = []
+        self._returning = list(returning)
+
+    async def execute(self, stmt):
+        compiled = stmt.compile(dialect=postgresql.dialect())
+        sql = " ".join(str(compiled).split())
+        self.statements.append((sql, compiled.params))
+        return _Result(self._returning.pop(0) if sql.startswith("UPDATE") and self._returning else None)
+
+
+class _Engine:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def begin(self):
+        engine = self
+
+        class _Begin:
+            async def __aenter__(self):
+                return engine.connection
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Begin()
+
+
+def _client(monkeypatch, returning=(), price=100.0):
+    connection = _Connection(returning)
+
+    async def _user(request=None):
+        return {"id": 7, "username": "demo", "start_capital": 1000.0, "current_capital": 1000.0}
+
+    async def _price(table, cached=True):
+        assert not cached
+        return price
+
+    monkeypatch.setattr(general, "get_async_engine", lambda: _Engine(connection))
+    monkeypatch.setattr(general, "_get_current_user", _user)
+    monkeypatch.setattr(general, "fetch_latest_close_price", _price)
+    return TestClient(app_main.app), connection
+
+
+def _trade(client, side, quantity):
+    return client.post("/trade/gold/execute", data={"side": side, "quantity": quantity}, follow_redirects=False)
+
+
+def test_buy_debits_rounded_capital_and_upserts_weighted_average(monkeypatch):
+    client, connection = _client(monkeypatch, returning=[899.67], price=33.4433)
+    assert _trade(client, "buy", "3").status_code == 303
+
+    (capital, capital_params), (position, params), (trade, _) = connection.statements
+    assert capital.startswith("UPDATE users SET current_capital=round(CAST(users.current_capital - ")
+    assert "users.current_capital >= " in capital and capital.endswith("RETURNING users.current_capital")
+    assert 100.33 in capital_params.values()
+
+    assert "ON CONFLICT (user_id, metal_key) DO UPDATE SET" in position
+    assert "quantity = (demo_positions.quantity + excluded.quantity)" in position
+    assert ("avg_price = ((demo_positions.quantity * demo_positions.avg_price"
+            " + excluded.quantity * excluded.avg_price)"
+            " / CAST((demo_positions.quantity + excluded.quantity) AS FLOAT)") in position
+    assert (params["quantity"], params["avg_price"]) == (3.0, 33.4433)
+    assert trade.startswith("INSERT INTO demo_trades")
+
+
+def test_buy_without_funds_writes_nothing_else(monkeypatch):
+    client, connection = _client(monkeypatch, returning=[None])
+    _trade(client, "buy", "50")
+    assert len(connection.statements) == 1
+
+
+def test_sell_decrements_and_deletes_empty_position(monkeypatch):
+    client, connection = _client(monkeypatch, returning=[1.0])
+    _trade(client, "sell", "2")
+    decrement, credit, trade = [sql for sql, _ in connection.statements]
+    assert decrement.startswith("UPDATE demo_positions SET quantity=(demo_positions.quantity - ")
+    assert "demo_positions.quantity >= " in decrement
+    assert credit.startswith("UPDATE users SET current_capital=round(CAST(users.current_capital + ")
+    assert trade.startswith("INSERT INTO demo_trades")
+
+    client, connection = _client(monkeypatch, returning=[0.0])
+    _trade(client, "sell", "3")
+    statements = [sql for sql, _ in connection.statements]
+    assert statements[1].startswith("DELETE FROM demo_positions WHERE demo_positions.user_id = ")
+    assert "demo_positions.metal_key = " in statements[1]
+
+
+def test_sell_more_than_held_is_rejected(monkeypatch):
+    client, connection = _client(monkeypatch, returning=[None])
+    _trade(client, "sell", "5")
+    assert len(connection.statements) == 1
+
+
+def test_reset_clears_trades_and_positions(monkeypatch):
+    client, connection = _client(monkeypatch)
+    assert client.post("/trade/account/reset", follow_redirects=False).status_code == 303
+    (trades, _), (positions, _), (capital, params) = connection.statements
+    assert trades.startswith("DELETE FROM demo_trades WHERE demo_trades.user_id = ")
+    assert positions.startswith("DELETE FROM demo_positions WHERE demo_positions.user_id = ")
+    # the start capital is read in SQL, not from the worker's cached user
+    assert capital.startswith("UPDATE users SET current_capital=users.start_capital WHERE users.id = ")
+    assert 1000.0 not in params.values()
+
+
+def test_rebuild_replays_trade_history():
+    trades = [
+        {"user_id": 1, "metal_key": "gold", "side": "buy", "quantity": 2, "price": 100.0},
+        {"user_id": 1, "metal_key": "gold", "side": "buy", "quantity": 2, "price": 200.0},
+        {"user_id": 1, "metal_key": "gold", "side": "sell", "quantity": 1, "price": 300.0},
+        {"user_id": 1, "metal_key": "cupp", "side": "buy", "quantity": 0.1, "price": 10.0},
+        {"user_id": 1, "metal_key": "cupp", "side": "buy", "quantity": 0.2, "price": 10.0},
+        {"user_id": 1, "metal_key": "cupp", "side": "sell", "quantity": 0.3, "price": 12.0},
+        {"user_id": 2, "metal_key": "gold", "side": "buy", "quantity": 1, "price": 50.0},
+    ]
+    positions = {(row["user_id"], row["metal_key"]): row for row in replay_trades(trades)}
+    # selling keeps the average price; a position sold to zero (up to float noise) is dropped
+    assert positions[(1, "gold")]["quantity"] == 3.0
+    assert positions[(1, "gold")]["avg_price"] == 150.0
+    assert (1, "cupp") not in positions
+    assert positions[(2, "gold")]["avg_price"] == 50.0
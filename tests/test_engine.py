@@ -0,0 +1,81 @@
+import asyncio
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from db import engine as db_engine
+
+
+def test_engines_are_created_lazily_from_env(monkeypatch):
+    monkeypatch.setattr(db_engine, "_engines", {})
+    monkeypatch.setattr(db_engine, "_settings", {})
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "2")
+    monkeypatch.setenv("DB_POOL_RECYCLE", "60")
+    monkeypatch.setenv("DB_STATEMENT_TIMEOUT_MS", "5000")
+
+    import db.core  # noqa: F401 — импорт модуля не должен создавать engine
+    assert db_engine.pool_stats() == {}
+
+    engine = db_engine.get_engine()
+    assert db_engine.get_engine() is engine
+    assert engine.pool.size() == 3
+    assert engine.pool._recycle == 60
+    assert engine.pool._pre_ping is True
+
+    async_engine = db_engine.get_async_engine()
+    stats = db_engine.pool_stats()
+    assert set(stats) == {"sync", "async"}
+    assert stats["sync"]["max_overflow"] == 2
+    assert stats["sync"]["saturation"] == 0.0
+
+    asyncio.run(db_engine.dispose_engines())
+    assert db_engine.pool_stats() == {}
+    assert async_engine.pool is not None
+
+
+def test_pool_metrics_snapshot():
+    metrics = db_engine.PoolMetrics()
+    metrics.observe(0.002)
+    metrics.observe(0.004)
+    metrics.observe(1.0, timed_out=True)
+    snapshot = metrics.snapshot()
+    assert snapshot["checkouts"] == 2 and snapshot["timeouts"] == 1
+    assert snapshot["checkout_wait_avg_ms"] == 3.0
+    assert snapshot["checkout_wait_max_ms"] == 4.0
+
+
+def test_timed_pool_counts_checkouts(tmp_path):
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.pool import QueuePool
+
+    metrics = db_engine.PoolMetrics()
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=db_engine._timed_pool_class(QueuePool, metrics),
+    )
+    for _ in range(3):
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    assert metrics.snapshot()["checkouts"] == 3
+    engine.dispose()
+
+
+def test_async_readers_share_the_pool_without_transactions(monkeypatch):
+    monkeypatch.setattr(db_engine, "_engines", {})
+    monkeypatch.setattr(db_engine, "_settings", {})
+    monkeypatch.setattr(db_engine, "_views", {})
+
+    reader = db_engine.get_async_reader()
+    writer = db_engine.get_async_engine()
+    assert reader.pool is writer.pool
+    assert reader.sync_engine.dialect._on_connect_isolation_level == "AUTOCOMMIT"
+    assert "isolation_level" not in reader.sync_engine.get_execution_options()
+    assert writer.sync_engine.get_execution_options()["isolation_level"] == "READ COMMITTED"
+    assert set(db_engine.pool_stats()) == {"async"}
+
+    asyncio.run(db_engine.dispose_engines())
+    assert db_engine.get_async_reader() is not reader
+    asyncio.run(db_engine.dispose_engines())
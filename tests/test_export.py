@@ -0,0 +1,91 @@
+import base64
+import csv
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pyarrow.parquet as pq
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, create_engine
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from db import core
+from db.models import news_archive_table
+from db.retention import compress_body, decompress_body
+
+
+def _sample_engine():
+    engine = create_engine("sqlite://")
+    prices = Table(
+        "prices",
+        MetaData(),
+        Column("date", DateTime, primary_key=True),
+        Column("close", Float),
+        Column("volume", Integer),
+        Column("note", String),
+    )
+    prices.create(engine)
+    with engine.begin() as connection:
+        connection.execute(prices.insert(), [
+            {"date": datetime(2024, 1, day), "close": 100.0 + day, "volume": None if day == 3 else day, "note": "n"}
+            for day in range(1, 8)
+        ])
+    return engine
+
+
+def test_table_to_df_projection_in_chunks(monkeypatch):
+    engine = _sample_engine()
+    monkeypatch.setattr(core, "get_engine", lambda: engine)
+
+    df = core.table_to_df("prices", columns=["date", "close"], start_date=datetime(2024, 1, 3), chunk_size=2)
+    assert list(df.columns) == ["date", "close"]
+    assert df["close"].tolist() == [103.0, 104.0, 105.0, 106.0, 107.0]
+
+    empty = core.table_to_df("prices", columns=["close"], start_date=datetime(2025, 1, 1))
+    assert empty.empty and list(empty.columns) == ["close"]
+
+
+def test_export_table_csv_and_parquet(monkeypatch, tmp_path):
+    engine = _sample_engine()
+    monkeypatch.setattr(core, "get_engine", lambda: engine)
+
+    csv_path = tmp_path / "prices.csv"
+    assert core.export_table("prices", str(csv_path), "csv", chunk_size=3) == 7
+    lines = csv_path.read_text(encoding="utf-8").splitlines()
+    assert lines[0] == "date,close,volume,note" and len(lines) == 8
+
+    parquet_path = tmp_path / "prices.parquet"
+    exported = core.export_table(
+        "prices", str(parquet_path), "parquet",
+        columns=["date", "volume"], end_date=datetime(2024, 1, 4), chunk_size=3,
+    )
+    assert exported == 4
+    table = pq.read_table(parquet_path)
+    assert table.column_names == ["date", "volume"]
+    assert table.column("volume").to_pylist() == [1, 2, None, 4]
+    assert pq.ParquetFile(parquet_path).metadata.num_row_groups == 2
+
+
+def test_export_archived_bodies_as_binary(monkeypatch, tmp_path):
+    engine = create_engine("sqlite://")
+    news_archive_table.create(engine)
+    body, raw_size = compress_body("Золото дорожает " * 50)
+    archived_at = datetime(2024, 1, 2, 3, 4, 5)
+    with engine.begin() as connection:
+        connection.execute(news_archive_table.insert(), [
+            {"news_id": 1, "codec": "zstd", "raw_size": raw_size, "body": body, "archived_at": archived_at},
+            {"news_id": 2, "codec": "zstd", "raw_size": 0, "body": b"", "archived_at": archived_at},
+        ])
+    monkeypatch.setattr(core, "get_engine", lambda: engine)
+
+    parquet_path = tmp_path / "news_archive.parquet"
+    assert core.export_table("news_archive", str(parquet_path), "parquet") == 2
+    bodies = pq.read_table(parquet_path).column("body").to_pylist()
+    assert bodies == [body, b""]
+
+    csv_path = tmp_path / "news_archive.csv"
+    core.export_table("news_archive", str(csv_path), "csv")
+    with open(csv_path, newline="", encoding="utf-8") as file:
+        row = next(csv.DictReader(file))
+    assert decompress_body(row["codec"], base64.b64decode(row["body"]), int(row["raw_size"])) == "Золото дорожает " * 50
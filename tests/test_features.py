@@ -0,0 +1,124 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from predict_model import features
+from predict_model.features import (
+    FEATURE_COLUMNS,
+    FEATURE_LOOKBACK,
+    build_feature_frame,
+    extend_feature_frame,
+    first_drifted_date,
+    instrument_for,
+    recompute_start,
+)
+
+
+def _raw(days: int = 150):
+    rng = np.random.default_rng(7)
+    dates = pd.bdate_range("2024-01-01", periods=days)
+    close = 2000 + np.cumsum(rng.normal(0, 5, days))
+    cost = pd.DataFrame({
+        "date": dates,
+        "open": close + rng.normal(0, 1, days),
+        "high": close + 3,
+        "low": close - 3,
+        "close": close,
+        "volume": rng.integers(100, 1000, days).astype(float),
+    })
+    sentiment = pd.DataFrame({"date": dates[::3], "sentiment": rng.integers(-1, 2, len(dates[::3]))})
+    return cost, sentiment
+
+
+def test_incremental_rows_match_full_rebuild():
+    cost, sentiment = _raw()
+    full = build_feature_frame(cost, sentiment)
+    assert (full["price_momentum_5"] == full["close_return_5"]).all()
+
+    split = 100
+    new_rows = pd.merge(cost.iloc[split:], sentiment, on="date", how="left")
+    # В хранилище лежат только последние строки — больше для новых признаков не нужно
+    stored = full.iloc[split - FEATURE_LOOKBACK:split]
+    extended = extend_feature_frame(stored, new_rows)
+
+    assert list(extended["date"]) == list(full["date"].iloc[split:])
+    np.testing.assert_allclose(
+        extended[FEATURE_COLUMNS].to_numpy(dtype=float),
+        full[FEATURE_COLUMNS].iloc[split:].to_numpy(dtype=float),
+    )
+
+
+def test_metal_names_map_to_instruments():
+    assert instrument_for("sliver") == "silver"
+    assert instrument_for("copper") == "copper"
+
+
+def test_recompute_start_moves_back_to_changed_day():
+    last = pd.Timestamp("2024-05-10")
+    assert recompute_start(last) == last
+    assert recompute_start(last, "2024-05-20T07:00:00") == last
+    assert recompute_start(last, "2024-03-04T07:00:00") == pd.Timestamp("2024-03-04")
+    # nothing older than the first stored row is added
+    assert recompute_start(last, "2023-01-02T07:00:00", pd.Timestamp("2024-01-01")) == pd.Timestamp("2024-01-01")
+
+
+def test_backfilled_gap_is_recomputed_into_the_store(monkeypatch):
+    cost, sentiment = _raw()
+    full = build_feature_frame(cost, sentiment)
+    gap = cost["date"].iloc[60:65]
+    # the store was built while five days were missing from the candles
+    stored = build_feature_frame(cost[~cost["date"].isin(gap)], sentiment).assign(instrument="gold")
+    written = []
+
+    def _stored_tail(instrument, rows, before=None):
+        frame = stored if before is None else stored[stored["date"] < before]
+        return frame.tail(rows).reset_index(drop=True)
+
+    monkeypatch.setattr(features, "_stored_tail", _stored_tail)
+    monkeypatch.setattr(features, "first_stored_date", lambda instrument: stored["date"].iloc[0])
+    monkeypatch.setattr(features, "_load_candles", lambda metal, start_date=None: cost[cost["date"] >= start_date])
+    monkeypatch.setattr(features, "_daily_sentiment", lambda metal, start_date=None: sentiment[sentiment["date"] >= start_date])
+    monkeypatch.setattr(features, "insert_data", lambda records, table: written.extend(records) or len(records))
+
+    since = gap.iloc[0].to_pydatetime().replace(hour=7).isoformat()
+    assert features.update_feature_store("gold", since=since) == len(cost) - 60
+
+    rebuilt = pd.DataFrame(written)
+    assert list(rebuilt["date"]) == list(full["date"].iloc[60:])
+    np.testing.assert_allclose(
+        rebuilt[FEATURE_COLUMNS].to_numpy(dtype=float),
+        full[FEATURE_COLUMNS].iloc[60:].to_numpy(dtype=float),
+    )
+
+
+def test_rolled_up_close_is_recomputed_into_the_store(monkeypatch):
+    cost, sentiment = _raw()
+    stored = build_feature_frame(cost, sentiment).assign(instrument="gold")
+    # the intraday service rewrote the close of the last two stored days
+    rolled = cost.copy()
+    rolled.loc[rolled.index[-2:], "close"] += 7.5
+    full = build_feature_frame(rolled, sentiment)
+    written = []
+
+    def _stored_tail(instrument, rows, before=None):
+        frame = stored if before is None else stored[stored["date"] < before]
+        return frame.tail(rows).reset_index(drop=True)
+
+    monkeypatch.setattr(features, "_stored_tail", _stored_tail)
+    monkeypatch.setattr(features, "_load_candles", lambda metal, start_date=None: rolled[rolled["date"] >= start_date])
+    monkeypatch.setattr(features, "_daily_sentiment", lambda metal, start_date=None: sentiment[sentiment["date"] >= start_date])
+    monkeypatch.setattr(features, "insert_data", lambda records, table: written.extend(records) or len(records))
+
+    assert first_drifted_date(stored, cost) is None
+    assert first_drifted_date(stored, rolled) == cost["date"].iloc[-2]
+    assert features.update_feature_store("gold") == 2
+    rebuilt = pd.DataFrame(written)
+    np.testing.assert_allclose(
+        rebuilt[FEATURE_COLUMNS].to_numpy(dtype=float),
+        full[FEATURE_COLUMNS].iloc[-2:].to_numpy(dtype=float),
+    )
@@ -0,0 +1,78 @@
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+from sqlalchemy import create_engine
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from db import core
+from db.models import gold_cost_table
+from db.quotes import LatestQuotes
+from parser.get_cost import candles_to_columns, list_to_dict
+
+
+def _quotation(units, nano):
+    return SimpleNamespace(units=units, nano=nano)
+
+
+def _candle(day, price, volume=10):
+    return SimpleNamespace(
+        time=datetime(2024, 1, day, 7, tzinfo=timezone.utc),
+        open=price, high=price, low=price, close=price, volume=volume,
+    )
+
+
+def test_quotations_are_decoded_exactly():
+    candles = [
+        _candle(3, _quotation(5, 50_000_000)),
+        _candle(4, _quotation(2034, 120_000_000)),
+        _candle(5, _quotation(-1, -500_000_000)),
+        _candle(8, _quotation(7, 0)),
+    ]
+    columns = candles_to_columns(candles)
+
+    assert columns["close"].tolist() == [5.05, 2034.12, -1.5, 7.0]
+    assert columns["date"].dtype == np.dtype("datetime64[us]")
+    assert columns["date"][0] == np.datetime64("2024-01-03T07:00:00")
+    assert columns["volume"].dtype == np.int64
+
+    rows = list_to_dict(candles)
+    assert rows[0] == {
+        "date": datetime(2024, 1, 3, 7), "open": 5.05, "high": 5.05, "low": 5.05, "close": 5.05, "volume": 10,
+    }
+    assert candles_to_columns([])["close"].size == 0
+
+
+def test_insert_columns_copies_deduplicated_columns(monkeypatch):
+    captured = {}
+
+    def _copy_records(connection, records, table, columns, keys, on_conflict):
+        captured.update(records=list(records), table=table.name, columns=columns, keys=keys, mode=on_conflict)
+        return len(captured["records"])
+
+    monkeypatch.setattr(core, "get_engine", lambda: create_engine("sqlite://"))
+    monkeypatch.setattr(core, "_copy_records", _copy_records)
+    quotes = LatestQuotes()
+    monkeypatch.setattr(core, "latest_quotes", quotes)
+    bumped = []
+    monkeypatch.setattr(core, "bump_versions", lambda connection, instruments: bumped.extend(instruments) or {})
+    columns = candles_to_columns([
+        _candle(3, _quotation(1, 0)),
+        _candle(4, _quotation(2, 0)),
+        _candle(3, _quotation(3, 0)),
+    ])
+
+    assert core.insert_columns(columns, gold_cost_table, use_copy=True) == 2
+    assert captured["table"] == "candles" and captured["mode"] == "update"
+    assert captured["columns"] == ["instrument", "date", "open", "high", "low", "close", "volume"]
+    # the later duplicate of 01-03 wins, original order is kept
+    assert captured["records"] == [
+        ("gold", datetime(2024, 1, 4, 7), 2.0, 2.0, 2.0, 2.0, 10),
+        ("gold", datetime(2024, 1, 3, 7), 3.0, 3.0, 3.0, 3.0, 10),
+    ]
+    assert quotes.get("gold_cost") == 2.0
+    assert bumped == ["gold"]
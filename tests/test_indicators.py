@@ -0,0 +1,100 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.indicators import RSIEngine, compute_rsi
+
+
+def _legacy_rsi(prices, period=14):
+    # Reference implementation: the original nested loop from app/routes/general.py
+    values = []
+    for i in range(period, len(prices)):
+        gains = losses = 0.0
+        for j in range(i - period, i):
+            change = prices[j + 1] - prices[j]
+            if change > 0:
+                gains += change
+            else:
+                losses += abs(change)
+        avg_gain, avg_loss = gains / period, losses / period
+        if avg_loss == 0:
+            values.append(100 if avg_gain > 0 else 0)
+        else:
+            values.append(100 - (100 / (1 + avg_gain / avg_loss)))
+    return values
+
+
+def _wilder_reference(prices, period=14):
+    changes = np.diff(prices)
+    gains, losses = np.clip(changes, 0, None), np.clip(-changes, 0, None)
+    avg_gain, avg_loss = gains[:period].mean(), losses[:period].mean()
+    values = [avg_gain / avg_loss]
+    for gain, loss in zip(gains[period:], losses[period:]):
+        avg_gain = (avg_gain * (period - 1) + gain) / period
+        avg_loss = (avg_loss * (period - 1) + loss) / period
+        values.append(avg_gain / avg_loss)
+    return [100 - 100 / (1 + rs) for rs in values]
+
+
+def _series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    prices = 1000 + np.cumsum(rng.normal(0, 5, n))
+    dates = [datetime(2019, 1, 1) + timedelta(days=i) for i in range(n)]
+    return dates, prices
+
+
+def test_simple_rsi_matches_legacy_loop():
+    _, prices = _series(600)
+    rsi = compute_rsi(prices)
+    assert np.isnan(rsi[:14]).all()
+    assert np.allclose(rsi[14:], _legacy_rsi(list(prices)))
+
+
+def test_flat_prices_follow_legacy_edge_cases():
+    assert compute_rsi([5.0] * 20)[14:].tolist() == [0.0] * 6
+    assert compute_rsi(list(range(20)))[14:].tolist() == [100.0] * 6
+    assert np.isnan(compute_rsi([1.0, 2.0])).all()
+
+
+def test_wilder_rsi_matches_recursive_definition():
+    _, prices = _series(2000, seed=1)
+    rsi = compute_rsi(prices, mode="wilder")
+    assert np.allclose(rsi[14:], _wilder_reference(prices))
+
+
+def test_engine_computes_only_appended_bars():
+    dates, prices = _series(500, seed=2)
+    for mode in ("simple", "wilder"):
+        engine = RSIEngine(mode=mode)
+        engine.update("gold_cost", dates[:450], prices[:450])
+        full = engine.update("gold_cost", dates, prices)
+        assert np.allclose(full, compute_rsi(prices, mode=mode), equal_nan=True)
+
+        engine.reset()
+        engine.append("gold_cost", dates[:300], prices[:300])
+        tail = engine.append("gold_cost", dates[290:], prices[290:])
+        assert len(tail) == 200
+        assert np.allclose(tail, compute_rsi(prices, mode=mode)[300:])
+        assert np.allclose(engine.lookup("gold_cost", dates[-3:]), compute_rsi(prices, mode=mode)[-3:])
+
+
+def test_engine_recomputes_when_a_bar_is_rewritten_under_a_new_version():
+    dates, prices = _series(300, seed=3)
+    for mode in ("simple", "wilder"):
+        engine = RSIEngine(mode=mode)
+        engine.append("gold_cost", dates, prices, version="1")
+        assert engine.last_date("gold_cost", "1") == np.datetime64(dates[-1], "us")
+
+        # today's close is rewritten in place: same date, nothing newer to append
+        rewritten = prices.copy()
+        rewritten[-1] *= 1.05
+        assert engine.last_date("gold_cost", "2") is None
+        engine.append("gold_cost", dates, rewritten, version="2")
+        expected = compute_rsi(rewritten, mode=mode)
+        assert np.allclose(engine.lookup("gold_cost", dates[-5:]), expected[-5:])
+        assert not np.allclose(expected[-1], compute_rsi(prices, mode=mode)[-1])
@@ -0,0 +1,141 @@
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from db import core
+from db.models import candles_table, gold_cost_table, gold_cost_predict_table, gold_news_table, news_table
+
+
+def _sql(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+def test_conflict_keys_and_batch_dedupe():
+    assert core.conflict_columns(candles_table) == ["instrument", "date"]
+    assert core.conflict_columns(news_table) == ["instrument", "url"]
+    assert [column.name for column in core._data_columns(news_table)] == [
+        "instrument", "title", "description", "full_text", "date", "url",
+        "sentiment", "sentiment_score", "sentiment_model",
+    ]
+
+    rows = [
+        {"url": "a", "title": "old"},
+        {"url": None, "title": "x"},
+        {"url": "b", "title": "b"},
+        {"url": None, "title": "y"},
+        {"url": "a", "title": "new"},
+    ]
+    deduped = core._dedupe_rows(rows, ["url"])
+    assert [row["title"] for row in deduped] == ["new", "x", "b", "y"]
+
+
+def test_upsert_statements():
+    candle = {"instrument": "gold", "date": "2024-01-05", "open": 1.0, "high": 2.0, "low": 0.5, "close": 1.5, "volume": 10}
+    keys = core.conflict_columns(candles_table)
+    stmt = core._upsert_stmt(core.pg_insert(candles_table).values([candle]), candles_table, keys, "update")
+    sql = _sql(stmt)
+    assert "ON CONFLICT (instrument, date) DO UPDATE SET" in sql
+    assert "close = excluded.close" in sql and "date = excluded.date" not in sql
+
+    news = {"instrument": "gold", "title": "t", "description": "d", "full_text": "f", "date": "2024-01-05", "url": "u"}
+    keys = core.conflict_columns(news_table)
+    stmt = core._upsert_stmt(core.pg_insert(news_table).values([news]), news_table, keys, "nothing")
+    assert "ON CONFLICT (instrument, url) DO NOTHING" in _sql(stmt)
+
+
+def test_legacy_names_read_from_unified_tables():
+    assert core.resolve_series(gold_cost_table) == (candles_table, "gold")
+    assert core.resolve_series(gold_news_table) == (news_table, "gold")
+    assert core.resolve_series(candles_table) == (candles_table, None)
+
+    sql = _sql(core.select(gold_cost_table))
+    assert "FROM candles" in sql and "candles.instrument =" in sql
+    # Прогнозы читаются только из последнего запуска модели
+    assert "max(" in _sql(core.select(gold_cost_predict_table))
+
+
+def test_insert_data_validates_mode():
+    assert core.insert_data([], gold_cost_table) == 0
+    with pytest.raises(ValueError):
+        core.insert_data([{"date": "2024-01-05"}], gold_cost_table, on_conflict="replace")
+
+
+def test_writes_bump_instrument_versions():
+    from datetime import datetime
+
+    from db.versions import bump_versions, version_token
+
+    class _Connection:
+        def execute(self, stmt):
+            self.sql = _sql(stmt)
+            return [("gold", 4, datetime(2024, 1, 5, 10))]
+
+    connection = _Connection()
+    assert bump_versions(connection, []) == {}
+    assert bump_versions(connection, ["gold", "gold"]) == {"gold": version_token(4, datetime(2024, 1, 5, 10))}
+    assert "ON CONFLICT (instrument) DO UPDATE SET version = (data_versions.version + " in connection.sql
+    assert "clock_timestamp()" in connection.sql and "RETURNING" in connection.sql
+    assert version_token(4, datetime(2024, 1, 5, 10)) != version_token(4, datetime(2025, 1, 5, 10))
+
+
+def test_delete_forecasts_removes_rows_of_the_unified_table(monkeypatch):
+    statements, bumped = [], []
+
+    class _Connection:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def execute(self, stmt):
+            statements.append(" ".join(_sql(stmt).split()))
+            return [("gold",), ("gold",), ("silver",)]
+
+    class _Engine:
+        def begin(self):
+            return _Connection()
+
+    monkeypatch.setattr(core, "get_engine", lambda: _Engine())
+    monkeypatch.setattr(core, "bump_versions", lambda connection, instruments: bumped.append(instruments))
+
+    assert core.delete_forecasts(["gold", "silver"]) == 3
+    assert statements == [
+        "DELETE FROM forecasts WHERE forecasts.instrument IN (__[POSTCOMPILE_instrument_1]) RETURNING forecasts.instrument"
+    ]
+    assert bumped == [{"gold", "silver"}]
+
+
+def test_new_news_drops_articles_already_stored_for_the_instrument(monkeypatch):
+    statements = []
+
+    class _Connection:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def execute(self, stmt):
+            statements.append(" ".join(_sql(stmt).split()))
+            return [("https://a",)]
+
+    class _Engine:
+        def connect(self):
+            return _Connection()
+
+    monkeypatch.setattr(core, "get_engine", lambda: _Engine())
+
+    news = [{"url": "https://a", "title": "old"}, {"url": "https://b", "title": "new"}]
+    assert core.new_news(news, gold_news_table) == [news[1]]
+    assert statements == [
+        "SELECT news.url FROM news WHERE news.url IN (__[POSTCOMPILE_url_1]) AND news.instrument = %(instrument_1)s::VARCHAR"
+    ]
+    # without URLs there is nothing to look up
+    assert core.new_news([{"url": None, "title": "x"}], gold_news_table) == [{"url": None, "title": "x"}]
+    assert len(statements) == 1
@@ -0,0 +1,105 @@
+import json
+import os
+import subprocess
+import sys
+from datetime import date, datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from db import instruments
+from db.instruments import FuturesRoll, load_instruments, pick_contract
+
+
+def _future(figi, last_trade, basic_asset="copper"):
+    return SimpleNamespace(figi=figi, basic_asset=basic_asset,
+                           last_trade_date=datetime.combine(last_trade, datetime.min.time(), timezone.utc))
+
+
+def _write(tmp_path, entries):
+    path = tmp_path / "instruments.json"
+    path.write_text(json.dumps({"instruments": entries}, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+def test_shipped_registry_keeps_legacy_names():
+    registry = {instrument.key: instrument for instrument in load_instruments()}
+    assert list(registry) == ["gold", "silver", "copper"]
+    assert registry["silver"].cost_view == "sliver_cost"
+    assert registry["copper"].slug == "cupp"
+    assert registry["copper"].futures.figi_prefix == "FUTCOPPE"
+    assert all(instrument.model_path.exists() for instrument in registry.values())
+
+
+def test_registry_defaults_and_validation(tmp_path):
+    (platinum,) = load_instruments(_write(tmp_path, [{"key": "platinum", "figi": "FIGI-PT"}]))
+    assert (platinum.slug, platinum.code, platinum.news_view) == ("platinum", "PLATINUM", "platinum_news")
+    assert platinum.model_path.name == "platinum_lstm_bundle.pkl"
+
+    with pytest.raises(ValueError, match="slug"):
+        load_instruments(_write(tmp_path, [
+            {"key": "gold", "figi": "A"}, {"key": "gold2", "slug": "gold", "figi": "B"},
+        ]))
+    with pytest.raises(ValueError, match="figi"):
+        load_instruments(_write(tmp_path, [{"key": "gold"}]))
+    with pytest.raises(ValueError, match="16"):
+        load_instruments(_write(tmp_path, [{"key": "x" * 17, "figi": "A"}]))
+
+
+def test_pick_contract_rolls_before_last_trade_day():
+    futures = [
+        _future("FUTCOPPE0326", date(2026, 3, 19)),
+        _future("FUTCOPPE0626", date(2026, 6, 18)),
+        _future("FUTCOPPE0926", date(2026, 9, 17)),
+        _future("FUTSILV0626", date(2026, 6, 18), basic_asset="silver"),
+    ]
+    roll = FuturesRoll(figi_prefix="FUTCOPPE", roll_days=5)
+    assert pick_contract(futures, roll, date(2026, 3, 1)) == "FUTCOPPE0326"
+    # five days before the last trade day the next contract is used
+    assert pick_contract(futures, roll, date(2026, 3, 14)) == "FUTCOPPE0626"
+    assert pick_contract(futures, FuturesRoll(basic_asset="COPPER"), date(2026, 7, 1)) == "FUTCOPPE0926"
+    assert pick_contract(futures, roll, date(2026, 10, 1)) is None
+
+
+def test_current_figis_resolve_futures_once_a_day_and_fall_back(monkeypatch):
+    registry = load_instruments()
+    calls = []
+
+    class _Client:
+        def get_futures(self):
+            calls.append(1)
+            if len(calls) > 1:
+                raise ConnectionError("api is down")
+            return [_future("FUTCOPPE1226", date(2099, 12, 17))]
+
+    import parser.market_data
+
+    monkeypatch.setattr(parser.market_data, "get_market_data_client", lambda: _Client())
+    monkeypatch.setattr(instruments, "_current", {})
+
+    figis = instruments.current_figis(registry)
+    assert figis == {"gold": "BBG000VJ5YR4", "silver": "BBG000VHQTD1", "copper": "FUTCOPPE1226"}
+    assert instruments.current_figis(registry)["copper"] == "FUTCOPPE1226"
+    assert len(calls) == 1
+
+    monkeypatch.setattr(instruments, "_current", {})
+    assert instruments.current_figis(registry)["copper"] == "FUTCOPPE0326"
+
+
+def test_fourth_metal_needs_only_a_registry_entry(tmp_path):
+    entries = json.loads((ROOT / "instruments.json").read_text(encoding="utf-8"))["instruments"]
+    entries.append({"key": "platinum", "slug": "plat", "name": "Платина", "code": "XPT", "figi": "FIGI-PT"})
+    path = _write(tmp_path, entries)
+    script = (
+        "from db.models import COST_VIEWS, SERIES_SOURCES\n"
+        "from app.routes.general import METALS\n"
+        "print(COST_VIEWS['platinum'].name, SERIES_SOURCES['platinum_news'][1], METALS['plat']['instrument'])\n"
+    )
+    env = {**os.environ, "INSTRUMENTS_FILE": str(path)}
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["platinum_cost", "platinum", "platinum"]
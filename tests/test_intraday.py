@@ -0,0 +1,150 @@
+import json
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy.dialects import postgresql
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from db import intraday
+from parser.stream import replay_bars
+
+
+def _bar(figi, minute, close, volume=1):
+    return {"figi": figi, "date": datetime(2024, 1, 5, 10, minute), "open": close, "high": close,
+            "low": close, "close": close, "volume": volume}
+
+
+def test_ingestor_writes_micro_batches_and_keeps_last_update_of_a_minute():
+    batches = []
+    clock = [0.0]
+
+    def _write(rows):
+        batches.append(rows)
+        return {"bars": len(rows), "days": 1}
+
+    ingestor = intraday.IntradayIngestor(
+        {"GOLD": "gold"}, batch_size=3, flush_seconds=10, write=_write, clock=lambda: clock[0],
+    )
+    bars = [
+        _bar("GOLD", 0, 1.0), _bar("GOLD", 0, 1.5), _bar("OTHER", 0, 9.0),
+        _bar("GOLD", 1, 2.0), _bar("GOLD", 2, 3.0),  # third distinct minute fills the batch
+        _bar("GOLD", 3, 4.0),
+    ]
+
+    def _source():
+        yield from bars
+        clock[0] = 11.0
+        yield None  # a ping after the pause flushes by time
+
+    stats = ingestor.run(_source())
+
+    assert [[(row["date"].minute, row["close"]) for row in batch] for batch in batches] == [
+        [(0, 1.5), (1, 2.0), (2, 3.0)],
+        [(3, 4.0)],
+    ]
+    assert batches[0][0]["instrument"] == "gold" and "figi" not in batches[0][0]
+    assert stats == {"bars": 4, "batches": 2, "days": 2, "skipped": 1}
+
+
+def test_failed_write_keeps_the_batch():
+    calls = []
+
+    def _write(rows):
+        calls.append(len(rows))
+        if len(calls) == 1:
+            raise ConnectionError("db is down")
+        return {"bars": len(rows), "days": 1}
+
+    ingestor = intraday.IntradayIngestor({"GOLD": "gold"}, batch_size=10, write=_write)
+    ingestor.add(_bar("GOLD", 0, 1.0))
+    try:
+        ingestor.flush()
+    except ConnectionError:
+        pass
+    ingestor.add(_bar("GOLD", 1, 2.0))
+    ingestor.flush()
+    assert calls == [1, 2]
+
+
+def test_merge_daily_extends_stored_candle_and_places_new_day():
+    day = datetime(2024, 1, 5)
+    rollup = {"instrument": "gold", "day": day, "open": 10.0, "high": 12.0, "low": 9.5, "close": 11.0, "volume": 40}
+
+    stored = {"instrument": "gold", "date": datetime(2024, 1, 5, 7), "open": 9.8, "high": 11.0,
+              "low": 9.0, "close": 10.5, "volume": 100}
+    assert intraday.merge_daily(rollup, stored) == {
+        "instrument": "gold", "date": datetime(2024, 1, 5, 7),
+        "open": 9.8, "high": 12.0, "low": 9.0, "close": 11.0, "volume": 100,
+    }
+
+    new = intraday.merge_daily(rollup, None, timedelta(hours=7))
+    assert new["date"] == datetime(2024, 1, 5, 7)
+    assert (new["open"], new["close"], new["volume"]) == (10.0, 11.0, 40)
+
+
+def test_write_bars_bumps_versions_of_rolled_up_instruments(monkeypatch):
+    rollup = {"instrument": "gold", "day": datetime(2024, 1, 5), "open": 10.0, "high": 12.0, "low": 9.5,
+              "close": 11.0, "volume": 40, "last": datetime(2024, 1, 5, 10, 1)}
+    bumped = []
+
+    class _Result:
+        def __init__(self, rows=()):
+            self._rows = list(rows)
+
+        def mappings(self):
+            return self
+
+        def all(self):
+            return self._rows
+
+        def __iter__(self):
+            return iter(self._rows)
+
+    class _Connection:
+        def execute(self, stmt):
+            sql = str(stmt.compile(dialect=postgresql.dialect()))
+            return _Result([rollup] if "array_agg" in sql else [])
+
+    class _Begin:
+        def __enter__(self):
+            return _Connection()
+
+        def __exit__(self, *exc):
+            return False
+
+    class _Engine:
+        def begin(self):
+            return _Begin()
+
+    monkeypatch.setattr(intraday, "get_engine", lambda: _Engine())
+    monkeypatch.setattr(intraday, "bump_versions", lambda connection, instruments: bumped.extend(instruments))
+    row = {"instrument": "gold", "date": datetime(2024, 1, 5, 10, 1), "open": 11.0, "high": 11.0,
+           "low": 11.0, "close": 11.0, "volume": 1}
+    result = intraday.write_bars([row])
+    assert result == {"bars": 1, "days": 1}
+    # web workers learn about the new close through the version, not through this process's memory
+    assert bumped == ["gold"]
+
+
+def test_daily_rollup_orders_open_and_close_by_time():
+    stmt = intraday.daily_rollup_stmt({("gold", datetime(2024, 1, 5))})
+    sql = " ".join(str(stmt.compile(dialect=postgresql.dialect())).split())
+    assert "array_agg(intraday_candles.open ORDER BY intraday_candles.date ASC)" in sql
+    assert "array_agg(intraday_candles.close ORDER BY intraday_candles.date DESC)" in sql
+    assert "GROUP BY intraday_candles.instrument, date_trunc" in sql
+
+
+def test_replay_paces_recorded_bars(tmp_path):
+    path = tmp_path / "bars.jsonl"
+    rows = [_bar("GOLD", 0, 1.0), _bar("GOLD", 1, 2.0), _bar("GOLD", 1, 2.5), _bar("GOLD", 3, 3.0)]
+    path.write_text("".join(json.dumps({**row, "date": row["date"].isoformat()}) + "\n" for row in rows))
+
+    pauses = []
+    replayed = list(replay_bars(str(path), speed=60, sleep=pauses.append))
+
+    assert [bar["close"] for bar in replayed] == [1.0, 2.0, 2.5, 3.0]
+    assert replayed[0]["date"] == datetime(2024, 1, 5, 10, 0)
+    assert pauses == [1.0, 2.0]
@@ -0,0 +1,106 @@
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import grpc
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from parser.market_data import MarketDataClient
+
+
+class _RpcError(grpc.RpcError):
+    def __init__(self, code):
+        self._code = code
+
+    def code(self):
+        return self._code
+
+
+class _Services:
+    def __init__(self, failures=(), delay=0.0):
+        self.failures = list(failures)
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get_all_candles(self, instrument_id, from_, to, **kwargs):
+        with self._lock:
+            self.calls.append(instrument_id)
+            failure = self.failures.pop(0) if self.failures else None
+        if failure is not None:
+            raise _RpcError(failure)
+        time.sleep(self.delay)
+        yield f"{instrument_id}-candle"
+
+
+def _client(services, **kwargs):
+    opened = []
+
+    def _factory():
+        opened.append(services)
+        return services, lambda: None
+
+    return MarketDataClient(services_factory=_factory, backoff=0.001, **kwargs), opened
+
+
+def test_instruments_are_fetched_concurrently_over_one_channel():
+    services = _Services(delay=0.2)
+    client, opened = _client(services)
+    start = datetime(2024, 1, 1)
+
+    started = time.perf_counter()
+    candles = client.get_candles_many({figi: (start, None) for figi in ("A", "B", "C")})
+    elapsed = time.perf_counter() - started
+
+    assert candles == {"A": ["A-candle"], "B": ["B-candle"], "C": ["C-candle"]}
+    assert elapsed < 0.5
+    assert len(opened) == 1
+
+
+def test_transient_errors_are_retried_and_others_are_not():
+    services = _Services(failures=[grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED])
+    client, _ = _client(services, retries=3)
+    assert client.get_candles("A", datetime(2024, 1, 1)) == ["A-candle"]
+    assert services.calls == ["A", "A", "A"]
+
+    services = _Services(failures=[grpc.StatusCode.INVALID_ARGUMENT])
+    client, _ = _client(services, retries=3)
+    with pytest.raises(grpc.RpcError):
+        client.get_candles("A", datetime(2024, 1, 1))
+    assert services.calls == ["A"]
+
+    services = _Services(failures=[grpc.StatusCode.UNAVAILABLE] * 3)
+    client, _ = _client(services, retries=2)
+    with pytest.raises(grpc.RpcError):
+        client.get_candles("A", datetime(2024, 1, 1))
+    assert len(services.calls) == 3
+
+
+def test_deadline_interceptor_bounds_calls_without_timeout():
+    from concurrent.futures import ThreadPoolExecutor
+
+    from parser.market_data import DeadlineInterceptor
+
+    def _slow(request, context):
+        time.sleep(0.5)
+        return request
+
+    server = grpc.server(ThreadPoolExecutor(max_workers=2))
+    server.add_generic_rpc_handlers((
+        grpc.method_handlers_generic_handler("stub.Service", {"Slow": grpc.unary_unary_rpc_method_handler(_slow)}),
+    ))
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    try:
+        channel = grpc.intercept_channel(grpc.insecure_channel(f"127.0.0.1:{port}"), DeadlineInterceptor(0.1))
+        with pytest.raises(grpc.RpcError) as error:
+            channel.unary_unary("/stub.Service/Slow")(b"ping")
+        assert error.value.code() == grpc.StatusCode.DEADLINE_EXCEEDED
+        channel.close()
+    finally:
+        server.stop(None)
@@ -0,0 +1,67 @@
+import asyncio
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.util import greenlet_spawn
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from db import metrics
+from db.metrics import QueryMetrics, instrument_engine
+
+
+def _engine(registry: QueryMetrics):
+    engine = create_engine("sqlite://")
+    instrument_engine(engine, "sync", registry)
+    return engine
+
+
+def load_rows(engine):
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY, password TEXT)"))
+        connection.execute(text("INSERT INTO t (id, password) VALUES (:id, :password)"),
+                           [{"id": i, "password": "secret"} for i in range(5)])
+        return connection.execute(text("SELECT id FROM t")).all()
+
+
+def test_statements_are_labelled_by_caller_and_kind():
+    registry = QueryMetrics(slow_query_ms=0)
+    assert len(load_rows(_engine(registry))) == 5
+
+    caller = f"{__name__}.load_rows"
+    assert registry.durations[("sync", caller, "INSERT")].count == 1
+    assert registry.rows[("sync", caller, "INSERT")].sum == 5
+    assert registry.durations[("sync", caller, "SELECT")].count == 1
+    assert not registry.slow
+
+    rendered = registry.render()
+    assert "# TYPE db_query_duration_seconds histogram" in rendered
+    assert f'db_query_duration_seconds_bucket{{engine="sync",caller="{caller}",statement="SELECT",le="+Inf"}} 1' in rendered
+    assert f'db_query_rows_count{{engine="sync",caller="{caller}",statement="INSERT"}} 1' in rendered
+
+
+def test_errors_and_slow_queries(monkeypatch):
+    registry = QueryMetrics(slow_query_ms=1e-6)
+    engine = _engine(registry)
+    logged = []
+    monkeypatch.setattr(metrics.logger, "warning", logged.append)
+
+    load_rows(engine)
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT missing FROM t"))
+    except Exception:
+        pass
+
+    assert sum(registry.slow.values()) == 3
+    assert any("'password': '***'" in line and "secret" not in line for line in logged)
+    assert list(registry.errors.values()) == [1]
+
+
+def test_async_caller_is_found_through_the_greenlet_parent():
+    async def fetch_things():
+        return await greenlet_spawn(metrics._caller)
+
+    assert asyncio.run(fetch_things()) == f"{__name__}.fetch_things"
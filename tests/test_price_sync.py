@@ -0,0 +1,52 @@
+import sys
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from db import price_sync
+from db.models import gold_cost_table
+
+
+def test_weekends_are_not_gaps_but_missing_weekdays_are():
+    # Fri 2024-01-05 -> Mon 01-08 is a weekend; Tue 01-09 .. Thu 01-11 are missing
+    days = ["2024-01-04", "2024-01-05", "2024-01-08", "2024-01-12", "2024-01-15"]
+    assert price_sync.find_gaps(days) == [(date(2024, 1, 9), date(2024, 1, 11))]
+    assert price_sync.find_gaps(days, checked={(date(2024, 1, 9), date(2024, 1, 11))}) == []
+    assert price_sync.find_gaps(days[:1]) == []
+
+
+def test_sync_fetches_tail_and_gaps_and_reports(monkeypatch):
+    stored = [datetime(2024, 1, 3, 7), datetime(2024, 1, 4, 7), datetime(2024, 1, 9, 7), datetime(2024, 1, 10, 7)]
+    requests, inserted, marked = [], [], []
+
+    def _fetch(figi, start, end):
+        requests.append((start, end))
+        if end is None:
+            return [{"date": datetime(2024, 1, 10, 7)}, {"date": datetime(2024, 1, 11, 7)}]
+        return [{"date": datetime(2024, 1, 5, 7)}]
+
+    def _insert(rows, table):
+        inserted.append((table.name, len(rows)))
+        return len(rows)
+
+    monkeypatch.setattr(price_sync, "_stored_state", lambda instrument: (stored, set()))
+    monkeypatch.setattr(price_sync, "insert_data", _insert)
+    monkeypatch.setattr(price_sync, "_mark_checked", lambda *args: marked.append(args))
+
+    report = price_sync.sync_prices("FIGI", gold_cost_table, fetch=_fetch)
+
+    # the last stored day is requested again, the hole Fri 01-05 .. Mon 01-08 on its own
+    assert requests == [
+        (datetime(2024, 1, 10, tzinfo=timezone.utc), None),
+        (datetime(2024, 1, 5, tzinfo=timezone.utc), datetime(2024, 1, 9, tzinfo=timezone.utc)),
+    ]
+    assert report["watermark"] == "2024-01-10T07:00:00"
+    assert report["tail"] == {"from": "2024-01-10", "received": 2, "inserted": 2}
+    assert report["gaps"] == [{"from": "2024-01-05", "to": "2024-01-08", "received": 1, "inserted": 1}]
+    assert report["gaps_pending"] == 0
+    # features are recomputed from the backfilled hole, not only from the tail
+    assert report["changed_from"] == "2024-01-05T07:00:00"
+    assert marked == [("gold", (date(2024, 1, 5), date(2024, 1, 8)), 1)]
+    assert inserted == [("gold_cost", 2), ("gold_cost", 1)]
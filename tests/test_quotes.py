@@ -0,0 +1,47 @@
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from db.quotes import LatestQuotes
+
+
+def test_latest_quote_keeps_newest_candle():
+    quotes = LatestQuotes()
+    assert quotes.get("gold_cost") is None
+
+    quotes.publish_rows("gold_cost", [
+        {"date": datetime(2024, 1, 5, 7, tzinfo=timezone.utc), "close": 2050.5},
+        {"date": datetime(2024, 1, 4, 7, tzinfo=timezone.utc), "close": 2040.0},
+    ])
+    assert quotes.get("gold_cost") == 2050.5
+
+    # Свеча из БД приходит без таймзоны и старше уже известной
+    quotes.publish("gold_cost", datetime(2024, 1, 3), 2000.0)
+    assert quotes.get("gold_cost") == 2050.5
+
+    quotes.publish("gold_cost", datetime(2024, 1, 8), 2061.0)
+    assert quotes.get("gold_cost") == 2061.0
+
+    quotes.invalidate("gold_cost")
+    assert quotes.get("gold_cost") is None
+
+
+def test_latest_quote_expires():
+    quotes = LatestQuotes(ttl=0)
+    quotes.publish("sliver_cost", datetime(2024, 1, 5), 23.1)
+    assert quotes.get("sliver_cost") is None
+
+
+def test_latest_quote_is_stale_under_another_version():
+    quotes = LatestQuotes()
+    quotes.publish("gold_cost", datetime(2024, 1, 5, 7), 2050.5, version="1.a")
+    assert quotes.get("gold_cost", "1.a") == 2050.5
+    # another process wrote gold candles: the quote has to be read again
+    assert quotes.get("gold_cost", "2.b") is None
+
+    # the same day's candle re-read under the new version replaces the old close
+    quotes.publish("gold_cost", datetime(2024, 1, 5, 7), 2049.0, version="2.b")
+    assert quotes.get("gold_cost", "2.b") == 2049.0
@@ -0,0 +1,70 @@
+import os
+import sys
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.dialects import postgresql
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from db import retention
+from db.models import news_archive_table, news_table
+from db.retention import ARCHIVE_CODEC, archive_update_stmt, compress_body, decompress_body
+
+
+def test_body_round_trip_is_compressed():
+    text = "Золото подорожало на фоне ослабления доллара. Gold ETF inflows resumed. " * 40
+    body, raw_size = compress_body(text)
+
+    assert raw_size == len(text.encode("utf-8"))
+    assert len(body) < raw_size / 5
+    assert decompress_body(ARCHIVE_CODEC, body, raw_size) == text
+
+
+def test_empty_body():
+    body, raw_size = compress_body("")
+    assert raw_size == 0
+    assert decompress_body(ARCHIVE_CODEC, body, raw_size) == ""
+
+
+def test_archiving_keeps_body_lexemes_searchable():
+    sql = str(archive_update_stmt([1, 2]).compile(dialect=postgresql.dialect()))
+    assert sql.startswith("UPDATE news SET full_text=%(full_text)s::VARCHAR, archived_search=setweight(")
+    assert "setweight(to_tsvector('russian', coalesce(full_text, '')), 'C')" in sql
+    # the generated search vector picks the archived lexemes up
+    assert "coalesce(archived_search, ''::tsvector)" in str(news_table.c.search.computed.sqltext)
+
+
+@pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="needs a PostgreSQL database in TEST_DATABASE_URL")
+def test_archived_body_is_found_by_search(monkeypatch):
+    from app.routes.general import search_news_stmt
+
+    # a throwaway schema keeps the archiver away from real news
+    schema = "test_retention_{}".format(uuid.uuid4().hex[:8])
+    admin = create_engine(os.environ["TEST_DATABASE_URL"])
+    with admin.begin() as connection:
+        connection.execute(text("CREATE SCHEMA {}".format(schema)))
+    engine = create_engine(os.environ["TEST_DATABASE_URL"], connect_args={"options": "-c search_path={}".format(schema)})
+    try:
+        news_table.metadata.create_all(engine, tables=[news_table, news_archive_table])
+        with engine.begin() as connection:
+            connection.execute(insert(news_table).values(
+                instrument="gold", title="Обзор рынка", description="Итоги недели", date=datetime(2015, 1, 5),
+                full_text="Аналитики обсуждали палладиевый фьючерс", url="https://example.com/1",
+            ))
+        monkeypatch.setattr(retention, "get_engine", lambda: engine)
+        assert retention.archive_old_news(older_than_days=365)["archived"] == 1
+
+        with engine.connect() as connection:
+            found = connection.execute(search_news_stmt("gold", "палладиевые фьючерсы")).all()
+            assert connection.execute(text("SELECT full_text FROM news")).scalar() is None
+        assert [row.title for row in found] == ["Обзор рынка"]
+    finally:
+        engine.dispose()
+        with admin.begin() as connection:
+            connection.execute(text("DROP SCHEMA {} CASCADE".format(schema)))
+        admin.dispose()
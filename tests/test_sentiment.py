@@ -0,0 +1,142 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy.dialects import postgresql
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from db.retention import ARCHIVE_CODEC, compress_body
+from predict_model import features, sentiment
+from predict_model.sentiment import (
+    _svm_pipeline,
+    daily_sentiment_stmt,
+    model_version,
+    score_news,
+    score_texts,
+)
+
+
+def test_labels_match_svm_predict():
+    texts = [
+        "Золото выросло на фоне ослабления доллара",
+        "Цены на медь резко упали после публикации статистики",
+        "Серебро торгуется без изменений",
+    ] * 3
+    pipeline = _svm_pipeline()
+    labels, scores = score_texts(texts, batch_size=4)
+
+    expected = [{0: -1, 1: 0, 2: 1}[int(label)] for label in pipeline.predict(texts)]
+    assert labels == expected
+    assert np.allclose(scores, pipeline.decision_function(texts).max(axis=1))
+
+
+def test_score_news_skips_articles_without_text():
+    rows = [
+        {"title": "a", "full_text": "Золото дорожает", "url": "u1"},
+        {"title": "b", "full_text": None, "url": "u2"},
+    ]
+    scored = score_news(rows)
+
+    assert scored[0]["sentiment"] in (-1, 0, 1)
+    assert scored[0]["sentiment_model"] == model_version()
+    assert scored[1]["sentiment"] is None and scored[1]["sentiment_model"] is None
+    assert "sentiment" not in rows[0]
+
+
+def test_daily_sentiment_is_clipped_and_starts_at_day_boundary():
+    stmt = daily_sentiment_stmt("gold", datetime(2024, 5, 3, 15, 30))
+    compiled = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    sql = " ".join(str(compiled).split())
+
+    assert "greatest(-1, least(1, sum(news.sentiment)))" in sql
+    assert "date_trunc('day', news.date)" in sql
+    assert "news.date >= '2024-05-03 00:00:00'" in sql
+    assert "ON CONFLICT (instrument, date) DO UPDATE" in sql
+
+
+def test_backfill_recomputes_features_of_rescored_days(monkeypatch):
+    archived, raw_size = compress_body("archived body")
+    live = {"codec": None, "raw_size": None, "body": None}
+    batches = [[
+        {"id": 1, "instrument": "silver", "date": datetime(2024, 3, 4, 9), "full_text": "a", **live},
+        {"id": 2, "instrument": "silver", "date": datetime(2024, 2, 1, 12), "full_text": "b", **live},
+        {"id": 3, "instrument": "gold", "date": None, "full_text": "c", **live},
+        # archived article: full_text was moved to news_archive
+        {"id": 4, "instrument": "silver", "date": datetime(2023, 1, 9, 8), "full_text": None,
+         "codec": ARCHIVE_CODEC, "raw_size": raw_size, "body": archived},
+    ], []]
+    queries, texts = [], []
+
+    class _Result:
+        def mappings(self):
+            return self
+
+        def all(self):
+            return batches.pop(0)
+
+    class _Connection:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def execute(self, stmt, params=None):
+            queries.append(str(stmt.compile(dialect=postgresql.dialect())))
+            return _Result()
+
+    class _Engine:
+        def connect(self):
+            return _Connection()
+
+        def begin(self):
+            return _Connection()
+
+    refreshed, recomputed = [], []
+    monkeypatch.setattr(sentiment, "get_engine", lambda: _Engine())
+    monkeypatch.setattr(sentiment, "score_texts", lambda batch: texts.extend(batch) or ([0] * len(batch), [0.5] * len(batch)))
+    monkeypatch.setattr(sentiment, "refresh_daily_sentiment", lambda *args: refreshed.append(args))
+    monkeypatch.setattr(features, "update_feature_store", lambda metal, since=None: recomputed.append((metal, since)) or 1)
+
+    assert sentiment.backfill() == 4
+    # archived articles are rescored from their compressed copy
+    assert "LEFT OUTER JOIN news_archive ON news_archive.news_id = news.id" in queries[0]
+    assert texts == ["a", "b", "c", "archived body"]
+    assert refreshed == [("silver", datetime(2023, 1, 9, 8))]
+    # the feature store copies daily sentiment, so its rows are rewritten from the oldest rescored day
+    assert recomputed == [("sliver", datetime(2023, 1, 9, 8))]
+
+
+def test_update_news_scores_only_articles_not_stored_yet(monkeypatch):
+    from db import update_information
+
+    scraped = [
+        {"title": "old", "full_text": "Золото выросло", "date": datetime(2024, 1, 5), "url": "https://a"},
+        {"title": "new", "full_text": "Медь упала", "date": datetime(2024, 1, 8), "url": "https://b"},
+    ]
+
+    class _Scraper:
+        def __init__(self, **kwargs):
+            pass
+
+        def get_recent_news(self):
+            return list(scraped)
+
+    scored, inserted, refreshed = [], [], []
+    monkeypatch.setattr(update_information, "Scraper", _Scraper)
+    monkeypatch.setattr(update_information, "new_news", lambda news, table: [item for item in news if item["url"] != "https://a"])
+    monkeypatch.setattr(sentiment, "score_news", lambda news: scored.extend(news) or news)
+    monkeypatch.setattr(sentiment, "refresh_daily_sentiment", lambda instrument, since: refreshed.append((instrument, since)))
+    monkeypatch.setattr(update_information, "insert_data", lambda news, table: inserted.extend(news) or len(news))
+
+    source = type("Source", (), {"url": "https://example", "keywords": ("золото",)})()
+    from db.models import gold_news_table
+
+    result = update_information._update_news((source,), gold_news_table)
+    assert [item["url"] for item in scored] == ["https://b"]
+    assert [item["url"] for item in inserted] == ["https://b"]
+    assert result == {"inserted": 1, "received": 2, "changed_from": "2024-01-08T00:00:00"}
+    assert refreshed == [("gold", datetime(2024, 1, 8))]
@@ -1,3 +1,7 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
 from fastapi.testclient import TestClient
 import sys
 from pathlib import Path
@@ -8,25 +12,27 @@ sys.path.insert(0, str(ROOT))
 
 import app.main as app_main
 import app.routes.general as general
+from app.indicators import RSIEngine, compute_rsi
+from db.quotes import LatestQuotes
 
 
-def _stub_fetch_candles(*args, **kwargs):
+async def _stub_fetch_candles(*args, **kwargs):
     return []
 
 
-def _stub_fetch_predict_candles(*args, **kwargs):
+async def _stub_fetch_predict_candles(*args, **kwargs):
     return []
 
 
-def _stub_get_current_user(request=None):
+async def _stub_get_current_user(request=None):
     return None
 
 
-def _stub_fetch_news(*args, **kwargs):
+async def _stub_fetch_news(*args, **kwargs):
     return []
 
 
-def _stub_fetch_latest_close_price(*args, **kwargs):
+async def _stub_fetch_latest_close_price(*args, **kwargs):
     return 0.0
 
 
@@ -38,8 +44,22 @@ def _stub_run_predictions():
     return {"status": "ok", "predictions": 0}
 
 
+@pytest.fixture(autouse=True)
+def data_versions(monkeypatch):
+    """Per-instrument data versions as another process would leave them in the database"""
+    versions = {}
+
+    async def _fetch_data_versions():
+        return dict(versions)
+
+    monkeypatch.setattr(general, "fetch_data_versions", _fetch_data_versions)
+    general.data_versions.invalidate()
+    return versions
+
+
 def test_get_pages_ok(monkeypatch):
     # Mock data access and heavy operations to make endpoints deterministic
+    general.snapshot_cache.clear()
     monkeypatch.setattr(general, "fetch_candles", _stub_fetch_candles)
     monkeypatch.setattr(general, "fetch_predict_candles", _stub_fetch_predict_candles)
     monkeypatch.setattr(general, "_get_current_user", _stub_get_current_user)
@@ -52,6 +72,10 @@ def test_get_pages_ok(monkeypatch):
         resp = client.get(path)
         assert resp.status_code == 200, f"GET {path} returned {resp.status_code}"
 
+    # pages and the menu come from the instrument registry
+    assert '<a href="/cupp">Медь</a>' in client.get("/gold").text
+    assert client.get("/platinum").status_code == 404
+
 
 def test_api_update_and_run_predictions(monkeypatch):
     # Mock the heavy update/prediction routines imported in the module
@@ -69,3 +93,440 @@ def test_api_update_and_run_predictions(monkeypatch):
     assert resp2.json().get("status") == "ok"
 
 
+
+
+def test_dashboard_snapshot_cached_until_update(monkeypatch):
+    calls = []
+
+    async def _counting_fetch_news(*args, **kwargs):
+        calls.append(args)
+        return []
+
+    general.snapshot_cache.clear()
+    monkeypatch.setattr(general, "_get_current_user", _stub_get_current_user)
+    monkeypatch.setattr(general, "fetch_news", _counting_fetch_news)
+    monkeypatch.setattr(general, "fetch_latest_close_price", _stub_fetch_latest_close_price)
+    monkeypatch.setattr(general, "update_all_data", _stub_run_update)
+
+    client = TestClient(app_main.app)
+    client.get("/silver")
+    client.get("/silver")
+    assert len(calls) == 1
+
+    client.post("/api/update-data")
+    client.get("/silver")
+    assert len(calls) == 2
+
+    stats = client.get("/api/cache-stats").json()["snapshot"]
+    assert stats["hits"] >= 1 and stats["misses"] >= 2
+
+
+def test_writes_from_other_processes_change_etag_and_snapshot(monkeypatch, data_versions):
+    calls = []
+
+    async def _counting_fetch_news(*args, **kwargs):
+        calls.append(args)
+        return []
+
+    general.snapshot_cache.clear()
+    monkeypatch.setattr(general, "fetch_news", _counting_fetch_news)
+    monkeypatch.setattr(general, "fetch_latest_close_price", _stub_fetch_latest_close_price)
+    client = TestClient(app_main.app)
+
+    page = client.get("/gold")
+    etag = page.headers["etag"]
+    assert client.get("/gold", headers={"If-None-Match": etag}).status_code == 304
+
+    # the DAG or the minute stream bumped gold's version; this worker never saw the write
+    data_versions["gold"] = "3.5f1c"
+    general.data_versions.invalidate()
+    page = client.get("/gold", headers={"If-None-Match": etag})
+    assert page.status_code == 200 and page.headers["etag"] != etag
+    assert len(calls) == 2
+
+    # other metals keep their version
+    assert client.get("/silver").headers["etag"].startswith('W/"0-')
+
+
+def test_latest_price_is_reread_when_the_version_changes(monkeypatch, data_versions):
+    closes = [2050.0]
+    reads = []
+
+    class _Result:
+        def first(self):
+            return (datetime(2024, 1, 5, 7), closes[-1])
+
+    class _Connection:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def execute(self, stmt):
+            reads.append(stmt)
+            return _Result()
+
+    class _Engine:
+        def connect(self):
+            return _Connection()
+
+    monkeypatch.setattr(general, "get_async_reader", lambda: _Engine())
+    monkeypatch.setattr(general, "latest_quotes", LatestQuotes())
+    table = general.METALS["gold"]["cost_table"]
+
+    assert asyncio.run(general.fetch_latest_close_price(table)) == 2050.0
+    assert asyncio.run(general.fetch_latest_close_price(table)) == 2050.0
+    assert len(reads) == 1
+
+    # the minute stream rewrote today's candle from its own process
+    closes.append(2061.25)
+    data_versions["gold"] = "2.5f1c"
+    general.data_versions.invalidate()
+    assert asyncio.run(general.fetch_latest_close_price(table)) == 2061.25
+    # trades always read the price from the database
+    asyncio.run(general.fetch_latest_close_price(table, cached=False))
+    assert len(reads) == 3
+
+
+def test_candle_and_forecast_api(monkeypatch):
+    received = {}
+
+    async def _window_fetch_candles(table, start_date=None, end_date=None, limit=None, since=None,
+                                    timeframe="1D", max_points=None):
+        received.update(table=table.name, end_date=end_date, limit=limit, since=since,
+                        timeframe=timeframe, max_points=max_points)
+        return [{"time": "2024-01-05", "open": 1.0, "high": 2.0, "low": 0.5, "close": 1.5, "volume": 10}]
+
+    general.snapshot_cache.clear()
+    general.window_cache.clear()
+    monkeypatch.setattr(general, "fetch_candles", _window_fetch_candles)
+    monkeypatch.setattr(general, "fetch_predict_candles", _stub_fetch_predict_candles)
+
+    client = TestClient(app_main.app)
+
+    resp = client.get("/api/silver/candles", params={"to": "2024-01-31", "limit": 100})
+    assert resp.status_code == 200
+    assert resp.json()["candles"][0]["time"] == "2024-01-05"
+    assert received["table"] == "sliver_cost"
+    assert received["limit"] == 100
+    assert received["end_date"].year == 2024
+
+    resp = client.get("/api/gold/candles", params={"since": "2024-01-04"})
+    assert resp.status_code == 200
+    assert received["since"].day == 4
+
+    resp = client.get("/api/gold/candles", params={"timeframe": "1W", "max_points": 300})
+    assert resp.status_code == 200
+    assert (received["timeframe"], received["max_points"]) == ("1W", 300)
+    assert client.get("/api/gold/candles", params={"timeframe": "1H"}).status_code == 422
+
+    resp = client.get("/api/cupp/forecasts", params={"limit": 5})
+    assert resp.status_code == 200
+    assert resp.json()["forecasts"] == []
+
+    assert client.get("/api/platinum/candles").status_code == 404
+    assert client.get("/api/gold/candles", params={"limit": 0}).status_code == 422
+
+
+def test_api_windows_do_not_evict_page_snapshots(monkeypatch):
+    general.snapshot_cache.clear()
+    general.window_cache.clear()
+    monkeypatch.setattr(general, "fetch_candles", _stub_fetch_candles)
+    monkeypatch.setattr(general, "fetch_news", _stub_fetch_news)
+    monkeypatch.setattr(general, "fetch_latest_close_price", _stub_fetch_latest_close_price)
+    client = TestClient(app_main.app)
+
+    client.get("/gold")
+    for limit in range(1, general.snapshot_cache.maxsize + 2):
+        client.get("/api/gold/candles", params={"limit": limit})
+    assert general.snapshot_cache.get(("gold", "0")) is not None
+    assert client.get("/api/cache-stats").json()["windows"]["size"] > 0
+
+
+def test_intraday_api_and_uncached_delta(monkeypatch):
+    received = {}
+
+    async def _fetch_intraday(instrument, since=None, limit=600):
+        received.update(instrument=instrument, since=since, limit=limit)
+        return [{"time": 1704448800, "open": 1.0, "high": 1.2, "low": 0.9, "close": 1.1, "volume": 3}]
+
+    monkeypatch.setattr(general, "fetch_intraday_candles", _fetch_intraday)
+    monkeypatch.setattr(general, "fetch_candles", _stub_fetch_candles)
+    client = TestClient(app_main.app)
+
+    resp = client.get("/api/cupp/intraday", params={"since": "2024-01-05T09:00:00Z", "limit": 50})
+    assert resp.status_code == 200
+    assert resp.json()["candles"][0]["time"] == 1704448800
+    assert (received["instrument"], received["limit"]) == ("copper", 50)
+    assert received["since"].hour == 9
+    assert client.get("/api/gold/intraday", params={"limit": 0}).status_code == 422
+
+    # the delta poll goes past the ETag: today's bar changes without /api/update-data
+    assert "etag" in client.get("/api/gold/candles").headers
+    assert "etag" not in client.get("/api/gold/candles", params={"since": "2024-01-04"}).headers
+
+
+def test_news_api_pages_and_article_body(monkeypatch):
+    received = {}
+
+    async def _page_fetch_news(table, limit=20, before=None):
+        received.update(table=table.name, limit=limit, before=before)
+        return [
+            {"id": 7 - i, "title": "t", "date": "05.01.2024", "summary": "s", "cursor": f"2024-01-05T10:00:00_{7 - i}"}
+            for i in range(limit)
+        ]
+
+    async def _stub_fetch_news_body(table, news_id):
+        if news_id != 7:
+            return None
+        return {"id": 7, "title": "t", "date": "05.01.2024", "body": "full text"}
+
+    monkeypatch.setattr(general, "fetch_news", _page_fetch_news)
+    monkeypatch.setattr(general, "fetch_news_body", _stub_fetch_news_body)
+
+    client = TestClient(app_main.app)
+
+    resp = client.get("/api/gold/news", params={"limit": 2, "cursor": "2024-01-06T09:30:00_12"})
+    assert resp.status_code == 200
+    assert resp.json()["next_cursor"] == "2024-01-05T10:00:00_6"
+    assert received["before"][1] == 12
+    assert "body" not in resp.json()["news"][0]
+
+    assert client.get("/api/gold/news", params={"cursor": "broken"}).status_code == 400
+
+    resp = client.get("/api/gold/news/7")
+    assert resp.status_code == 200
+    assert resp.json()["body"] == "full text"
+    assert client.get("/api/gold/news/8").status_code == 404
+
+
+def test_news_feed_keeps_undated_articles_last(monkeypatch):
+    from sqlalchemy.dialects import postgresql
+
+    dated = [{"id": 9, "title": "t", "description": "d", "date": datetime(2024, 1, 5, 10)}]
+    undated = [{"id": 4, "title": "u", "description": "d", "date": None}]
+    statements = []
+
+    class _Result:
+        def __init__(self, rows):
+            self._rows = rows
+
+        def mappings(self):
+            return self
+
+        def all(self):
+            return self._rows
+
+    class _Connection:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def execute(self, stmt):
+            sql = " ".join(str(stmt.compile(dialect=postgresql.dialect())).split())
+            statements.append(sql)
+            return _Result(undated if "news.date IS NULL" in sql else dated)
+
+    class _Engine:
+        def connect(self):
+            return _Connection()
+
+    monkeypatch.setattr(general, "get_async_reader", lambda: _Engine())
+    table = general.NEWS_VIEWS["gold"]
+
+    news = asyncio.run(general.fetch_news(table, limit=3))
+    assert [item["id"] for item in news] == [9, 4]
+    assert news[1]["cursor"] == "_4" and news[1]["date"] == ""
+    assert "date IS NOT NULL" in statements[0] and "LIMIT" in statements[1]
+
+    # a cursor inside the undated tail reads only the undated part
+    statements.clear()
+    assert general._parse_news_cursor("_4") == (None, 4)
+    asyncio.run(general.fetch_news(table, limit=3, before=(None, 4)))
+    assert len(statements) == 1 and "news.id < " in statements[0]
+
+    # a full page of dated articles does not touch the undated part
+    statements.clear()
+    asyncio.run(general.fetch_news(table, limit=1))
+    assert len(statements) == 1
+
+
+def test_news_search_api(monkeypatch):
+    received = {}
+
+    async def _stub_search_news(instrument, text, start_date=None, end_date=None, limit=20, offset=0):
+        received.update(instrument=instrument, text=text, start_date=start_date, offset=offset)
+        return [
+            {"id": 30 - i, "title": "t", "date": "05.01.2024", "summary": "s", "rank": 0.5}
+            for i in range(limit)
+        ]
+
+    monkeypatch.setattr(general, "search_news", _stub_search_news)
+    client = TestClient(app_main.app)
+
+    resp = client.get("/api/silver/news/search", params={"q": " серебро ", "from": "2024-01-01", "limit": 3})
+    assert resp.status_code == 200
+    assert resp.json()["next_offset"] == 3
+    assert received["instrument"] == "silver" and received["text"] == "серебро"
+    assert received["start_date"].year == 2024
+
+    assert client.get("/api/gold/news/search", params={"q": "x"}).status_code == 422
+    assert client.get("/api/gold/news/search").status_code == 422
+
+    from sqlalchemy.dialects import postgresql
+
+    stmt = general.search_news_stmt("gold", "золото ETF", limit=5, offset=10)
+    sql = " ".join(str(stmt.compile(dialect=postgresql.dialect())).split())
+    assert "news.search @@ (websearch_to_tsquery(" in sql
+    assert "ts_rank_cd(news.search, " in sql
+    assert "ORDER BY rank DESC, news.date DESC, news.id DESC" in sql
+
+
+def test_archive_news_api(monkeypatch):
+    received = {}
+
+    def _stub_archive_old_news(older_than_days=None):
+        received["days"] = older_than_days
+        return {"archived": 3, "cutoff": "2024-01-01T00:00:00"}
+
+    monkeypatch.setattr(general, "archive_old_news", _stub_archive_old_news)
+    client = TestClient(app_main.app)
+
+    # without a configured token the endpoint stays closed
+    monkeypatch.delenv("INTERNAL_API_TOKEN", raising=False)
+    assert client.post("/api/archive-news").status_code == 503
+    monkeypatch.setenv("INTERNAL_API_TOKEN", "s3cret")
+    assert client.post("/api/archive-news").status_code == 403
+    assert client.post("/api/archive-news", headers={"X-Internal-Token": "wrong"}).status_code == 403
+    assert received == {}
+
+    headers = {"X-Internal-Token": "s3cret"}
+    resp = client.post("/api/archive-news", params={"older_than_days": 180}, headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["archived"] == 3 and received["days"] == 180
+    assert client.post("/api/archive-news", params={"older_than_days": 0}, headers=headers).status_code == 422
+
+
+def test_metrics_endpoint_is_prometheus_text():
+    client = TestClient(app_main.app)
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE db_query_duration_seconds histogram" in resp.text
+
+
+def test_current_user_cached_until_invalidated(monkeypatch):
+    general.user_cache.clear()
+    calls = []
+
+    async def _counting_fetch_user(user_id):
+        calls.append(user_id)
+        return {"id": user_id, "username": "demo", "start_capital": 1000.0, "current_capital": 1000.0}
+
+    monkeypatch.setattr(general, "fetch_user", _counting_fetch_user)
+
+    class _Request:
+        session = {"user_id": 7}
+
+    async def _load_twice():
+        first = await general._get_current_user(_Request())
+        second = await general._get_current_user(_Request())
+        return first, second
+
+    first, second = asyncio.run(_load_twice())
+    assert first == second and calls == [7]
+
+    general.user_cache.invalidate(7)
+    asyncio.run(general._get_current_user(_Request()))
+    assert calls == [7, 7]
+    general.user_cache.clear()
+
+
+def test_conditional_get_and_compression(monkeypatch, data_versions):
+    calls = []
+
+    def _run_update():
+        # the pipeline bumps the versions of the instruments it wrote
+        data_versions["gold"] = "1.5f1c"
+        return _stub_run_update()
+
+    async def _long_fetch_candles(*args, **kwargs):
+        calls.append(args)
+        return [
+            {"time": f"2024-01-{day:02d}", "open": 1.0, "high": 2.0, "low": 0.5, "close": 1.5, "volume": 10}
+            for day in range(1, 29)
+        ]
+
+    general.snapshot_cache.clear()
+    general.window_cache.clear()
+    monkeypatch.setattr(general, "fetch_candles", _long_fetch_candles)
+    monkeypatch.setattr(general, "fetch_news", _stub_fetch_news)
+    monkeypatch.setattr(general, "fetch_latest_close_price", _stub_fetch_latest_close_price)
+    monkeypatch.setattr(general, "update_all_data", _run_update)
+
+    client = TestClient(app_main.app)
+
+    resp = client.get("/api/gold/candles", params={"limit": 30})
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    etag = resp.headers["etag"]
+
+    resp = client.get("/api/gold/candles", params={"limit": 30}, headers={"If-None-Match": etag})
+    assert resp.status_code == 304 and resp.content == b""
+    assert len(calls) == 1
+
+    # Другие параметры — другой ETag
+    other = client.get("/api/gold/candles", params={"limit": 31}).headers["etag"]
+    assert other != etag
+
+    page = client.get("/gold")
+    assert page.status_code == 200
+    assert client.get("/gold", headers={"If-None-Match": page.headers["etag"]}).status_code == 304
+
+    assert client.post("/api/update-data").status_code == 200
+    resp = client.get("/api/gold/candles", params={"limit": 30}, headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["etag"] != etag
+
+
+def test_rsi_is_recomputed_when_another_process_rewrites_a_close(monkeypatch, data_versions):
+    dates = [datetime(2024, 1, 1, 7) + timedelta(days=day) for day in range(30)]
+    closes = [100.0 + day % 7 for day in range(30)]
+    reads = []
+
+    class _Result:
+        def __init__(self, rows):
+            self._rows = rows
+
+        def all(self):
+            return self._rows
+
+    class _Connection:
+        async def execute(self, stmt):
+            since = stmt.compile().params.get("date_1")
+            reads.append(since)
+            return _Result([(date, close) for date, close in zip(dates, closes) if since is None or date > since])
+
+    monkeypatch.setattr(general, "rsi_engine", RSIEngine())
+    table = general.METALS["gold"]["cost_table"]
+    sync = lambda window: asyncio.run(general._sync_rsi(_Connection(), table, window))[-1]
+
+    before = sync(dates[-1:])
+    assert before == compute_rsi(closes)[-1]
+    # the intraday rollup rewrites today's close in place and bumps the version
+    closes[-1] = 90.0
+    # a window inside the state of the same version is served without a query
+    assert sync(dates[-5:]) == before
+    data_versions["gold"] = "1"
+    general.data_versions.invalidate()
+    assert sync(dates[-1:]) == compute_rsi(closes)[-1] != before
+    assert reads == [None, None]
+
+    # a bar newer than the state is read as a delta
+    dates.append(dates[-1] + timedelta(days=1))
+    closes.append(95.0)
+    assert sync(dates[-2:]) == compute_rsi(closes)[-1]
+    assert reads == [None, None, dates[-2]]
@@ -0,0 +1,17 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.startup import measure_import
+
+# Запас над текущими ~80 MB; рост выше означает, что в веб-процесс снова попал тяжёлый модуль
+RSS_BUDGET_MB = 200
+
+
+def test_app_import_graph_stays_light():
+    result = measure_import("app.main")
+    assert result["heavy"] == [], f"app.main imports pipeline modules: {result['heavy']}"
+    if result["rss_mb"] is not None:
+        assert result["rss_mb"] < RSS_BUDGET_MB
@@ -0,0 +1,55 @@
+import sys
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.timeframes import aggregate_candles, bucket_start, downsample_candles
+
+
+def _daily(days, start=date(2024, 1, 1)):
+    candles = []
+    for i in range(days):
+        price = 100.0 + i
+        candles.append({
+            "time": (start + timedelta(days=i)).isoformat(),
+            "open": price,
+            "high": price + 2,
+            "low": price - 1,
+            "close": price + 1,
+            "volume": 10,
+        })
+    return candles
+
+
+def test_weekly_buckets_start_on_monday():
+    # 2024-01-01 — понедельник, 2024-01-10 — среда второй недели
+    weekly = aggregate_candles(_daily(10), "1W")
+    assert [candle["time"] for candle in weekly] == ["2024-01-01", "2024-01-08"]
+    first = weekly[0]
+    assert (first["open"], first["high"], first["low"], first["close"], first["volume"]) == (100.0, 108.0, 99.0, 107.0, 70)
+    assert weekly[1]["close"] == 110.0 and weekly[1]["volume"] == 30
+
+    assert bucket_start(datetime(2024, 1, 10, 7), "1W") == "2024-01-08"
+    assert bucket_start(datetime(2024, 2, 29), "1M") == "2024-02-01"
+
+
+def test_monthly_buckets_and_rsi():
+    monthly = aggregate_candles(_daily(366), "1M")
+    assert len(monthly) == 12
+    assert monthly[1]["time"] == "2024-02-01" and monthly[1]["open"] == 131.0
+    # Цена монотонно растёт — RSI после разогрева равен 100
+    assert "rsi" not in monthly[0]
+    assert aggregate_candles(_daily(800), "1M")[-1]["rsi"] == 100.0
+
+
+def test_downsample_keeps_extremes_and_latest_bar():
+    daily = _daily(1000)
+    reduced = downsample_candles(daily, 300)
+    assert len(reduced) <= 300
+    assert reduced[-1]["close"] == daily[-1]["close"]
+    assert reduced[0]["open"] == daily[0]["open"]
+    assert max(c["high"] for c in reduced) == max(c["high"] for c in daily)
+    assert sum(c["volume"] for c in reduced) == sum(c["volume"] for c in daily)
+    assert downsample_candles(daily[:50], 300) == daily[:50]